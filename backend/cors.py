@@ -0,0 +1,109 @@
+import os
+from typing import Dict, Iterable, List, Tuple
+
+# Single CORS layer for the API. Everything that depends on configuration is
+# computed once when the app is built: the allowed origins become a set and
+# the preflight and simple-response headers become ready-to-send byte pairs,
+# so per request the work is one header lookup and one set membership test.
+
+Headers = List[Tuple[bytes, bytes]]
+
+ALLOWED_METHODS = "GET, POST, PUT, DELETE, OPTIONS"
+MAX_AGE = "3600"
+# Response headers the frontend reads (pagination cursor, request correlation,
+# busy retries, the saved upload behind a failed resume pipeline)
+EXPOSED_HEADERS = "X-Next-Cursor, X-Request-ID, Retry-After, X-Upload-ID"
+
+def default_origins() -> List[str]:
+    """
+    Known frontends plus FRONTEND_URL, BACKEND_URL and comma-separated
+    CORS_ALLOWED_ORIGINS ("*" there allows any origin)
+    """
+    origins = [
+        "http://localhost:3000",
+        "http://127.0.0.1:3000",
+        "https://topicq.netlify.app",  # Production frontend
+        "https://tpicq.onrender.com",  # Production backend
+        os.getenv("FRONTEND_URL", ""),
+        os.getenv("BACKEND_URL", ""),
+    ]
+    origins.extend(os.getenv("CORS_ALLOWED_ORIGINS", "").split(","))
+    return [origin.strip().rstrip("/") for origin in origins if origin.strip()]
+
+class CORSMiddleware:
+    """
+    Pure ASGI CORS middleware. Preflight requests are answered here from a
+    per-origin header cache without reaching the app; other requests get the
+    precomputed headers added to their response start message.
+    """
+
+    def __init__(self, app, allow_origins: Iterable[str]):
+        self.app = app
+        self.allowed_origins = frozenset(allow_origins)
+        self.allow_all = "*" in self.allowed_origins
+
+        common = [
+            (b"access-control-allow-methods", ALLOWED_METHODS.encode()),
+            (b"access-control-allow-headers", b"*"),
+            (b"access-control-allow-credentials", b"false"),
+        ]
+        self._preflight_common: Headers = common + [(b"access-control-max-age", MAX_AGE.encode())]
+        self._expose: Headers = [(b"access-control-expose-headers", EXPOSED_HEADERS.encode())]
+        self._wildcard_simple: Headers = [(b"access-control-allow-origin", b"*")] + self._expose
+        self._wildcard_preflight: Headers = self._wildcard_simple + self._preflight_common
+        # Per-origin headers for explicitly listed origins, built on first use
+        self._preflight_cache: Dict[bytes, Headers] = {}
+        self._simple_cache: Dict[bytes, Headers] = {}
+
+    def _origin_allowed(self, origin: bytes) -> bool:
+        return self.allow_all or origin.decode("latin-1") in self.allowed_origins
+
+    def _simple_headers(self, origin: bytes) -> Headers:
+        if self.allow_all:
+            return self._wildcard_simple
+        headers = self._simple_cache.get(origin)
+        if headers is None:
+            headers = [(b"access-control-allow-origin", origin), (b"vary", b"Origin")] + self._expose
+            self._simple_cache[origin] = headers
+        return headers
+
+    def _preflight_headers(self, origin: bytes) -> Headers:
+        if self.allow_all:
+            return self._wildcard_preflight
+        headers = self._preflight_cache.get(origin)
+        if headers is None:
+            headers = self._simple_headers(origin) + self._preflight_common
+            self._preflight_cache[origin] = headers
+        return headers
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        origin = None
+        for name, value in scope["headers"]:
+            if name == b"origin":
+                origin = value
+                break
+
+        if scope["method"] == "OPTIONS":
+            # Answer every OPTIONS request here, as the old catch-all route did
+            headers = self._preflight_headers(origin) if origin and self._origin_allowed(origin) else []
+            await send({"type": "http.response.start", "status": 200,
+                        "headers": headers + [(b"content-length", b"0")]})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        if origin is None or not self._origin_allowed(origin):
+            await self.app(scope, receive, send)
+            return
+
+        extra = self._simple_headers(origin)
+
+        async def send_with_cors(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + extra
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
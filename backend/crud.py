@@ -1,27 +1,41 @@
 from sqlalchemy.orm import Session
 import models
-import json
+from services import json_codec
+from services.log import get_logger
+from services.response_cache import response_cache
+from services.shared_state import get_shared_state
+from services.topic_index import topic_index
+
+logger = get_logger("crud")
 
 # Topic CRUD operations
 def create_topic(db: Session, name: str):
-    """Create a new topic with better error handling"""
+    """
+    Create a new topic with better error handling. A name equivalent to an
+    existing topic ("ReactJS" for "React") is stored as an alias of it.
+    """
     try:
-        db_topic = models.Topic(name=name)
-        db.add(db_topic)
-        db.commit()
+        # Serialized so two equivalent names created at once cannot both become canonical
+        with get_shared_state().lock("topics:create", ttl=30, timeout=10):
+            normalized_name, canonical_id = topic_index.resolve(db, name)
+            db_topic = models.Topic(name=name, normalized_name=normalized_name, canonical_id=canonical_id)
+            db.add(db_topic)
+            db.commit()
         db.refresh(db_topic)
+        if canonical_id is not None:
+            logger.info("Topic '%s' is an alias of topic %d", name, canonical_id)
+        response_cache.invalidate("topics")
         return db_topic
     except Exception as e:
         db.rollback()  # Rollback the transaction on error
-        print(f"❌ Database error creating topic '{name}': {e}")
-        print(f"🔍 Error type: {type(e)}")
+        logger.warning("Database error creating topic '%s': %s", name, e)
         
         # Check if it's a constraint violation (unique name)
         if "UNIQUE constraint failed" in str(e) or "unique" in str(e).lower():
             # Topic already exists, try to retrieve it
             existing_topic = db.query(models.Topic).filter(models.Topic.name == name).first()
             if existing_topic:
-                print(f"🔄 Topic '{name}' already exists, returning existing one with ID: {existing_topic.id}")
+                logger.info("Topic '%s' already exists, returning existing one with ID %d", name, existing_topic.id)
                 return existing_topic
         
         # Re-raise the original error if we can't handle it
@@ -31,6 +45,13 @@ def get_topic(db: Session, topic_id: int):
     """Get a topic by ID"""
     return db.query(models.Topic).filter(models.Topic.id == topic_id).first()
 
+def get_canonical_topic(db: Session, topic_id: int):
+    """Get the topic that quizzes for `topic_id` are generated and stored under (itself unless it is an alias)"""
+    topic = get_topic(db, topic_id)
+    if topic is not None and topic.canonical_id is not None:
+        return get_topic(db, topic.canonical_id) or topic
+    return topic
+
 def get_topic_by_name(db: Session, name: str):
     """Get a topic by name (case-insensitive)"""
     return db.query(models.Topic).filter(models.Topic.name.ilike(name)).first()
@@ -42,7 +63,7 @@ def get_topics(db: Session, skip: int = 0, limit: int = 100):
 # Quiz CRUD operations
 def create_quiz(db: Session, topic_id: int, difficulty: str, content_json: dict):
     """Create a new quiz"""
-    content_str = json.dumps(content_json)
+    content_str = json_codec.dumps(content_json)
     db_quiz = models.Quiz(
         topic_id=topic_id,
         difficulty=difficulty,
@@ -51,6 +72,7 @@ def create_quiz(db: Session, topic_id: int, difficulty: str, content_json: dict)
     db.add(db_quiz)
     db.commit()
     db.refresh(db_quiz)
+    response_cache.invalidate(f"topic_quizzes:{topic_id}")
     return db_quiz
 
 def get_quiz(db: Session, quiz_id: int):
@@ -58,12 +80,35 @@ def get_quiz(db: Session, quiz_id: int):
     quiz = db.query(models.Quiz).filter(models.Quiz.id == quiz_id).first()
     if quiz:
         # Parse JSON content
-        quiz.content = json.loads(quiz.content_json)
+        quiz.content = json_codec.loads(quiz.content_json)
+    return quiz
+
+def get_latest_quiz(db: Session, topic_id: int, difficulty: str):
+    """Get the most recently saved quiz for a topic and difficulty"""
+    quiz = (
+        db.query(models.Quiz)
+        .filter(models.Quiz.topic_id == topic_id, models.Quiz.difficulty == difficulty)
+        .order_by(models.Quiz.created_at.desc(), models.Quiz.id.desc())
+        .first()
+    )
+    if quiz:
+        quiz.content = json_codec.loads(quiz.content_json)
     return quiz
 
+def get_recent_question_texts(db: Session, topic_id: int, limit: int = 5):
+    """Question texts from the topic's `limit` most recent quizzes (any difficulty)"""
+    rows = (
+        db.query(models.Quiz.content_json)
+        .filter(models.Quiz.topic_id == topic_id)
+        .order_by(models.Quiz.created_at.desc(), models.Quiz.id.desc())
+        .limit(limit)
+        .all()
+    )
+    return [question.get("q", "") for row in rows for question in json_codec.loads(row.content_json).get("questions", [])]
+
 def get_quizzes_by_topic(db: Session, topic_id: int):
     """Get all quizzes for a topic"""
     quizzes = db.query(models.Quiz).filter(models.Quiz.topic_id == topic_id).all()
     for quiz in quizzes:
-        quiz.content = json.loads(quiz.content_json)
+        quiz.content = json_codec.loads(quiz.content_json)
     return quizzes
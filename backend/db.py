@@ -1,5 +1,5 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -16,7 +16,7 @@ if not DATABASE_URL:
         # Use file-based SQLite for local development
         DATABASE_URL = "sqlite:///./data/dev.db"
 
-# Create engine
+# Create engine (connections are opened lazily, so importing this module does no DB work)
 if DATABASE_URL.startswith("sqlite"):
     engine = create_engine(
         DATABASE_URL, 
@@ -27,15 +27,33 @@ if DATABASE_URL.startswith("sqlite"):
 else:
     engine = create_engine(DATABASE_URL)
 
-print(f"🗃️  Database URL: {DATABASE_URL}")
-print(f"🏭 Engine: {engine}")
-
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # Create Base class
 Base = declarative_base()
 
+def ensure_database_directory():
+    """Create the directory of a file-based SQLite database so the first connect does not fail"""
+    if not DATABASE_URL.startswith("sqlite:///") or "mode=memory" in DATABASE_URL:
+        return
+    path = DATABASE_URL[len("sqlite:///"):].split("?", 1)[0]
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+def warm_pool(connections: int = 2):
+    """Open and validate a few pooled connections ahead of the first requests"""
+    opened = []
+    try:
+        for _ in range(connections):
+            connection = engine.connect()
+            connection.execute(text("SELECT 1"))
+            opened.append(connection)
+    finally:
+        for connection in opened:
+            connection.close()
+
 # Dependency to get DB session
 def get_db():
     db = SessionLocal()
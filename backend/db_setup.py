@@ -0,0 +1,80 @@
+from sqlalchemy import LargeBinary, inspect, text
+
+import models
+from db import engine, ensure_database_directory
+from db_types import CompressedText, dictionaries as compression_dictionaries
+from services.log import get_logger
+from services.topic_index import topic_index
+
+# Schema setup shared by the API (at startup) and the maintenance tools, kept
+# out of main.py so tools do not import the whole FastAPI app. There is no
+# migration framework: create_all creates missing tables and the helpers
+# below bring tables created by older versions up to the models.
+
+logger = get_logger("db_setup")
+
+def add_missing_columns():
+    """
+    Lightweight migration: add model columns missing from existing tables.
+    Only nullable columns are added this way; constraints beyond the column
+    type (foreign keys, uniqueness) are left to the model.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in models.Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                logger.info("Added column %s.%s", table.name, column.name)
+
+def convert_compressed_columns():
+    """
+    Turn text columns that the models now declare as CompressedText into
+    bytea on PostgreSQL, which (unlike SQLite) rejects binary values in a
+    text column. Existing values are kept as their UTF-8 bytes, which
+    CompressedText reads as plain text until tools/compress_columns.py
+    compresses them. Rewrites (and locks) each table once.
+    """
+    if engine.dialect.name != "postgresql":
+        return
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in models.Base.metadata.sorted_tables:
+            columns = [column.name for column in table.columns if isinstance(column.type, CompressedText)]
+            if not columns or not inspector.has_table(table.name):
+                continue
+            declared = {column["name"]: column["type"] for column in inspector.get_columns(table.name)}
+            for column in columns:
+                if column in declared and not isinstance(declared[column], LargeBinary):
+                    connection.execute(text(
+                        f"ALTER TABLE {table.name} ALTER COLUMN {column} TYPE bytea "
+                        f"USING convert_to({column}, 'UTF8')"))
+                    logger.info("Converted %s.%s to bytea", table.name, column)
+
+def init_database():
+    """Initialize database tables and ensure they exist"""
+    try:
+        ensure_database_directory()
+
+        # Create any missing tables (existing ones are left untouched)
+        models.Base.metadata.create_all(bind=engine)
+
+        # create_all skips tables that already exist, so bring their columns and indexes up to the models
+        add_missing_columns()
+        convert_compressed_columns()
+        for table in models.Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=engine, checkfirst=True)
+        topic_index.backfill()
+        # zstd dictionaries referenced by compressed columns
+        compression_dictionaries.load()
+        logger.info("Database tables ready")
+
+    except Exception as e:
+        logger.exception("Database initialization failed: %s", e)
+        raise e
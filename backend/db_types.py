@@ -0,0 +1,181 @@
+import os
+import struct
+import threading
+import zlib
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import LargeBinary, text
+from sqlalchemy.types import TypeDecorator
+
+# Transparent compression for large text columns (quiz JSON, resume text).
+#
+# Stored values are framed so the codec can change without rewriting data:
+#
+#   MAGIC (3 bytes) | format version (1) | codec (1) | dictionary id (4, 0 = none) | payload
+#
+# The magic starts with a NUL byte, which never begins the JSON or resume
+# text stored before compression, so un-migrated rows are still read as
+# plain text. Small JSON documents (a single question) compress poorly on
+# their own; zstd can use a dictionary trained on earlier rows
+# (tools/compress_columns.py --train-dictionary), stored in the
+# compression_dictionaries table and referenced by id from each frame.
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - zstandard is in requirements.txt
+    zstandard = None
+
+MAGIC = b"\x00cz"
+FORMAT_VERSION = 1
+HEADER = struct.Struct(">BBI")  # version, codec, dictionary id
+HEADER_SIZE = len(MAGIC) + HEADER.size
+
+CODEC_RAW = 0
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+
+# Values shorter than this are stored uncompressed unless a dictionary applies
+MIN_COMPRESS_BYTES = 128
+
+def configured_codec() -> int:
+    name = os.getenv("COMPRESSION_CODEC", "zstd" if zstandard else "zlib").lower()
+    if name == "zstd" and zstandard is not None:
+        return CODEC_ZSTD
+    if name == "none":
+        return CODEC_RAW
+    return CODEC_ZLIB
+
+class CompressionDictionaries:
+    """
+    zstd dictionaries by id, loaded from the compression_dictionaries table
+    on first use and again whenever a frame names one not seen yet (say one
+    trained after this process started).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data: Dict[int, bytes] = {}
+        self._current: Dict[str, int] = {}
+        self._loaded = False
+        self._local = threading.local()  # zstd (de)compressors are not thread-safe
+
+    def load(self, connection=None) -> None:
+        from db import engine
+        query = text("SELECT id, name, data FROM compression_dictionaries ORDER BY id")
+        try:
+            if connection is not None:
+                rows = connection.execute(query).all()
+            else:
+                with engine.connect() as connection:
+                    rows = connection.execute(query).all()
+        except Exception:
+            # Table not created yet: no dictionaries
+            rows = []
+        with self._lock:
+            for row in rows:
+                self._data[row.id] = bytes(row.data)
+                self._current[row.name] = row.id
+            self._loaded = True
+
+    def current(self, name: Optional[str]) -> int:
+        """Id of the newest dictionary for `name`, or 0"""
+        if not name or zstandard is None:
+            return 0
+        if not self._loaded:
+            self.load()
+        return self._current.get(name, 0)
+
+    def _dictionary(self, dictionary_id: int) -> "zstandard.ZstdCompressionDict":
+        if dictionary_id not in self._data:
+            self.load()
+        if dictionary_id not in self._data:
+            raise ValueError(f"Compression dictionary {dictionary_id} not found")
+        return zstandard.ZstdCompressionDict(self._data[dictionary_id])
+
+    def compressor(self, dictionary_id: int, level: int) -> "zstandard.ZstdCompressor":
+        cache = getattr(self._local, "compressors", None)
+        if cache is None:
+            cache = self._local.compressors = {}
+        key = (dictionary_id, level)
+        if key not in cache:
+            dict_data = self._dictionary(dictionary_id) if dictionary_id else None
+            cache[key] = zstandard.ZstdCompressor(level=level, dict_data=dict_data)
+        return cache[key]
+
+    def decompressor(self, dictionary_id: int) -> "zstandard.ZstdDecompressor":
+        cache = getattr(self._local, "decompressors", None)
+        if cache is None:
+            cache = self._local.decompressors = {}
+        if dictionary_id not in cache:
+            dict_data = self._dictionary(dictionary_id) if dictionary_id else None
+            cache[dictionary_id] = zstandard.ZstdDecompressor(dict_data=dict_data)
+        return cache[dictionary_id]
+
+def is_framed(value) -> bool:
+    return isinstance(value, (bytes, bytearray, memoryview)) and bytes(value[:len(MAGIC)]) == MAGIC
+
+def frame_info(value: bytes) -> Tuple[int, int, int]:
+    """(format version, codec, dictionary id) of a framed value"""
+    return HEADER.unpack_from(value, len(MAGIC))
+
+def compress(data: bytes, dictionary: Optional[str] = None, codec: Optional[int] = None) -> bytes:
+    codec = configured_codec() if codec is None else codec
+    dictionary_id = dictionaries.current(dictionary) if codec == CODEC_ZSTD else 0
+    if codec != CODEC_RAW and (len(data) >= MIN_COMPRESS_BYTES or dictionary_id):
+        if codec == CODEC_ZSTD:
+            level = int(os.getenv("COMPRESSION_LEVEL", "3"))
+            payload = dictionaries.compressor(dictionary_id, level).compress(data)
+        else:
+            level = int(os.getenv("COMPRESSION_LEVEL", "6"))
+            payload = zlib.compress(data, level)
+        if len(payload) < len(data):
+            return MAGIC + HEADER.pack(FORMAT_VERSION, codec, dictionary_id) + payload
+    return MAGIC + HEADER.pack(FORMAT_VERSION, CODEC_RAW, 0) + data
+
+def decompress(value: bytes) -> bytes:
+    """Payload of a framed value; anything without the frame is returned unchanged"""
+    if not is_framed(value):
+        return value
+    version, codec, dictionary_id = frame_info(value)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported compressed value format {version}")
+    payload = value[HEADER_SIZE:]
+    if codec == CODEC_RAW:
+        return payload
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(payload)
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise ValueError("Value is zstd-compressed but the zstandard package is not installed")
+        return dictionaries.decompressor(dictionary_id).decompress(payload)
+    raise ValueError(f"Unknown compression codec {codec}")
+
+class CompressedText(TypeDecorator):
+    """
+    Text column stored compressed as a BLOB; reads and writes plain str.
+    `dictionary` names the family of zstd dictionaries trained for this
+    kind of content (columns holding similar data can share one).
+    """
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def __init__(self, dictionary: Optional[str] = None, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.dictionary = dictionary
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        return compress(value, self.dictionary)
+
+    def result_processor(self, dialect, coltype):
+        # Not LargeBinary's processor: rows written before compression come back as str
+        def process(value):
+            if value is None or isinstance(value, str):
+                return value
+            return decompress(bytes(value)).decode("utf-8")
+        return process
+
+dictionaries = CompressionDictionaries()
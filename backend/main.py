@@ -1,122 +1,139 @@
-from fastapi import FastAPI, Depends, HTTPException, Request, Response
-from fastapi.middleware.cors import CORSMiddleware
+from fastapi import FastAPI, Depends, HTTPException, Request, Query
+from fastapi.responses import PlainTextResponse, FileResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from sqlalchemy.orm import Session
 from dotenv import load_dotenv
 import sys
 import os
+import time
+import uuid
+import asyncio
+from typing import Optional
+from starlette.concurrency import run_in_threadpool
 
 # Add current directory to Python path for imports
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from db import engine, get_db
+from db import engine, get_db, SessionLocal, DATABASE_URL, warm_pool
+from db_setup import init_database
 import models, crud, schemas
 from services.gemini_client import generate_quiz
+from services.circuit_breaker import CircuitOpenError
+from services.deadline import Deadline, DeadlineExceeded, GenerationTimedOut
+from services.token_usage import token_usage
+from services.readiness import readiness
+from services.response_cache import response_cache
+from services.topic_index import topic_index
+from services.dedup import RECENT_QUIZZES as DEDUP_RECENT_QUIZZES
+from services.scheduler import admit, INTERACTIVE
+from services.shuffle import shuffle_quiz, serve_key, MAX_SEED_LENGTH
+from services.shared_state import get_shared_state, is_process_local
+from services.resume_processor import get_resume_processor, preload_parsers
+from services.prompts import DEFAULT_PROMPT_VERSIONS, get_prompt_version, load_template
+from services.metrics import registry, request_latency, record_cache, register_db_pool
+from services.log import get_logger, request_id_var, SAMPLED
+from services.tracing import span, instrument_sessions
+from services.profiling import (
+    RequestProfiler, profiling_enabled, profiling_requested, profile_path, list_profiles
+)
 from routes.resume import router as resume_router
+from routes.attempts import router as attempts_router
+from cors import CORSMiddleware, default_origins
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Initialize database
-def init_database():
-    """Initialize database tables and ensure they exist"""
-    try:
-        print("🔧 Initializing database...")
-        
-        # Create all tables
-        models.Base.metadata.create_all(bind=engine)
-        
-        # Verify tables were created by trying to connect and check
-        from sqlalchemy import inspect
-        inspector = inspect(engine)
-        tables = inspector.get_table_names()
-        
-        print(f"📊 Database tables created: {tables}")
-        
-        if "topics" not in tables or "quizzes" not in tables:
-            print("⚠️  Warning: Required tables not found, attempting to recreate...")
-            models.Base.metadata.drop_all(bind=engine)
-            models.Base.metadata.create_all(bind=engine)
-            
-            # Check again
-            inspector = inspect(engine)
-            tables = inspector.get_table_names()
-            print(f"📊 Tables after recreation: {tables}")
-        
-        print("✅ Database initialization completed!")
-        
-    except Exception as e:
-        print(f"❌ Database initialization failed: {e}")
-        raise e
+logger = get_logger("api")
 
-# Initialize database
-init_database()
+def warm_up():
+    """
+    Bring up everything the API needs before taking traffic, reporting
+    progress to /ready. Runs in a worker thread after startup so the server
+    starts accepting (liveness) connections right away.
+    """
+    steps = [
+        ("database", init_database),
+        ("db_pool", lambda: warm_pool(int(os.getenv("DB_WARM_CONNECTIONS", "2")))),
+        ("shared_state", lambda: get_shared_state().get("warm_up")),
+        ("resume_processor", lambda: (get_resume_processor(), preload_parsers())),
+        ("prompts", lambda: [load_template(name, get_prompt_version(name)) for name in DEFAULT_PROMPT_VERSIONS]),
+    ]
+    for name, step in steps:
+        try:
+            step()
+            readiness.mark_ready(name)
+        except Exception as e:
+            logger.exception("Warm-up step '%s' failed: %s", name, e)
+            readiness.mark_failed(name, e)
+    logger.info("Warm-up finished", extra=readiness.report())
 
 app = FastAPI(title="TpicQ API", version="1.0.0")
 
+register_db_pool(engine)
+instrument_sessions(SessionLocal)
+
 @app.on_event("startup")
 async def startup_event():
-    """Startup event to ensure database is ready"""
-    print("🚀 Starting TpicQ API...")
-    print(f"🌍 Environment: {'Production' if os.getenv('RENDER') else 'Development'}")
-    print(f"🔗 Frontend URL: {os.getenv('FRONTEND_URL', 'Not set')}")
-    print(f"🔗 Backend URL: {os.getenv('BACKEND_URL', 'Not set')}")
-    print(f"🔒 CORS: Will allow https://topicq.netlify.app and localhost:3000")
+    """Start warming up in the background; /ready reports when it is done"""
+    logger.info("Starting TpicQ API", extra={
+        "environment": "Production" if os.getenv("RENDER") else "Development",
+        "frontend_url": os.getenv("FRONTEND_URL", "Not set"),
+        "backend_url": os.getenv("BACKEND_URL", "Not set"),
+    })
+    
+    # Several workers (uvicorn --workers / WEB_CONCURRENCY) need state they can all see
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    if workers > 1 and "mode=memory" in DATABASE_URL:
+        logger.warning("In-memory SQLite is private to each of the %d workers; set DATABASE_URL to a shared database", workers)
+    if workers > 1 and is_process_local():
+        logger.warning("SHARED_STATE_URL is memory://, so key cooldowns, quota counters and locks are per worker; "
+                       "use sqlite:///<path> (one machine) or redis:// (several)")
     
-    # Re-initialize database on startup (important for in-memory databases)
-    init_database()
+    # Keep a reference so the task is not garbage collected mid-run
+    app.state.warm_up_task = asyncio.create_task(run_in_threadpool(warm_up))
 
-# Manual CORS middleware - Always allow production URLs
 @app.middleware("http")
-async def cors_handler(request: Request, call_next):
-    response = await call_next(request)
-    
-    # Get the origin from the request
-    origin = request.headers.get("origin")
-    
-    # Define allowed origins (including all possible combinations)
-    allowed_origins = [
-        "http://localhost:3000",
-        "http://127.0.0.1:3000", 
-        "https://topicq.netlify.app",
-        "https://tpicq.onrender.com",
-        os.getenv("FRONTEND_URL", ""),
-        os.getenv("BACKEND_URL", "")
-    ]
-    
-    # Filter out empty strings
-    allowed_origins = [url for url in allowed_origins if url]
-    
-    # Check if the origin is allowed
-    if origin in allowed_origins:
-        response.headers["Access-Control-Allow-Origin"] = origin
-    else:
-        # Default to Netlify production URL for production environment
-        if os.getenv("RENDER"):
-            response.headers["Access-Control-Allow-Origin"] = "https://topicq.netlify.app"
-        else:
-            response.headers["Access-Control-Allow-Origin"] = "http://localhost:3000"
-    
-    response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
-    response.headers["Access-Control-Allow-Headers"] = "*"
-    response.headers["Access-Control-Allow-Credentials"] = "false"
-    response.headers["Access-Control-Max-Age"] = "3600"
+async def profile_request(request: Request, call_next):
+    """Profile a single request when PROFILING_ENABLED is set and it sends X-Profile or ?profile=1"""
+    if not profiling_requested(request.headers, request.query_params):
+        return await call_next(request)
+    with RequestProfiler(request_id_var.get()) as profiler:
+        response = await call_next(request)
+    if profiler.saved_path:
+        response.headers["X-Profile-ID"] = profiler.profile_id
     return response
 
-# Add CORS middleware for frontend - Explicit production URLs
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=[
-        "http://localhost:3000",
-        "http://127.0.0.1:3000",
-        "https://topicq.netlify.app",  # Production frontend
-        "https://tpicq.onrender.com",  # Production backend  
-        "*"  # Temporary wildcard for debugging
-    ],
-    allow_credentials=False,
-    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-    allow_headers=["*"],
-)
+@app.middleware("http")
+async def instrument_request(request: Request, call_next):
+    """
+    Tag the request with an id (X-Request-ID, echoed back), open the root
+    tracing span, observe latency per route template (not per raw path, to
+    bound label cardinality) and write a sampled access log line
+    """
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    started = time.perf_counter()
+    status = 500
+    with span(f"{request.method} {request.url.path}", request_id=request_id) as root_span:
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            response.headers["X-Request-ID"] = request_id
+            return response
+        finally:
+            elapsed = time.perf_counter() - started
+            route = request.scope.get("route")
+            route_path = route.path if route else "unmatched"
+            root_span.update_name(f"{request.method} {route_path}")
+            root_span.set("http.status_code", status)
+            request_latency.observe(elapsed, method=request.method, route=route_path, status=status)
+            logger.info("%s %s %d", request.method, route_path, status, extra={
+                **SAMPLED, "duration_ms": round(elapsed * 1000, 1)
+            })
+            request_id_var.reset(token)
+
+# Single precomputed CORS layer, outermost so preflights never reach the app
+app.add_middleware(CORSMiddleware, allow_origins=default_origins())
 
 # Mount React build files (when available)
 try:
@@ -124,8 +141,14 @@ try:
 except Exception:
     pass  # React build not available yet
 
+@app.exception_handler(GenerationTimedOut)
+async def generation_timed_out(request: Request, exc: GenerationTimedOut):
+    """Render a generation timeout with its partial questions next to the string detail"""
+    return JSONResponse({"detail": exc.detail, **exc.fields}, status_code=exc.status_code, headers=exc.headers)
+
 # Include resume routes
 app.include_router(resume_router, prefix="/api/resume", tags=["resume"])
+app.include_router(attempts_router, prefix="/api", tags=["attempts"])
 
 @app.get("/")
 def root():
@@ -135,6 +158,18 @@ def root():
 def health():
     return {"status": "ok"}
 
+@app.get("/ready")
+def ready():
+    """Readiness probe: 200 once the database, pool, resume processor and prompts are warm, else 503"""
+    report = readiness.report()
+    status_code = 200 if report["status"] == readiness.READY else 503
+    return JSONResponse(report, status_code=status_code)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus text exposition of request, Gemini, cache, extraction and DB pool metrics"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/debug/database")
 def debug_database():
     """Debug endpoint to check database status"""
@@ -172,72 +207,54 @@ def debug_database():
     except Exception as e:
         return {"error": str(e)}
 
-@app.options("/{rest_of_path:path}")
-async def preflight_handler(request: Request, rest_of_path: str):
-    """Handle CORS preflight requests"""
-    
-    # Get the origin from the request
-    origin = request.headers.get("origin")
-    
-    # Define allowed origins
-    allowed_origins = [
-        "http://localhost:3000",
-        "http://127.0.0.1:3000", 
-        "https://topicq.netlify.app",
-        "https://tpicq.onrender.com"
-    ]
-    
-    # Default to production frontend for production environment
-    allowed_origin = "https://topicq.netlify.app" if os.getenv("RENDER") else "http://localhost:3000"
-    
-    # Use specific origin if it's in allowed list
-    if origin in allowed_origins:
-        allowed_origin = origin
-    
-    return Response(
-        status_code=200,
-        headers={
-            "Access-Control-Allow-Origin": allowed_origin,
-            "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS",
-            "Access-Control-Allow-Headers": "*",
-            "Access-Control-Allow-Credentials": "false",
-            "Access-Control-Max-Age": "3600"
-        }
-    )
+@app.get("/debug/token-usage")
+def debug_token_usage():
+    """Token usage per generated quiz, grouped by the endpoint that requested it"""
+    return {"endpoints": token_usage.report()}
+
+@app.get("/debug/profiles")
+def debug_profiles():
+    """Stored per-request profiles, newest first"""
+    if not profiling_enabled():
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    return {"profiles": list_profiles()}
+
+@app.get("/debug/profiles/{profile_id}")
+def download_profile(profile_id: str):
+    """Download a profile in collapsed-stack format (flamegraph.pl, speedscope, inferno)"""
+    path = profile_path(profile_id) if profiling_enabled() else None
+    if not path or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=os.path.basename(path))
 
 @app.post("/topics", response_model=schemas.Topic)
 def create_topic(topic: schemas.TopicCreate, db: Session = Depends(get_db)):
     """Create a new topic"""
     try:
-        print(f"📝 Creating topic: '{topic.name}' (length: {len(topic.name)})")
-        
         # Validate topic name
         if not topic.name or not topic.name.strip():
             raise HTTPException(status_code=400, detail="Topic name cannot be empty")
         
         topic_name = topic.name.strip()
-        print(f"🔍 Sanitized topic name: '{topic_name}'")
         
         # Check if topic already exists (with better error handling)
         try:
             db_topic = crud.get_topic_by_name(db, name=topic_name)
             if db_topic:
-                print(f"⚠️  Topic '{topic_name}' already exists with ID: {db_topic.id}")
                 raise HTTPException(status_code=400, detail="Topic already exists")
         except HTTPException:
             raise
         except Exception as search_error:
-            print(f"⚠️  Error searching for existing topic: {search_error}")
+            logger.warning("Error searching for existing topic: %s", search_error)
             # Continue with creation attempt
         
         # Create new topic
         try:
             new_topic = crud.create_topic(db=db, name=topic_name)
-            print(f"✅ Topic '{topic_name}' created successfully with ID: {new_topic.id}")
+            logger.info("Topic created", extra={"topic_id": new_topic.id})
             return new_topic
         except Exception as create_error:
-            print(f"❌ Error creating topic in database: {create_error}")
-            print(f"🔍 Error type: {type(create_error)}")
+            logger.exception("Error creating topic in database: %s", create_error)
             raise HTTPException(
                 status_code=500, 
                 detail=f"Database error creating topic: {str(create_error)}"
@@ -247,12 +264,11 @@ def create_topic(topic: schemas.TopicCreate, db: Session = Depends(get_db)):
         # Re-raise HTTP exceptions (like topic already exists)
         raise
     except Exception as e:
-        print(f"❌ Unexpected error creating topic '{topic.name}': {e}")
-        print(f"🔍 Error type: {type(e)}")
+        logger.exception("Unexpected error creating topic '%s': %s", topic.name, e)
         
         # Check if it's a database table issue
         if "no such table" in str(e):
-            print("🔧 Database table issue detected, attempting to reinitialize...")
+            logger.warning("Database table issue detected, attempting to reinitialize")
             try:
                 init_database()
                 # Retry the operation
@@ -261,47 +277,73 @@ def create_topic(topic: schemas.TopicCreate, db: Session = Depends(get_db)):
                     raise HTTPException(status_code=400, detail="Topic already exists")
                 return crud.create_topic(db=db, name=topic.name)
             except Exception as retry_error:
-                print(f"❌ Retry failed: {retry_error}")
+                logger.error("Retry failed: %s", retry_error)
                 raise HTTPException(status_code=500, detail=f"Database initialization failed: {str(retry_error)}")
         
         raise HTTPException(status_code=500, detail=f"Failed to create topic: {str(e)}")
 
 @app.get("/topics", response_model=list[schemas.Topic])
-def get_topics(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Get all topics"""
-    try:
+def get_topics(request: Request, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    """Get all topics (ETag/Last-Modified validated, served from the response cache until a topic is added)"""
+    def build():
         topics = crud.get_topics(db, skip=skip, limit=limit)
-        print(f"📋 Retrieved {len(topics)} topics: {[t.name for t in topics]}")
-        return topics
+        logger.debug("Retrieved %d topics", len(topics), extra=SAMPLED)
+        last_modified = max((t.created_at for t in topics), default=None)
+        return [schemas.Topic.model_validate(t) for t in topics], last_modified
+    
+    try:
+        return response_cache.respond(request, "topics", build, variant=f"{skip}:{limit}")
     except Exception as e:
-        print(f"❌ Failed to get topics: {e}")
+        logger.exception("Failed to get topics: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to retrieve topics: {str(e)}")
 
-@app.post("/topics/{topic_id}/generate-quiz")
+@app.post("/topics/{topic_id}/generate-quiz", dependencies=[Depends(admit(INTERACTIVE))])
 def generate_quiz_endpoint(topic_id: int, quiz_request: schemas.QuizGenerate, db: Session = Depends(get_db)):
-    """Generate a quiz for a topic using Gemini API"""
-    print(f"🎯 Quiz generation requested for topic {topic_id}, difficulty: {quiz_request.difficulty}")
-    
-    # Check if topic exists
-    topic = crud.get_topic(db, topic_id=topic_id)
+    """
+    Generate a quiz for a topic using Gemini API. Runs once the generation
+    scheduler admits it (interactive priority); 429 with Retry-After if it is full.
+    """
+    # Overall budget for this request, shared by every key, retry and timeout below
+    deadline = Deadline.from_env()
+    # Check if topic exists; aliases ("ReactJS") generate for and store under their canonical topic ("React")
+    topic = crud.get_canonical_topic(db, topic_id=topic_id)
     if not topic:
         raise HTTPException(status_code=404, detail="Topic not found")
     
-    print(f"📚 Topic found: {topic.name}")
-    
     # Validate difficulty
     if quiz_request.difficulty not in ["easy", "medium", "hard"]:
         raise HTTPException(status_code=400, detail="Difficulty must be: easy, medium, or hard")
     
     # Generate quiz using Gemini API
-    print(f"🤖 Calling generate_quiz function...")
     try:
-        quiz_content = generate_quiz(topic.name, quiz_request.difficulty)
-        print(f"✅ Quiz generation completed!")
+        # Don't repeat (or reword) questions from the topic's recent quizzes
+        recent_questions = crud.get_recent_question_texts(db, topic.id, limit=DEDUP_RECENT_QUIZZES)
+        quiz_content = generate_quiz(topic.name, quiz_request.difficulty, deadline=deadline,
+                                     avoid=recent_questions)
         success_message = "Quiz generated successfully"
             
+    except DeadlineExceeded as e:
+        logger.warning("Quiz generation timed out: %s", e, extra={"topic_id": topic_id})
+        raise GenerationTimedOut(e)
+    except CircuitOpenError as e:
+        # Upstream is down: serve the most recent banked quiz instead of waiting on retries
+        logger.warning("%s", e, extra={"topic_id": topic_id})
+        banked_quiz = crud.get_latest_quiz(db, topic_id=topic.id, difficulty=quiz_request.difficulty)
+        record_cache("banked_quiz", banked_quiz is not None)
+        if banked_quiz:
+            return {
+                "message": "AI service is temporarily unavailable; serving a previously generated quiz",
+                "quiz_id": banked_quiz.id,
+                "content": shuffle_quiz(banked_quiz.content, serve_key("quiz", banked_quiz.id)),
+                "status": "fallback"
+            }
+        raise HTTPException(
+            status_code=503,
+            detail="AI service is temporarily unavailable. Please try again shortly.",
+            headers={"Retry-After": str(max(1, int(e.retry_after)))}
+        )
     except Exception as e:
-        print(f"❌ Quiz generation failed: {e}")
+        logger.error("Quiz generation failed: %s", e, extra={"topic_id": topic_id})
         
         # Provide user-friendly error messages
         error_message = "Quiz generation service temporarily unavailable"
@@ -328,7 +370,7 @@ def generate_quiz_endpoint(topic_id: int, quiz_request: schemas.QuizGenerate, db
     try:
         saved_quiz = crud.create_quiz(
             db=db,
-            topic_id=topic_id,
+            topic_id=topic.id,
             difficulty=quiz_request.difficulty,
             content_json=quiz_content
         )
@@ -336,44 +378,54 @@ def generate_quiz_endpoint(topic_id: int, quiz_request: schemas.QuizGenerate, db
         return {
             "message": success_message, 
             "quiz_id": saved_quiz.id, 
-            "content": quiz_content,
+            "content": shuffle_quiz(quiz_content, serve_key("quiz", saved_quiz.id)),
             "status": "success"
         }
     except Exception as e:
-        print(f"❌ Failed to save quiz to database: {e}")
+        logger.exception("Failed to save quiz to database: %s", e)
         # Still return the quiz content even if saving fails
         return {
             "message": f"{success_message} (note: quiz not saved to database)", 
             "quiz_id": None, 
-            "content": quiz_content,
+            "content": shuffle_quiz(quiz_content, serve_key("quiz", "unsaved", uuid.uuid4().hex)),
             "status": "partial_success"
         }
 
 @app.get("/topics/{topic_id}/quizzes")
-def get_topic_quizzes(topic_id: int, db: Session = Depends(get_db)):
-    """Get all saved quizzes for a topic"""
-    # Check if topic exists
-    topic = crud.get_topic(db, topic_id=topic_id)
-    if not topic:
+def get_topic_quizzes(topic_id: int, request: Request, seed: Optional[str] = Query(None, max_length=MAX_SEED_LENGTH),
+                      db: Session = Depends(get_db)):
+    """
+    Get all saved quizzes for a topic (ETag/Last-Modified validated, cached until a quiz is added).
+    Options are shuffled per quiz and `seed`; each seed's rendering is cached separately.
+    An alias topic returns its canonical topic's quizzes.
+    """
+    # Resolved from memory for known topics, so a revalidation can get its 304 without a query
+    canonical_id = topic_index.canonical_id(db, topic_id)
+    if canonical_id is None:
         raise HTTPException(status_code=404, detail="Topic not found")
     
-    # Get all quizzes for this topic
-    quizzes = crud.get_quizzes_by_topic(db, topic_id=topic_id)
-    
-    # Format response
-    quiz_list = []
-    for quiz in quizzes:
-        quiz_list.append({
-            "id": quiz.id,
-            "difficulty": quiz.difficulty,
-            "created_at": quiz.created_at,
-            "content": quiz.content
-        })
+    def build():
+        topic = crud.get_topic(db, topic_id=canonical_id)
+        # Get all quizzes for this topic
+        quizzes = crud.get_quizzes_by_topic(db, topic_id=topic.id)
+        
+        # Format response
+        quiz_list = []
+        for quiz in quizzes:
+            quiz_list.append({
+                "id": quiz.id,
+                "difficulty": quiz.difficulty,
+                "created_at": quiz.created_at,
+                "content": shuffle_quiz(quiz.content, serve_key("quiz", quiz.id, seed))
+            })
+        
+        last_modified = max((quiz.created_at for quiz in quizzes), default=topic.created_at)
+        return {
+            "topic": {"id": topic.id, "name": topic.name},
+            "quizzes": quiz_list
+        }, last_modified
     
-    return {
-        "topic": {"id": topic.id, "name": topic.name},
-        "quizzes": quiz_list
-    }
+    return response_cache.respond(request, f"topic_quizzes:{canonical_id}", build, variant=seed or "")
 
 if __name__ == "__main__":
     import uvicorn
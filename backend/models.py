@@ -1,16 +1,19 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Float, Index, LargeBinary
+from sqlalchemy.orm import relationship, deferred
 from datetime import datetime
 from db import Base
+from db_types import CompressedText
 
 class Topic(Base):
     __tablename__ = "topics"
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(100), unique=True, index=True, nullable=False)
+    normalized_name = Column(String(100), nullable=True, index=True)  # canonical matching key, see services/topic_index.py
+    canonical_id = Column(Integer, ForeignKey("topics.id"), nullable=True, index=True)  # set on aliases such as "ReactJS" -> "React"
     created_at = Column(DateTime, default=datetime.utcnow)
     
-    # Relationship with quizzes
+    # Relationship with quizzes (always stored on the canonical topic)
     quizzes = relationship("Quiz", back_populates="topic")
 
 class Quiz(Base):
@@ -19,11 +22,14 @@ class Quiz(Base):
     id = Column(Integer, primary_key=True, index=True)
     topic_id = Column(Integer, ForeignKey("topics.id"), nullable=False)
     difficulty = Column(String(20), nullable=False)  # easy, medium, hard
-    content_json = Column(Text, nullable=False)  # JSON string with quiz data
+    content_json = Column(CompressedText("quiz_content"), nullable=False)  # JSON string with quiz data
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationship with topic
     topic = relationship("Topic", back_populates="quizzes")
+    
+    # Never reuse the id of a deleted quiz: attempts and stats are keyed by it
+    __table_args__ = {"sqlite_autoincrement": True}
 
 class ResumeUpload(Base):
     __tablename__ = "resume_uploads"
@@ -32,13 +38,17 @@ class ResumeUpload(Base):
     filename = Column(String(255), nullable=False)
     original_filename = Column(String(255), nullable=False)
     file_size = Column(Integer, nullable=False)  # in bytes
-    extracted_text = Column(Text, nullable=True)  # extracted resume text
+    # Extracted resume text (stored compressed); loaded only when accessed
+    extracted_text = deferred(Column(CompressedText("resume_text"), nullable=True))
     extracted_topics = Column(Text, nullable=True)  # JSON string of extracted topics/skills
     processed = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationship with resume quizzes
     resume_quizzes = relationship("ResumeQuiz", back_populates="resume_upload")
+    
+    # Backs the newest-first keyset pagination of GET /api/resume/resume-uploads
+    __table_args__ = (Index("ix_resume_uploads_created_at_id", "created_at", "id"),)
 
 class ResumeQuiz(Base):
     __tablename__ = "resume_quizzes"
@@ -46,10 +56,83 @@ class ResumeQuiz(Base):
     id = Column(Integer, primary_key=True, index=True)
     resume_upload_id = Column(Integer, ForeignKey("resume_uploads.id"), nullable=False)
     difficulty = Column(String(20), default="medium")  # easy, medium, hard
-    content_json = Column(Text, nullable=False)  # JSON string with 30 quiz questions
+    content_json = Column(CompressedText("quiz_content"), nullable=False)  # JSON string with 30 quiz questions
     score = Column(Integer, nullable=True)  # user's score if quiz was taken
     total_questions = Column(Integer, default=30)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationship with resume upload
     resume_upload = relationship("ResumeUpload", back_populates="resume_quizzes")
+    
+    # Never reuse the id of a deleted quiz: attempts and stats are keyed by it
+    __table_args__ = {"sqlite_autoincrement": True}
+
+class SkillQuestion(Base):
+    __tablename__ = "skill_questions"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    skill = Column(String(100), nullable=False)  # normalized (lowercase) skill name
+    difficulty = Column(String(20), nullable=False)  # easy, medium, hard
+    question_hash = Column(String(40), nullable=False)  # sha1 of the normalized question text
+    content_json = Column(CompressedText("quiz_content"), nullable=False)  # JSON string with one question
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Pools are read per (skill, difficulty); the hash keeps a pool free of repeats
+    __table_args__ = (
+        Index("ux_skill_questions_pool_hash", "skill", "difficulty", "question_hash", unique=True),
+    )
+
+class QuizAttempt(Base):
+    __tablename__ = "quiz_attempts"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    quiz_kind = Column(String(20), nullable=False)  # quiz (topic quiz) or resume_quiz
+    quiz_id = Column(Integer, nullable=False)
+    topic_id = Column(Integer, nullable=True)  # set for topic quizzes
+    seed = Column(String(64), nullable=True)  # shuffle seed the quiz was served with
+    candidate = Column(String(100), nullable=True)  # optional caller-supplied candidate/user label
+    answers_json = Column(Text, nullable=False)  # JSON list of chosen options in canonical order (null = unanswered)
+    correct = Column(Integer, nullable=False)
+    total_questions = Column(Integer, nullable=False)
+    score = Column(Float, nullable=False)  # percentage
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (Index("ix_quiz_attempts_quiz", "quiz_kind", "quiz_id"),)
+
+# Aggregates maintained incrementally by the attempt writer, so dashboards
+# read one row per quiz/topic (plus one per question) instead of scanning attempts
+
+class QuizStats(Base):
+    __tablename__ = "quiz_stats"
+    
+    quiz_kind = Column(String(20), primary_key=True)
+    quiz_id = Column(Integer, primary_key=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    score_sum = Column(Float, nullable=False, default=0.0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class QuestionStats(Base):
+    __tablename__ = "question_stats"
+    
+    quiz_kind = Column(String(20), primary_key=True)
+    quiz_id = Column(Integer, primary_key=True)
+    question_index = Column(Integer, primary_key=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    correct = Column(Integer, nullable=False, default=0)
+
+class TopicStats(Base):
+    __tablename__ = "topic_stats"
+    
+    topic_id = Column(Integer, primary_key=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    score_sum = Column(Float, nullable=False, default=0.0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class CompressionDictionary(Base):
+    """zstd dictionaries referenced by id from CompressedText values (see db_types.py)"""
+    __tablename__ = "compression_dictionaries"
+    
+    id = Column(Integer, primary_key=True)
+    name = Column(String(50), nullable=False, index=True)  # the CompressedText dictionary family
+    data = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,113 @@
+from fastapi import APIRouter, HTTPException, Depends
+from sqlalchemy.orm import Session
+
+import crud
+from db import get_db
+from models import Quiz, ResumeQuiz, QuizStats, QuestionStats, TopicStats
+from schemas import AttemptSubmit, AttemptResult, QuizStatsResponse, TopicStatsResponse
+from services import json_codec
+from services.attempt_writer import attempt_writer, AttemptQueueFull
+from services.grading import answer_keys, grade
+from services.metrics import record_cache
+from services.log import get_logger
+from services.shuffle import serve_key
+
+router = APIRouter()
+logger = get_logger("routes.attempts")
+
+# Quiz kinds: "quiz" is a topic quiz (quizzes table), "resume_quiz" a resume quiz
+_MODELS = {"quiz": Quiz, "resume_quiz": ResumeQuiz}
+
+def _answer_key(db: Session, kind: str, quiz_id: int):
+    entry = answer_keys.get(kind, quiz_id)
+    record_cache("answer_key", entry is not None)
+    if entry is None:
+        quiz = db.query(_MODELS[kind]).filter(_MODELS[kind].id == quiz_id).first()
+        if not quiz:
+            raise HTTPException(status_code=404, detail="Quiz not found")
+        content = json_codec.loads(quiz.content_json)
+        entry = answer_keys.put(kind, quiz_id, content.get("questions", []),
+                                topic_id=getattr(quiz, "topic_id", None))
+    return entry
+
+def _submit(db: Session, kind: str, quiz_id: int, attempt: AttemptSubmit) -> AttemptResult:
+    entry = _answer_key(db, kind, quiz_id)
+    if len(attempt.answers) > len(entry["questions"]):
+        raise HTTPException(status_code=400, detail=f"Quiz has {len(entry['questions'])} questions, "
+                                                    f"got {len(attempt.answers)} answers")
+    
+    graded = grade(entry, serve_key(kind, quiz_id, attempt.seed), attempt.answers)
+    try:
+        attempt_writer.submit({
+            **graded,
+            "quiz_kind": kind,
+            "quiz_id": quiz_id,
+            "topic_id": entry["topic_id"],
+            "seed": attempt.seed,
+            "candidate": attempt.candidate,
+        })
+    except AttemptQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    
+    return AttemptResult(
+        quiz_id=quiz_id,
+        correct=graded["correct"],
+        total_questions=graded["total_questions"],
+        score=graded["score"],
+        results=graded["results"],
+        status="queued"
+    )
+
+def _quiz_stats(db: Session, kind: str, quiz_id: int) -> QuizStatsResponse:
+    stats = db.query(QuizStats).filter(QuizStats.quiz_kind == kind, QuizStats.quiz_id == quiz_id).first()
+    questions = (
+        db.query(QuestionStats)
+        .filter(QuestionStats.quiz_kind == kind, QuestionStats.quiz_id == quiz_id)
+        .order_by(QuestionStats.question_index)
+        .all()
+    )
+    attempts = stats.attempts if stats else 0
+    return QuizStatsResponse(
+        quiz_id=quiz_id,
+        attempts=attempts,
+        mean_score=round(stats.score_sum / attempts, 1) if attempts else None,
+        questions=[{
+            "question_index": q.question_index,
+            "attempts": q.attempts,
+            "correct_rate": round(q.correct / q.attempts, 3) if q.attempts else 0.0
+        } for q in questions]
+    )
+
+@router.post("/quizzes/{quiz_id}/attempts", response_model=AttemptResult)
+def submit_quiz_attempt(quiz_id: int, attempt: AttemptSubmit, db: Session = Depends(get_db)):
+    """Grade an attempt at a topic quiz; it is saved (and counted in stats) in the next batch"""
+    return _submit(db, "quiz", quiz_id, attempt)
+
+@router.post("/resume-quizzes/{quiz_id}/attempts", response_model=AttemptResult)
+def submit_resume_quiz_attempt(quiz_id: int, attempt: AttemptSubmit, db: Session = Depends(get_db)):
+    """Grade an attempt at a resume quiz; the quiz's score is updated in the next batch"""
+    return _submit(db, "resume_quiz", quiz_id, attempt)
+
+@router.get("/quizzes/{quiz_id}/stats", response_model=QuizStatsResponse)
+def get_quiz_stats(quiz_id: int, db: Session = Depends(get_db)):
+    """Attempt count, mean score and per-question correctness for a topic quiz"""
+    return _quiz_stats(db, "quiz", quiz_id)
+
+@router.get("/resume-quizzes/{quiz_id}/stats", response_model=QuizStatsResponse)
+def get_resume_quiz_stats(quiz_id: int, db: Session = Depends(get_db)):
+    """Attempt count, mean score and per-question correctness for a resume quiz"""
+    return _quiz_stats(db, "resume_quiz", quiz_id)
+
+@router.get("/topics/{topic_id}/stats", response_model=TopicStatsResponse)
+def get_topic_stats(topic_id: int, db: Session = Depends(get_db)):
+    """Attempt count and mean score across all of a topic's quizzes (an alias reports its canonical topic)"""
+    topic = crud.get_canonical_topic(db, topic_id=topic_id)
+    if topic:
+        topic_id = topic.id
+    stats = db.query(TopicStats).filter(TopicStats.topic_id == topic_id).first()
+    attempts = stats.attempts if stats else 0
+    return TopicStatsResponse(
+        topic_id=topic_id,
+        attempts=attempts,
+        mean_score=round(stats.score_sum / attempts, 1) if attempts else None
+    )
@@ -1,15 +1,114 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Request, Query
+from sqlalchemy import tuple_
 from sqlalchemy.orm import Session
-from typing import List
-import json
+from starlette.concurrency import run_in_threadpool
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import base64
+from services import json_codec
+from services.json_codec import RawJSON, RawJSONResponse
 from datetime import datetime
 
 from db import get_db
-from models import ResumeUpload, ResumeQuiz
-from schemas import ResumeUploadResponse, ResumeQuizResponse, ResumeQuizContent
-from services.resume_processor import resume_processor
+from models import ResumeUpload, ResumeQuiz, QuizAttempt, QuizStats, QuestionStats
+from schemas import ResumeUploadResponse, ResumeQuizResponse, ResumeQuizContent, ResumePipelineResponse
+from services.resume_processor import get_resume_processor
+from services.circuit_breaker import CircuitOpenError
+from services.deadline import Deadline, DeadlineExceeded, GenerationTimedOut
+from services.metrics import record_cache
+from services.log import get_logger
+from services.tracing import span
+from services.shared_state import get_shared_state, LockTimeout
+from services.response_cache import response_cache
+from services.shuffle import shuffle_quiz, serve_key, MAX_SEED_LENGTH
+from services.grading import answer_keys
+from services.dedup import question_texts
+from services.scheduler import generation_slot, RESUME
 
 router = APIRouter()
+logger = get_logger("routes.resume")
+
+def _save_upload(db: Session, filename: str, file_size: int, extracted_text: str, extracted_topics: Dict) -> ResumeUpload:
+    resume_upload = ResumeUpload(
+        filename=filename,
+        original_filename=filename,
+        file_size=file_size,
+        extracted_text=extracted_text,
+        extracted_topics=json_codec.dumps(extracted_topics),
+        processed=True,
+        created_at=datetime.utcnow()
+    )
+    
+    db.add(resume_upload)
+    db.commit()
+    db.refresh(resume_upload)
+    return resume_upload
+
+def _complete_quiz(quiz_data: Dict, extracted_topics: Dict, filename: str, deadline: Deadline) -> Dict:
+    """Top the generated questions up to exactly 30 and build the stored quiz content"""
+    questions = quiz_data.get("questions", [])
+    if len(questions) < 30:
+        # If we have fewer than 30 questions, try to generate more
+        additional_needed = 30 - len(questions)
+        tech_skills = extracted_topics.get("technical_skills", ["General Programming"])
+        
+        # Generate additional questions
+        from services.gemini_client import generate_quiz
+        try:
+            with span("resume_quiz.top_up", needed=additional_needed):
+                additional_quiz = generate_quiz(", ".join(tech_skills[:3]), difficulty="medium",
+                                                endpoint="resume_quiz", deadline=deadline,
+                                                avoid=question_texts(questions))
+        except DeadlineExceeded as e:
+            raise DeadlineExceeded(str(e), partial_results=questions)
+        
+        if additional_quiz and "questions" in additional_quiz:
+            questions.extend(additional_quiz["questions"][:additional_needed])
+    
+    # Limit to exactly 30 questions
+    questions = questions[:30]
+    
+    return {
+        "title": quiz_data.get("title", f"Resume Assessment: {filename}"),
+        "resume_filename": filename,
+        "questions": questions,
+        "total_questions": len(questions),
+        "extracted_topics": extracted_topics.get("technical_skills", []),
+        "difficulty": quiz_data.get("difficulty", "medium"),
+        "experience_level": extracted_topics.get("experience_years", 0)
+    }
+
+def _save_quiz(db: Session, upload_id: int, quiz_content: Dict) -> ResumeQuiz:
+    resume_quiz = ResumeQuiz(
+        resume_upload_id=upload_id,
+        content_json=json_codec.dumps(quiz_content),
+        difficulty=quiz_content["difficulty"],
+        total_questions=quiz_content["total_questions"],
+        created_at=datetime.utcnow()
+    )
+    
+    db.add(resume_quiz)
+    db.commit()
+    db.refresh(resume_quiz)
+    response_cache.invalidate(f"resume_quiz:{upload_id}")
+    return resume_quiz
+
+def _generation_error(e: Exception, upload_id: int) -> HTTPException:
+    """Map a failure while generating a resume quiz to the HTTP error the client sees"""
+    if isinstance(e, HTTPException):
+        return e
+    if isinstance(e, DeadlineExceeded):
+        logger.warning("Resume quiz generation timed out: %s", e, extra={"upload_id": upload_id})
+        return GenerationTimedOut(e, upload_id=upload_id)
+    if isinstance(e, LockTimeout):
+        return HTTPException(status_code=409, detail="A quiz for this resume is already being generated")
+    if isinstance(e, CircuitOpenError):
+        return HTTPException(
+            status_code=503,
+            detail="AI service is temporarily unavailable. Please try again shortly.",
+            headers={"Retry-After": str(max(1, int(e.retry_after)))}
+        )
+    return HTTPException(status_code=500, detail=f"Failed to generate quiz: {str(e)}")
 
 @router.post("/upload-resume", response_model=ResumeUploadResponse)
 async def upload_resume(
@@ -17,41 +116,28 @@ async def upload_resume(
     db: Session = Depends(get_db)
 ):
     """Upload and process a resume file"""
+    resume_processor = get_resume_processor()
     try:
-        print(f"📄 Received file upload: {file.filename}")
         
         # Validate file
         file_content = await file.read()
-        print(f"📊 File size: {len(file_content)} bytes")
         
         resume_processor.validate_file(file.filename, len(file_content))
-        print(f"✅ File validation passed")
         
         # Extract text from resume
-        extracted_text = await resume_processor.extract_text_from_file(file_content, file.filename)
-        print(f"📝 Text extraction completed: {len(extracted_text)} characters")
+        with span("resume.extract_text", file_size=len(file_content)):
+            extracted_text = await resume_processor.extract_text_from_file(file_content, file.filename)
+        logger.info("Resume text extracted", extra={"file_size": len(file_content), "chars": len(extracted_text)})
         
         if not extracted_text.strip():
             raise HTTPException(status_code=400, detail="Could not extract text from the resume. Please ensure the file is not corrupted.")
         
         # Extract topics and skills
-        extracted_topics = resume_processor.extract_topics_and_skills(extracted_text)
-        print(f"🔍 Topics extracted: {list(extracted_topics.keys())}")
+        with span("resume.extract_topics", chars=len(extracted_text)):
+            extracted_topics = resume_processor.extract_topics_and_skills(extracted_text)
         
         # Save to database
-        resume_upload = ResumeUpload(
-            filename=file.filename,
-            original_filename=file.filename,
-            file_size=len(file_content),
-            extracted_text=extracted_text,
-            extracted_topics=json.dumps(extracted_topics),
-            processed=True,
-            created_at=datetime.utcnow()
-        )
-        
-        db.add(resume_upload)
-        db.commit()
-        db.refresh(resume_upload)
+        resume_upload = _save_upload(db, file.filename, len(file_content), extracted_text, extracted_topics)
         
         return ResumeUploadResponse(
             id=resume_upload.id,
@@ -61,125 +147,232 @@ async def upload_resume(
         )
         
     except ValueError as e:
-        print(f"❌ Validation error: {str(e)}")
+        logger.info("Resume validation failed: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        print(f"❌ Unexpected error in resume upload: {str(e)}")
-        print(f"🔍 Error type: {type(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Unexpected error in resume upload: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to process resume: {str(e)}")
 
 @router.post("/generate-resume-quiz/{upload_id}", response_model=ResumeQuizResponse)
 async def generate_resume_quiz(
     upload_id: int,
+    request: Request,
     db: Session = Depends(get_db)
 ):
-    """Generate a 30-question quiz based on uploaded resume"""
+    """Generate a 30-question quiz based on uploaded resume (429 with Retry-After when generation is saturated)"""
+    # Overall budget shared by every batch, key, retry and timeout below
+    deadline = Deadline.from_env()
+    resume_processor = get_resume_processor()
     try:
-        print(f"🎯 Generating quiz for upload ID: {upload_id}")
         
         # Get the uploaded resume
         resume_upload = db.query(ResumeUpload).filter(ResumeUpload.id == upload_id).first()
         
         if not resume_upload:
-            print(f"❌ Resume upload not found for ID: {upload_id}")
             raise HTTPException(status_code=404, detail="Resume upload not found")
         
-        print(f"✅ Found resume: {resume_upload.filename}")
         
-        # Check if quiz already exists
-        existing_quiz = db.query(ResumeQuiz).filter(ResumeQuiz.resume_upload_id == upload_id).first()
-        if existing_quiz:
-            print(f"♻️ Quiz already exists for upload ID: {upload_id}")
+        # One generation per resume across all workers; a concurrent request
+        # waits here and then finds the quiz the first one saved
+        async with get_shared_state().async_lock(f"resume_quiz:{upload_id}", ttl=deadline.budget + 30,
+                                                 timeout=deadline.remaining()):
+            # Check if quiz already exists
+            existing_quiz = db.query(ResumeQuiz).filter(ResumeQuiz.resume_upload_id == upload_id).first()
+            record_cache("resume_quiz", existing_quiz is not None)
+            if existing_quiz:
+                logger.debug("Quiz already exists for upload %d", upload_id)
+                return ResumeQuizResponse(
+                    id=existing_quiz.id,
+                    resume_upload_id=existing_quiz.resume_upload_id,
+                    quiz_content=shuffle_quiz(json_codec.loads(existing_quiz.content_json),
+                                              serve_key("resume_quiz", existing_quiz.id)),
+                    message="Quiz already exists for this resume"
+                )
+        
+            # Parse extracted topics
+            extracted_topics = json_codec.loads(resume_upload.extracted_topics)
+        
+            # Generate quiz (blocking Gemini calls run in the threadpool, off the event loop)
+            # once the scheduler admits it, so resume bursts cannot crowd out topic quizzes
+            async with generation_slot(request, RESUME, timeout=deadline.remaining()):
+                quiz_data = await run_in_threadpool(
+                    resume_processor.generate_resume_quiz,
+                    resume_upload.extracted_text,
+                    extracted_topics,
+                    resume_upload.filename,
+                    deadline=deadline
+                )
+                quiz_content = await run_in_threadpool(
+                    _complete_quiz, quiz_data, extracted_topics, resume_upload.filename, deadline
+                )
+        
+            # Save quiz to database
+            resume_quiz = await run_in_threadpool(_save_quiz, db, upload_id, quiz_content)
+        
             return ResumeQuizResponse(
-                id=existing_quiz.id,
-                resume_upload_id=existing_quiz.resume_upload_id,
-                quiz_content=json.loads(existing_quiz.content_json),
-                message="Quiz already exists for this resume"
+                id=resume_quiz.id,
+                resume_upload_id=resume_quiz.resume_upload_id,
+                quiz_content=shuffle_quiz(quiz_content, serve_key("resume_quiz", resume_quiz.id)),
+                message="Quiz generated successfully"
             )
         
-        # Parse extracted topics
-        extracted_topics = json.loads(resume_upload.extracted_topics)
-        print(f"📊 Extracted topics: {extracted_topics}")
-        
-        # Generate quiz
-        print(f"🤖 Starting quiz generation...")
-        quiz_data = resume_processor.generate_resume_quiz(
-            resume_upload.extracted_text,
-            extracted_topics,
-            resume_upload.filename
-        )
-        print(f"✅ Quiz generation completed!")
-        
-        # Ensure we have exactly 30 questions
-        questions = quiz_data.get("questions", [])
-        if len(questions) < 30:
-            # If we have fewer than 30 questions, try to generate more
-            additional_needed = 30 - len(questions)
-            tech_skills = extracted_topics.get("technical_skills", ["General Programming"])
-            
-            # Generate additional questions
-            from services.gemini_client import generate_quiz
-            additional_prompt = f"Create {additional_needed} additional multiple choice questions about {', '.join(tech_skills[:3])}"
-            additional_quiz = generate_quiz(additional_prompt, difficulty="medium")
-            
-            if additional_quiz and "questions" in additional_quiz:
-                questions.extend(additional_quiz["questions"][:additional_needed])
-        
-        # Limit to exactly 30 questions
-        questions = questions[:30]
-        
-        quiz_content = {
-            "title": quiz_data.get("title", f"Resume Assessment: {resume_upload.filename}"),
-            "resume_filename": resume_upload.filename,
-            "questions": questions,
-            "total_questions": len(questions),
-            "extracted_topics": extracted_topics.get("technical_skills", []),
-            "difficulty": quiz_data.get("difficulty", "medium"),
-            "experience_level": extracted_topics.get("experience_years", 0)
-        }
-        
-        # Save quiz to database
-        resume_quiz = ResumeQuiz(
-            resume_upload_id=upload_id,
-            content_json=json.dumps(quiz_content),
-            difficulty=quiz_data.get("difficulty", "medium"),
-            total_questions=len(questions),
-            created_at=datetime.utcnow()
-        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise _generation_error(e, upload_id)
+
+async def _settle(generation: "asyncio.Future") -> None:
+    """
+    Wait for a generation that is no longer needed. Its Gemini calls run in a
+    threadpool thread that cannot be cancelled, so the RESUME slot is held
+    until they finish; its exception, if any, is retrieved so asyncio does
+    not report it as never retrieved.
+    """
+    await asyncio.wait({generation})
+    if not generation.cancelled() and generation.exception() is not None:
+        logger.debug("Abandoned resume generation failed: %s", generation.exception())
+
+@router.post("/resume-quiz-pipeline", response_model=ResumePipelineResponse)
+async def upload_and_generate_resume_quiz(
+    request: Request,
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db)
+):
+    """
+    Upload a resume and generate its quiz in one request. The Gemini batches
+    start as soon as skills are extracted; the upload row is saved while they
+    run and the quiz is saved when they finish, so the client makes one round
+    trip instead of upload-resume followed by generate-resume-quiz.
+
+    If generation fails after the upload was saved, the upload is kept and
+    the error carries its id in X-Upload-ID; the client retries with
+    generate-resume-quiz/{upload_id} instead of uploading the file again.
+    """
+    deadline = Deadline.from_env()
+    resume_processor = get_resume_processor()
+    try:
+        file_content = await file.read()
+        resume_processor.validate_file(file.filename, len(file_content))
         
-        db.add(resume_quiz)
-        db.commit()
-        db.refresh(resume_quiz)
+        with span("resume.extract_text", file_size=len(file_content)):
+            extracted_text = await resume_processor.extract_text_from_file(file_content, file.filename)
         
-        return ResumeQuizResponse(
-            id=resume_quiz.id,
-            resume_upload_id=resume_quiz.resume_upload_id,
-            quiz_content=quiz_content,
-            message="Quiz generated successfully"
-        )
+        if not extracted_text.strip():
+            raise HTTPException(status_code=400, detail="Could not extract text from the resume. Please ensure the file is not corrupted.")
         
+        with span("resume.extract_topics", chars=len(extracted_text)):
+            extracted_topics = resume_processor.extract_topics_and_skills(extracted_text)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.info("Resume validation failed: %s", e)
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to generate quiz: {str(e)}")
+        logger.exception("Unexpected error in resume upload: %s", e)
+        raise HTTPException(status_code=500, detail=f"Failed to process resume: {str(e)}")
+    
+    # Nothing is saved when generation is saturated (429), so the client simply retries
+    async with generation_slot(request, RESUME, timeout=deadline.remaining()):
+        # Start generating straight from the in-memory text and topics ...
+        generation = asyncio.ensure_future(run_in_threadpool(
+            resume_processor.generate_resume_quiz, extracted_text, extracted_topics, file.filename, deadline=deadline
+        ))
+        
+        # ... and persist the upload while it runs
+        try:
+            resume_upload = await run_in_threadpool(
+                _save_upload, db, file.filename, len(file_content), extracted_text, extracted_topics
+            )
+        except Exception as e:
+            logger.exception("Failed to save resume upload: %s", e)
+            await _settle(generation)
+            raise HTTPException(status_code=500, detail=f"Failed to process resume: {str(e)}")
+        upload_id = resume_upload.id
+        logger.info("Resume uploaded, generation in progress", extra={"upload_id": upload_id,
+                                                                      "chars": len(extracted_text)})
+        
+        try:
+            # Held like generate-resume-quiz does, so a retry of that route waits for this quiz
+            async with get_shared_state().async_lock(f"resume_quiz:{upload_id}", ttl=deadline.budget + 30,
+                                                     timeout=deadline.remaining()):
+                quiz_data = await generation
+                quiz_content = await run_in_threadpool(
+                    _complete_quiz, quiz_data, extracted_topics, file.filename, deadline
+                )
+                resume_quiz = await run_in_threadpool(_save_quiz, db, upload_id, quiz_content)
+        except Exception as e:
+            await _settle(generation)
+            error = _generation_error(e, upload_id)
+            error.headers = {**(error.headers or {}), "X-Upload-ID": str(upload_id)}
+            raise error
+    
+    return ResumePipelineResponse(
+        id=resume_quiz.id,
+        resume_upload_id=upload_id,
+        filename=file.filename,
+        extracted_topics=extracted_topics,
+        quiz_content=shuffle_quiz(quiz_content, serve_key("resume_quiz", resume_quiz.id)),
+        message="Resume uploaded and quiz generated successfully"
+    )
+
+RESUME_UPLOADS_PAGE_SIZE = 50
+RESUME_UPLOADS_MAX_PAGE_SIZE = 200
+
+def _encode_cursor(created_at: datetime, upload_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{upload_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, upload_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(upload_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 @router.get("/resume-uploads", response_model=List[ResumeUploadResponse])
-async def get_resume_uploads(db: Session = Depends(get_db)):
-    """Get all uploaded resumes"""
+def get_resume_uploads(
+    cursor: Optional[str] = None,
+    limit: int = Query(RESUME_UPLOADS_PAGE_SIZE, ge=1, le=RESUME_UPLOADS_MAX_PAGE_SIZE),
+    db: Session = Depends(get_db)
+):
+    """
+    Get uploaded resumes, newest first, one page at a time. Pass the
+    X-Next-Cursor response header back as `cursor` for the next page; the
+    header is absent on the last page.
+    """
+    # Keyset pagination on (created_at, id), served by ix_resume_uploads_created_at_id:
+    # each page costs the same however deep it is, unlike OFFSET
+    after = _decode_cursor(cursor) if cursor else None
     try:
-        uploads = db.query(ResumeUpload).order_by(ResumeUpload.uploaded_at.desc()).all()
+        # Only the columns the response needs; extracted_text is never read
+        query = db.query(
+            ResumeUpload.id,
+            ResumeUpload.filename,
+            ResumeUpload.extracted_topics,
+            ResumeUpload.created_at,
+        )
+        if after is not None:
+            query = query.filter(tuple_(ResumeUpload.created_at, ResumeUpload.id) < tuple_(*after))
+        rows = (
+            query.order_by(ResumeUpload.created_at.desc(), ResumeUpload.id.desc())
+            .limit(limit + 1)
+            .all()
+        )
         
-        result = []
-        for upload in uploads:
-            extracted_topics = json.loads(upload.extracted_topics) if upload.extracted_topics else {}
-            result.append(ResumeUploadResponse(
-                id=upload.id,
-                filename=upload.filename,
-                extracted_topics=extracted_topics,
-                message="Resume data retrieved"
-            ))
+        page, has_more = rows[:limit], len(rows) > limit
+        # extracted_topics is stored as JSON already, so it is spliced in rather than parsed
+        result = [{
+            "id": row.id,
+            "filename": row.filename,
+            "extracted_topics": RawJSON(row.extracted_topics or "{}"),
+            "message": "Resume data retrieved"
+        } for row in page]
         
-        return result
+        headers = {}
+        if has_more:
+            headers["X-Next-Cursor"] = _encode_cursor(page[-1].created_at, page[-1].id)
+        return RawJSONResponse(result, headers=headers)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve uploads: {str(e)}")
@@ -187,24 +380,32 @@ async def get_resume_uploads(db: Session = Depends(get_db)):
 @router.get("/resume-quiz/{upload_id}", response_model=ResumeQuizResponse)
 async def get_resume_quiz(
     upload_id: int,
+    request: Request,
+    seed: Optional[str] = Query(None, max_length=MAX_SEED_LENGTH),
     db: Session = Depends(get_db)
 ):
-    """Get quiz for a specific resume upload"""
-    try:
+    """
+    Get quiz for a specific resume upload (ETag/Last-Modified validated, cached until it changes).
+    Options are shuffled per quiz and `seed`; each seed's rendering is cached separately.
+    """
+    def build():
         resume_quiz = db.query(ResumeQuiz).filter(ResumeQuiz.resume_upload_id == upload_id).first()
         
         if not resume_quiz:
             raise HTTPException(status_code=404, detail="Quiz not found for this resume")
         
-        quiz_content = json.loads(resume_quiz.content_json)
-        
-        return ResumeQuizResponse(
-            id=resume_quiz.id,
-            resume_upload_id=resume_quiz.resume_upload_id,
-            quiz_content=quiz_content,
-            message="Quiz retrieved successfully"
-        )
-        
+        return {
+            "id": resume_quiz.id,
+            "resume_upload_id": resume_quiz.resume_upload_id,
+            "quiz_content": shuffle_quiz(json_codec.loads(resume_quiz.content_json),
+                                         serve_key("resume_quiz", resume_quiz.id, seed)),
+            "message": "Quiz retrieved successfully"
+        }, resume_quiz.created_at
+    
+    try:
+        return response_cache.respond(request, f"resume_quiz:{upload_id}", build, variant=seed or "")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve quiz: {str(e)}")
 
@@ -215,18 +416,30 @@ async def delete_resume_upload(
 ):
     """Delete a resume upload and its associated quiz"""
     try:
-        # Delete associated quiz first
-        db.query(ResumeQuiz).filter(ResumeQuiz.resume_upload_id == upload_id).delete()
-        
-        # Delete the resume upload
         resume_upload = db.query(ResumeUpload).filter(ResumeUpload.id == upload_id).first()
         if not resume_upload:
             raise HTTPException(status_code=404, detail="Resume upload not found")
         
+        # Delete associated quizzes first, with their attempts and aggregates
+        quiz_ids = [quiz_id for (quiz_id,) in
+                    db.query(ResumeQuiz.id).filter(ResumeQuiz.resume_upload_id == upload_id)]
+        if quiz_ids:
+            for model in (QuizAttempt, QuizStats, QuestionStats):
+                db.query(model).filter(model.quiz_kind == "resume_quiz", model.quiz_id.in_(quiz_ids)).delete(
+                    synchronize_session=False)
+            db.query(ResumeQuiz).filter(ResumeQuiz.id.in_(quiz_ids)).delete(synchronize_session=False)
+        
+        # Delete the resume upload
         db.delete(resume_upload)
         db.commit()
+        response_cache.invalidate(f"resume_quiz:{upload_id}")
+        if quiz_ids:
+            answer_keys.invalidate("resume_quiz")
         
         return {"message": "Resume upload and associated quiz deleted successfully"}
         
+    except HTTPException:
+        raise
     except Exception as e:
+        db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to delete resume upload: {str(e)}")
\ No newline at end of file
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 
@@ -11,6 +11,7 @@ class TopicCreate(TopicBase):
 
 class Topic(TopicBase):
     id: int
+    canonical_id: Optional[int] = None  # set when this name is an alias of another topic
     created_at: datetime
     
     class Config:
@@ -82,6 +83,36 @@ class ResumeQuiz(BaseModel):
     class Config:
         from_attributes = True
 
+# Attempt schemas
+class AttemptSubmit(BaseModel):
+    answers: List[Optional[int]]  # chosen option position per question as served (null = unanswered)
+    seed: Optional[str] = Field(None, max_length=64)  # the seed the quiz was served with, if any
+    candidate: Optional[str] = Field(None, max_length=100)
+
+class AttemptResult(BaseModel):
+    quiz_id: int
+    correct: int
+    total_questions: int
+    score: float  # percentage
+    results: List[bool]
+    status: str
+
+class QuestionStat(BaseModel):
+    question_index: int
+    attempts: int
+    correct_rate: float
+
+class QuizStatsResponse(BaseModel):
+    quiz_id: int
+    attempts: int
+    mean_score: Optional[float] = None
+    questions: List[QuestionStat]
+
+class TopicStatsResponse(BaseModel):
+    topic_id: int
+    attempts: int
+    mean_score: Optional[float] = None
+
 # Response schemas
 class ResumeUploadResponse(BaseModel):
     id: int
@@ -94,3 +125,7 @@ class ResumeQuizResponse(BaseModel):
     resume_upload_id: int
     quiz_content: Dict
     message: str
+
+class ResumePipelineResponse(ResumeQuizResponse):
+    filename: str
+    extracted_topics: Dict
@@ -0,0 +1,228 @@
+import atexit
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import update
+
+from db import SessionLocal
+from models import Quiz, QuizAttempt, QuizStats, QuestionStats, TopicStats, ResumeQuiz
+from services import json_codec
+from services.log import get_logger
+from services.metrics import attempts_written, attempt_flush_latency
+
+# Graded attempts are queued and written by one background thread in
+# batches: each batch is a single transaction that inserts the attempts and
+# folds them into the quiz, question and topic aggregates. Under a burst of
+# submissions (a timed exam ending) the database sees a few large commits
+# instead of one commit per candidate. Aggregates therefore lag submissions
+# by up to ATTEMPT_FLUSH_MS.
+
+QUIZ_MODELS = {"quiz": Quiz, "resume_quiz": ResumeQuiz}
+
+logger = get_logger("attempt_writer")
+
+class AttemptQueueFull(Exception):
+    """Raised when the writer is too far behind to accept more attempts"""
+
+def _insert_for(db):
+    """Dialect insert with ON CONFLICT support, or None if the database has none"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    return None
+
+def _existing_quizzes_only(db, batch: List[Dict]) -> List[Dict]:
+    """Drop attempts whose quiz no longer exists, with one id lookup per quiz kind"""
+    existing = set()
+    for kind, model in QUIZ_MODELS.items():
+        ids = {a["quiz_id"] for a in batch if a["quiz_kind"] == kind}
+        if ids:
+            existing.update((kind, quiz_id) for (quiz_id,) in db.query(model.id).filter(model.id.in_(ids)))
+    kept = [a for a in batch if (a["quiz_kind"], a["quiz_id"]) in existing]
+    if len(kept) < len(batch):
+        logger.info("Skipping %d queued attempts for deleted quizzes", len(batch) - len(kept))
+    return kept
+
+def _increment(db, model, key_columns: Tuple[str, ...], rows: List[Dict], counters: Tuple[str, ...]) -> None:
+    """Add each row's counter values to the aggregate row with the same key, creating it if needed"""
+    if not rows:
+        return
+    table = model.__table__
+    insert = _insert_for(db)
+    if insert is not None:
+        # One atomic upsert per aggregate row, safe with several writers on one database
+        stmt = insert(table)
+        set_ = {name: table.c[name] + stmt.excluded[name] for name in counters}
+        if "updated_at" in table.c:
+            set_["updated_at"] = stmt.excluded.updated_at
+        db.execute(stmt.on_conflict_do_update(index_elements=list(key_columns), set_=set_), rows)
+        return
+    for row in rows:
+        condition = [table.c[name] == row[name] for name in key_columns]
+        values = {name: table.c[name] + row[name] for name in counters}
+        if db.execute(update(table).where(*condition).values(**values)).rowcount == 0:
+            db.execute(table.insert(), [row])
+
+class AttemptWriter:
+    def __init__(self, session_factory=SessionLocal, batch_size: int = 500,
+                 flush_interval: float = 0.2, max_queue: int = 10000):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Optional[Dict]]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="attempt-writer", daemon=True)
+                self._thread.start()
+                # Write whatever is still queued when the worker exits
+                atexit.register(self.stop)
+
+    def submit(self, attempt: Dict) -> None:
+        """
+        Queue a graded attempt for the next batch: quiz_kind, quiz_id, topic_id,
+        seed, candidate, answers (canonical), results (per-question booleans),
+        correct, total_questions and score.
+        """
+        self.start()
+        try:
+            self._queue.put_nowait(attempt)
+        except queue.Full:
+            attempts_written.inc(result="rejected")
+            raise AttemptQueueFull("Too many attempts waiting to be saved; please retry shortly")
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Write everything still queued, then stop the thread"""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            stopping = False
+            flush_at = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, flush_at - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._write(batch)
+            if stopping:
+                return
+
+    def _write(self, batch: List[Dict]) -> None:
+        start = time.perf_counter()
+        for try_number in (1, 2):
+            try:
+                written = self.flush(batch)
+                attempts_written.inc(written, result="written")
+                if written < len(batch):
+                    attempts_written.inc(len(batch) - written, result="skipped")
+                attempt_flush_latency.observe(time.perf_counter() - start)
+                return
+            except Exception as e:
+                logger.warning("Attempt batch write failed (try %d/2): %s", try_number, e,
+                               extra={"attempts": len(batch)})
+        logger.error("Dropping %d attempts after repeated write failures", len(batch))
+        attempts_written.inc(len(batch), result="dropped")
+
+    def flush(self, batch: List[Dict]) -> int:
+        """
+        Write a batch of attempts and their aggregate updates in one
+        transaction. Attempts for quizzes deleted since they were queued are
+        skipped so they cannot recreate stats rows for a quiz that is gone.
+        Returns the number of attempts written.
+        """
+        now = datetime.utcnow()
+        db = self.session_factory()
+        try:
+            batch = _existing_quizzes_only(db, batch)
+            if batch:
+                self._write_batch(db, batch, now)
+                db.commit()
+            return len(batch)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _write_batch(self, db, batch: List[Dict], now: datetime) -> None:
+        quizzes: Dict[Tuple[str, int], List[float]] = {}
+        questions: Dict[Tuple[str, int, int], List[int]] = {}
+        topics: Dict[int, List[float]] = {}
+        resume_scores: Dict[int, int] = {}
+
+        # Fold the batch first so each aggregate row is touched once per batch
+        for attempt in batch:
+            key = (attempt["quiz_kind"], attempt["quiz_id"])
+            totals = quizzes.setdefault(key, [0, 0.0])
+            totals[0] += 1
+            totals[1] += attempt["score"]
+            for index, correct in enumerate(attempt["results"]):
+                counts = questions.setdefault(key + (index,), [0, 0])
+                counts[0] += 1
+                counts[1] += int(correct)
+            if attempt.get("topic_id") is not None:
+                totals = topics.setdefault(attempt["topic_id"], [0, 0.0])
+                totals[0] += 1
+                totals[1] += attempt["score"]
+            if attempt["quiz_kind"] == "resume_quiz":
+                resume_scores[attempt["quiz_id"]] = round(attempt["score"])
+
+        db.bulk_insert_mappings(QuizAttempt, [{
+            "quiz_kind": a["quiz_kind"],
+            "quiz_id": a["quiz_id"],
+            "topic_id": a.get("topic_id"),
+            "seed": a.get("seed"),
+            "candidate": a.get("candidate"),
+            "answers_json": json_codec.dumps(a["answers"]),
+            "correct": a["correct"],
+            "total_questions": a["total_questions"],
+            "score": a["score"],
+            "created_at": a.get("created_at", now),
+        } for a in batch])
+        _increment(db, QuizStats, ("quiz_kind", "quiz_id"), [
+            {"quiz_kind": kind, "quiz_id": quiz_id, "attempts": n, "score_sum": total, "updated_at": now}
+            for (kind, quiz_id), (n, total) in quizzes.items()
+        ], ("attempts", "score_sum"))
+        _increment(db, QuestionStats, ("quiz_kind", "quiz_id", "question_index"), [
+            {"quiz_kind": kind, "quiz_id": quiz_id, "question_index": index, "attempts": n, "correct": correct}
+            for (kind, quiz_id, index), (n, correct) in questions.items()
+        ], ("attempts", "correct"))
+        _increment(db, TopicStats, ("topic_id",), [
+            {"topic_id": topic_id, "attempts": n, "score_sum": total, "updated_at": now}
+            for topic_id, (n, total) in topics.items()
+        ], ("attempts", "score_sum"))
+        # ResumeQuiz.score keeps the latest attempt's score
+        for quiz_id, score in resume_scores.items():
+            db.execute(update(ResumeQuiz).where(ResumeQuiz.id == quiz_id).values(score=score))
+
+attempt_writer = AttemptWriter(
+    batch_size=int(os.getenv("ATTEMPT_BATCH_SIZE", "500")),
+    flush_interval=float(os.getenv("ATTEMPT_FLUSH_MS", "200")) / 1000,
+    max_queue=int(os.getenv("ATTEMPT_QUEUE_SIZE", "10000")),
+)
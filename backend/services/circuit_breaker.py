@@ -0,0 +1,152 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Deque, Optional, Tuple
+
+from services.log import get_logger
+
+logger = get_logger("circuit_breaker")
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open"""
+
+    def __init__(self, name: str, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(f"{name} circuit open: upstream unavailable, retry in {retry_after:.0f}s")
+
+class CircuitBreaker:
+    """
+    Rolling-window circuit breaker.
+
+    Closed: calls go through and outcomes are recorded.
+    Open: once the failure rate in the window crosses the threshold, calls
+    fail fast for `open_seconds`.
+    Half-open: after the cool-down a single probe call is let through; its
+    outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_rate: float = 0.5, min_calls: int = 8,
+                 window_seconds: float = 30.0, open_seconds: float = 30.0):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self._lock = threading.Lock()
+        self._outcomes: Deque[Tuple[float, bool]] = deque()
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    @classmethod
+    def from_env(cls, name: str, prefix: str) -> "CircuitBreaker":
+        """Build a breaker configured from <prefix>_ERROR_RATE, _MIN_CALLS, _WINDOW and _COOLDOWN"""
+        return cls(
+            name,
+            failure_rate=float(os.getenv(f"{prefix}_ERROR_RATE", "0.5")),
+            min_calls=int(os.getenv(f"{prefix}_MIN_CALLS", "8")),
+            window_seconds=float(os.getenv(f"{prefix}_WINDOW", "30")),
+            open_seconds=float(os.getenv(f"{prefix}_COOLDOWN", "30")),
+        )
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            return self._state
+
+    def retry_after(self) -> float:
+        """Seconds until the circuit lets a probe through again"""
+        with self._lock:
+            if self._state != self.OPEN:
+                return 0.0
+            return max(0.0, self._opened_at + self.open_seconds - time.monotonic())
+
+    def is_open(self) -> bool:
+        """True while calls should fail fast (does not consume the half-open probe)"""
+        return self.state == self.OPEN
+
+    def allow_request(self) -> bool:
+        """Return True if a call may proceed; in half-open state only one probe is allowed"""
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def check(self) -> None:
+        """Raise CircuitOpenError if a call may not proceed"""
+        if not self.allow_request():
+            raise CircuitOpenError(self.name, self.retry_after())
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._probe_in_flight = False
+            if self._state == self.HALF_OPEN:
+                self._state = self.CLOSED
+                self._outcomes.clear()
+            self._record(time.monotonic(), True)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._probe_in_flight = False
+            if self._state == self.HALF_OPEN:
+                self._open(now)
+                return
+            self._record(now, False)
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            total = len(self._outcomes)
+            if self._state == self.CLOSED and total >= self.min_calls and failures / total >= self.failure_rate:
+                self._open(now)
+
+    def record_neutral(self) -> None:
+        """Outcome says nothing about upstream health (e.g. a per-key 429); just free the probe"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def _record(self, now: float, ok: bool) -> None:
+        self._outcomes.append((now, ok))
+        cutoff = now - self.window_seconds
+        while self._outcomes and self._outcomes[0][0] < cutoff:
+            self._outcomes.popleft()
+
+    def _open(self, now: float) -> None:
+        self._state = self.OPEN
+        self._opened_at = now
+        self._outcomes.clear()
+        logger.warning("Circuit '%s' opened for %.0fs", self.name, self.open_seconds)
+
+    def _maybe_half_open(self, now: float) -> None:
+        if self._state == self.OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+
+class LatencyTracker:
+    """Keeps the most recent successful call latencies to estimate percentiles"""
+
+    def __init__(self, max_samples: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._samples: Deque[float] = deque(maxlen=max_samples)
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Return the pct-th percentile, or None until enough samples exist"""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+        return ordered[index]
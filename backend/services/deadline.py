@@ -0,0 +1,62 @@
+import os
+import time
+from typing import Any, List, Optional
+
+from fastapi import HTTPException
+
+class DeadlineExceeded(Exception):
+    """Raised when a request runs out of its time budget; carries whatever was finished"""
+
+    def __init__(self, message: str = "Request deadline exceeded", partial_results: Optional[List[Any]] = None):
+        self.partial_results = partial_results or []
+        super().__init__(message)
+
+class GenerationTimedOut(HTTPException):
+    """
+    504 for a generation that ran out of time. `detail` stays a plain string
+    like every other error; the questions finished before the deadline (and
+    any other `fields`) are returned next to it in the response body.
+    """
+
+    def __init__(self, e: DeadlineExceeded, **fields: Any):
+        super().__init__(status_code=504, detail="Quiz generation timed out. Please try again.")
+        self.fields = {"partial_questions": e.partial_results, **fields}
+
+class Deadline:
+    """
+    A request-scoped time budget passed down from the route so retries,
+    backoffs and per-attempt timeouts never run past the point where the
+    proxy has already given up on the client.
+    """
+
+    def __init__(self, seconds: float):
+        self.budget = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    @classmethod
+    def from_env(cls, default: float = 90.0) -> "Deadline":
+        """Budget from REQUEST_DEADLINE_SECONDS (keep it below the proxy timeout)"""
+        return cls(float(os.getenv("REQUEST_DEADLINE_SECONDS", default)))
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def check(self, partial_results: Optional[List[Any]] = None) -> None:
+        """Raise DeadlineExceeded (with any partial results) once the budget is spent"""
+        if self.expired():
+            raise DeadlineExceeded(
+                f"Request exceeded its {self.budget:g}s deadline",
+                partial_results=partial_results
+            )
+
+    def clip(self, timeout: float) -> float:
+        """Shrink a per-attempt timeout to the time left, raising if nothing is left"""
+        self.check()
+        return min(timeout, self.remaining())
+
+    def allows_wait(self, seconds: float) -> bool:
+        """True if sleeping `seconds` still leaves time for another attempt"""
+        return self.remaining() > seconds
@@ -0,0 +1,96 @@
+import os
+import re
+import zlib
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+# Near-duplicate question filtering. Gemini often asks the same question in
+# different words across batches; exact hashes miss that, so each question
+# is turned into a hashed vector of word shingles (single words and adjacent
+# word pairs) and a whole batch is compared at once with one matrix product
+# (cosine similarity of L2-normalized rows) against itself and against the
+# questions it must not repeat.
+#
+# Words are compared whole, after dropping function words and the phrasing
+# every quiz question shares ("which of the following ..."), so two questions
+# that differ only in the term they ask about (useEffect vs useMemo, EXPOSE
+# vs VOLUME) stay apart. Word pairs count for less than single words, so a
+# reordered question still matches itself, and negations count for more,
+# since "which is NOT ..." asks the opposite question. tools/check_dedup.py
+# checks the cutoff against such pairs.
+
+DIMENSIONS = 4096  # power of two, so the hash is reduced with a mask
+DEFAULT_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.88"))
+PAIR_WEIGHT = 0.5
+NEGATION_WEIGHT = 3.0
+
+# How many of a topic's latest quizzes new questions are checked against for repeats
+RECENT_QUIZZES = int(os.getenv("DEDUP_RECENT_QUIZZES", "5"))
+
+STOP_WORDS = frozenset("""
+    a an the and or of to in on at by for from with into as is are was were be been being it its this that
+    these those there their they you your we our do does did can could should would will shall may might
+    has have had how what which who whom whose when where why if than then so such about
+    following statement statements true correct best describes described option options question
+    example given used use using
+""".split())
+NEGATIONS = frozenset({"not", "except", "never", "cannot", "false", "incorrect", "least"})
+
+def _words(text: str) -> List[str]:
+    words = []
+    for word in re.findall(r"[^\W_]+", text.lower()):
+        if word in STOP_WORDS or (len(word) == 1 and not word.isdigit()):
+            continue
+        # Plurals and third-person verbs: "keywords" / "keyword", "creates" / "create"
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(word)
+    return words
+
+def _shingles(text: str) -> List[Tuple[str, float]]:
+    words = _words(text)
+    shingles = [(word, NEGATION_WEIGHT if word in NEGATIONS else 1.0) for word in words]
+    shingles.extend((f"{first} {second}", PAIR_WEIGHT) for first, second in zip(words, words[1:]))
+    return shingles
+
+def vectorize(texts: Sequence[str]) -> np.ndarray:
+    """L2-normalized hashed, weighted word shingle counts, one row per text"""
+    rows: List[int] = []
+    columns: List[int] = []
+    weights: List[float] = []
+    for row, text in enumerate(texts):
+        for shingle, weight in _shingles(text):
+            rows.append(row)
+            columns.append(zlib.crc32(shingle.encode("utf-8")) & (DIMENSIONS - 1))
+            weights.append(weight)
+    vectors = np.zeros((len(texts), DIMENSIONS), dtype=np.float32)
+    np.add.at(vectors, (rows, columns), weights)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def duplicate_mask(candidates: Sequence[str], existing: Sequence[str] = (),
+                   threshold: float = DEFAULT_THRESHOLD) -> np.ndarray:
+    """
+    True for each candidate that is at least `threshold` similar to an
+    existing text or to an earlier candidate (so the first of a group is kept).
+    """
+    if not candidates:
+        return np.zeros(0, dtype=bool)
+    vectors = vectorize(list(candidates) + list(existing))
+    batch = vectors[:len(candidates)]
+    duplicates = np.triu(batch @ batch.T, k=1).max(axis=0) >= threshold
+    if len(existing):
+        duplicates |= (batch @ vectors[len(candidates):].T).max(axis=1) >= threshold
+    return duplicates
+
+def question_texts(questions: Sequence[Dict]) -> List[str]:
+    return [str(question.get("q", "")) for question in questions]
+
+def filter_questions(questions: List[Dict], avoid: Sequence[str] = (),
+                     threshold: float = DEFAULT_THRESHOLD) -> Tuple[List[Dict], int]:
+    """Drop questions that repeat each other or any text in `avoid`; returns (kept, removed count)"""
+    mask = duplicate_mask(question_texts(questions), avoid, threshold)
+    kept = [question for question, duplicate in zip(questions, mask) if not duplicate]
+    return kept, len(questions) - len(kept)
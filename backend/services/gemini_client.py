@@ -1,9 +1,48 @@
 import os
 import requests
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Sequence, Tuple
 import json
-import random
+import contextvars
+import hashlib
 import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from services.circuit_breaker import CircuitBreaker, CircuitOpenError, LatencyTracker
+from services.deadline import Deadline, DeadlineExceeded
+from services.log import get_logger, SAMPLED
+from services.metrics import gemini_latency_seconds, gemini_requests, gemini_retries, duplicate_questions
+
+from services import json_codec
+from services.dedup import filter_questions, question_texts
+from services.prompts import render_prompt
+from services.quiz_schema import QUIZ_RESPONSE_SCHEMA, partition_questions
+from services.shared_state import get_shared_state
+from services.token_usage import TokenUsage, token_usage
+from services.tracing import span, current_span, traced
+
+logger = get_logger("gemini")
+
+# Number of questions requested per generation call
+QUESTIONS_PER_QUIZ = 10
+
+# What the quiz prompt asks the questions to focus on unless a caller overrides it
+DEFAULT_FOCUS = "key concepts and practical application"
+
+# Shared health tracking for the Gemini upstream (all keys hit the same service)
+gemini_breaker = CircuitBreaker.from_env("gemini", "GEMINI_BREAKER")
+gemini_latency = LatencyTracker()
+
+# How long a key is skipped after a 429 (unless Retry-After says otherwise) or a 403
+KEY_RATE_LIMIT_COOLDOWN = float(os.getenv("GEMINI_KEY_COOLDOWN_SECONDS", "60"))
+KEY_FORBIDDEN_COOLDOWN = float(os.getenv("GEMINI_KEY_FORBIDDEN_COOLDOWN_SECONDS", "3600"))
+
+# Threads for hedged requests; a hedge that loses keeps running until its
+# HTTP call returns, so the pool is bounded
+_hedge_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="gemini-hedge")
+
+def hedging_enabled() -> bool:
+    """Hedged requests are opt-in via GEMINI_HEDGE_ENABLED"""
+    return os.getenv("GEMINI_HEDGE_ENABLED", "").lower() in ("1", "true", "yes")
 
 def get_available_api_keys() -> List[str]:
     """
@@ -26,12 +65,40 @@ def get_available_api_keys() -> List[str]:
     
     return api_keys
 
+def key_fingerprint(api_key: str) -> str:
+    """Short, stable identifier for a key in shared state (never store the key itself)"""
+    return hashlib.sha256(api_key.encode()).hexdigest()[:12]
+
+def _daily_calls_key(api_key: str) -> str:
+    return f"gemini:calls:{key_fingerprint(api_key)}:{time.strftime('%Y%m%d', time.gmtime())}"
+
+def key_available(api_key: str) -> bool:
+    """False while the key is cooling down or has used up GEMINI_DAILY_QUOTA (0 = unlimited)"""
+    state = get_shared_state()
+    if state.get(f"gemini:cooldown:{key_fingerprint(api_key)}") is not None:
+        return False
+    quota = int(os.getenv("GEMINI_DAILY_QUOTA", "0"))
+    return not quota or int(state.get(_daily_calls_key(api_key)) or 0) < quota
+
+def cool_down_key(api_key: str, seconds: float, reason: str) -> None:
+    """Make every worker skip this key for `seconds`"""
+    get_shared_state().set(f"gemini:cooldown:{key_fingerprint(api_key)}", reason, ttl=seconds)
+
+def count_key_call(api_key: str) -> int:
+    """Count a request against the key's daily quota; counters expire after two days"""
+    return get_shared_state().incr(_daily_calls_key(api_key), ttl=2 * 86400)
+
+def retry_after_seconds(response: requests.Response, default: float) -> float:
+    """Cooldown from the response's Retry-After header when it gives one in seconds"""
+    value = response.headers.get("Retry-After", "")
+    return float(value) if value.strip().isdigit() else default
+
 def test_api_key(api_key: str) -> bool:
     """
     Test if an API key is valid and not quota exceeded.
     Returns True if the key is usable, False otherwise.
     """
-    test_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key={api_key}"
+    test_url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent"
     
     test_payload = {
         "contents": [{
@@ -43,7 +110,7 @@ def test_api_key(api_key: str) -> bool:
         response = requests.post(
             test_url,
             json=test_payload,
-            headers={"Content-Type": "application/json"},
+            headers={"Content-Type": "application/json", "x-goog-api-key": api_key},
             timeout=10
         )
         
@@ -57,68 +124,101 @@ def test_api_key(api_key: str) -> bool:
     except Exception:
         return False
 
-def randomize_quiz_answers(quiz_data: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Randomize the correct answer positions in a quiz to prevent predictability.
-    Takes the correct answer (always at index 0 from Gemini) and shuffles options.
-    """
-    if "questions" not in quiz_data:
-        return quiz_data
-    
-    for question in quiz_data["questions"]:
-        if "options" in question and "answer_index" in question:
-            # Get the current correct answer
-            correct_answer = question["options"][question["answer_index"]]
-            
-            # Shuffle all options
-            options = question["options"].copy()
-            random.shuffle(options)
-            
-            # Find where the correct answer ended up after shuffling
-            new_correct_index = options.index(correct_answer)
-            
-            # Update the question with shuffled options and new correct index
-            question["options"] = options
-            question["answer_index"] = new_correct_index
-    
-    return quiz_data
-
-def generate_quiz(topic: str, difficulty: str) -> Dict[str, Any]:
+@traced("gemini.generate_quiz")
+def generate_quiz(topic: str, difficulty: str, focus: str = DEFAULT_FOCUS,
+                  endpoint: str = "topic_quiz", deadline: Optional[Deadline] = None,
+                  avoid: Sequence[str] = (), key_offset: int = 0) -> Dict[str, Any]:
     """
     Generate a quiz using the Gemini API with rotating API keys for quota management.
     
     Args:
         topic: The topic for the quiz
         difficulty: easy, medium, or hard
+        focus: What the questions should concentrate on
+        endpoint: Label used to attribute token usage in the usage report
+        deadline: Request budget; keys, retries and timeouts are clipped to it
+        avoid: Question texts the new questions must not repeat (near-duplicates are dropped)
+        key_offset: Start with the available key at this position (bulk callers spread load across keys)
     
     Returns:
         Dictionary containing quiz data
     
     Raises:
+        DeadlineExceeded: If the request budget runs out
         Exception: If all API keys fail or return invalid data
     """
+    current_span().set("endpoint", endpoint)
+    
     # Get all available API keys
     api_keys = get_available_api_keys()
     
     if not api_keys:
-        print(f"❌ Error: No valid GEMINI_API_KEY found")
+        logger.error("No valid GEMINI_API_KEY found")
         raise Exception("No Gemini API keys configured. Please add valid API keys to environment variables.")
     
-    print(f"🔑 Found {len(api_keys)} API key(s) available")
+    logger.debug("Found %d API key(s) available", len(api_keys))
+    
+    # Token usage across every key and retry spent on this quiz
+    usage = TokenUsage()
+    
+    # Stable per-slot labels for metrics and logs, then skip keys that any
+    # worker has recently seen rate limited, disabled or over its daily quota
+    key_labels = {key: f"key{n}" for n, key in enumerate(api_keys, start=1)}
+    api_keys = [key for key in api_keys if key_available(key)]
+    if not api_keys:
+        logger.warning("All API keys are cooling down or over quota")
+        token_usage.record(endpoint, usage, success=False)
+        raise Exception("All API keys have exceeded their quota limits. Please try again later or add more API keys.")
+    if key_offset:
+        start = key_offset % len(api_keys)
+        api_keys = api_keys[start:] + api_keys[:start]
+    
+    # Fail fast while the upstream is known to be down
+    if gemini_breaker.is_open():
+        token_usage.record(endpoint, usage, success=False)
+        raise CircuitOpenError(gemini_breaker.name, gemini_breaker.retry_after())
+    
+    # Once enough latency samples exist, a slow call on one key is hedged on the next
+    hedge_after = gemini_latency.percentile(95) if hedging_enabled() else None
     
     # Try each API key until one works
     last_error = None
-    for i, api_key in enumerate(api_keys):
+    i = 0
+    while i < len(api_keys):
+        api_key = api_keys[i]
+        hedge_key = api_keys[i + 1] if hedge_after is not None and i + 1 < len(api_keys) else None
+        keys_used = 1
         try:
-            print(f"🤖 Trying API key {i+1}/{len(api_keys)} for {topic} ({difficulty}) - Key: {api_key[:10]}...")
+            with span("gemini.key_attempt", key=key_labels[api_key], hedged=hedge_key is not None):
+                if deadline:
+                    deadline.check()
+                logger.debug("Trying API %s (%d/%d)", key_labels[api_key], i + 1, len(api_keys),
+                             extra={"topic": topic, "difficulty": difficulty})
             
-            result = call_gemini_api(api_key, topic, difficulty)
-            if result:
-                print(f"✅ Successfully generated quiz using API key {i+1}")
-                return result
+                if hedge_key:
+                    result, hedged, error = call_with_hedge(
+                        api_key, hedge_key, hedge_after, topic, difficulty, focus, usage, deadline,
+                        key_labels=(key_labels[api_key], key_labels[hedge_key]), avoid=avoid)
+                    if hedged:
+                        keys_used = 2
+                    if error is not None:
+                        raise error
+                else:
+                    result = call_gemini_api(api_key, topic, difficulty, focus=focus, usage=usage,
+                                             deadline=deadline, key_label=key_labels[api_key], avoid=avoid)
+                if result:
+                    logger.info("Quiz generated", extra={"key": key_labels[api_key], "endpoint": endpoint,
+                                                         "calls": usage.calls, **SAMPLED})
+                    token_usage.record(endpoint, usage)
+                    return result
                 
+        except (CircuitOpenError, DeadlineExceeded):
+            # The upstream itself is failing or the caller has run out of time;
+            # other keys will not help
+            token_usage.record(endpoint, usage, success=False)
+            raise
         except Exception as e:
-            print(f"❌ API key {i+1} failed: {str(e)}")
+            logger.warning("API %s failed: %s", key_labels[api_key], e)
             last_error = e
             
             # Check error type
@@ -126,25 +226,24 @@ def generate_quiz(topic: str, difficulty: str) -> Dict[str, Any]:
             
             # For quota errors (429), try next key immediately
             if "429" in str(e) or "quota" in error_str:
-                print(f"🔄 Key {i+1} quota exceeded, trying next key...")
-                continue
+                logger.info("%s quota exceeded, trying next key", key_labels[api_key])
             
             # For API disabled errors (403), try next key immediately
-            if "403" in str(e) or "permission" in error_str or "disabled" in error_str:
-                print(f"🔄 Key {i+1} API disabled, trying next key...")
-                continue
+            elif "403" in str(e) or "permission" in error_str or "disabled" in error_str:
+                logger.info("%s API disabled, trying next key", key_labels[api_key])
             
-            # For overloaded errors (503), wait a bit before trying next key
-            if "503" in str(e) or "overloaded" in error_str or "unavailable" in error_str:
-                print(f"⏳ API overloaded, waiting 2 seconds before next key...")
-                time.sleep(2)
-                continue
-            
-            # For other errors, also try the next key
-            continue
+            # For overloaded errors (503), call_gemini_api has already backed off
+            # and the circuit breaker tracks the outage, so move on without sleeping
+            elif "503" in str(e) or "overloaded" in error_str or "unavailable" in error_str:
+                logger.info("API overloaded on %s, trying next key", key_labels[api_key])
+        
+        # A hedge that fired has already used the following key as well; one
+        # that never fired (the primary failed fast) leaves it to be tried next
+        i += keys_used
     
     # If all keys failed, raise the last error instead of using fallback
-    print(f"❌ All {len(api_keys)} API keys failed")
+    logger.error("All %d API keys failed", len(api_keys))
+    token_usage.record(endpoint, usage, success=False)
     
     # Create a more descriptive error message based on the last error
     if last_error:
@@ -160,180 +259,309 @@ def generate_quiz(topic: str, difficulty: str) -> Dict[str, Any]:
     else:
         raise Exception("All API keys failed with unknown errors.")
 
-def call_gemini_api(api_key: str, topic: str, difficulty: str, max_retries: int = 3) -> Dict[str, Any]:
+def call_with_hedge(primary_key: str, backup_key: str, hedge_after: float, topic: str,
+                    difficulty: str, focus: str, usage: TokenUsage,
+                    deadline: Optional[Deadline] = None,
+                    key_labels: Tuple[str, str] = ("primary", "hedge"),
+                    avoid: Sequence[str] = ()) -> Tuple[Optional[Dict[str, Any]], bool, Optional[Exception]]:
     """
-    Make the actual API call to Gemini with a specific API key.
-    Includes retry logic for transient failures.
+    Call Gemini on the primary key and, if it has not answered within
+    `hedge_after` seconds (the recent p95), fire the same request on the
+    backup key. The first successful result wins; the slower call is left to
+    finish in the background since an in-flight HTTP request cannot be cancelled.
+    Returns (result, whether the backup key was used, error if every call failed).
     """
-    # Try the updated Gemini API endpoint
-    api_url = os.getenv("GEMINI_API_URL", "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent")
-    
-    # Prepare the prompt for Gemini
-    prompt = f"""Create a {difficulty} level quiz about {topic}. 
-    Generate a JSON response with the following structure:
-    {{
-        "title": "Quiz: {topic}",
-        "difficulty": "{difficulty}",
-        "questions": [
-            {{
-                "q": "Question text here",
-                "options": ["Correct Answer", "Wrong Option 1", "Wrong Option 2", "Wrong Option 3"],
-                "answer_index": 0
-            }}
-        ]
-    }}
-    
-    CRITICAL REQUIREMENTS:
-    - Generate exactly 10 questions regardless of difficulty level
-    - ALWAYS put the correct answer as the FIRST option (index 0)
-    - The system will automatically randomize the answer positions later
-    - Keep ALL options SHORT and CONCISE (maximum 6-8 words each)
-    - Avoid long, detailed explanations in options - use brief, clear phrases
-    - Make sure all options are plausible but clearly distinct
-    
-    Difficulty guidelines:
-    - EASY: Basic concepts, definitions, simple applications
-    - MEDIUM: Applied knowledge, problem-solving, analysis  
-    - HARD: Complex scenarios, advanced concepts, critical thinking
+    def remaining():
+        return deadline.remaining() if deadline else None
     
-    Question quality rules:
-    - Focus on key concepts and practical application of {topic}
-    - Make questions specific and educational
-    - Ensure all 4 options are plausible but clearly distinct
-    - Use varied question types: definitions, applications, comparisons, best practices
-    - Options should be concise phrases, not full sentences
-    - Structure: [Correct Answer, Wrong 1, Wrong 2, Wrong 3]
+    # Each call runs in a copy of this context so its spans and log records
+    # stay attached to the request
+    pending = {_hedge_executor.submit(contextvars.copy_context().run, call_gemini_api, primary_key,
+                                      topic, difficulty, focus=focus, usage=usage, deadline=deadline,
+                                      key_label=key_labels[0], avoid=avoid)}
+    wait_for = hedge_after if deadline is None else min(hedge_after, deadline.remaining())
+    done, pending = wait(pending, timeout=wait_for)
+    hedged = not done and not (deadline and deadline.expired())
+    if hedged:
+        logger.info("No response after %.1fs (p95), hedging on next key", hedge_after)
+        gemini_retries.inc(reason="hedge")
+        pending.add(_hedge_executor.submit(contextvars.copy_context().run, call_gemini_api, backup_key,
+                                           topic, difficulty, focus=focus, usage=usage, deadline=deadline,
+                                           key_label=key_labels[1], avoid=avoid))
     
-    Example of good short options:
-    - "Machine learning algorithm"
-    - "Database system" 
-    - "Security protocol"
-    - "Web framework"
-    
-    IMPORTANT: Always place the correct answer as the first option (index 0). 
-    The randomization will happen automatically after generation.
-    
-    Return only valid JSON, no additional text."""
+    last_error = None
+    while done or pending:
+        for future in done:
+            try:
+                return future.result(), hedged, None
+            except Exception as e:
+                last_error = e
+        if not pending:
+            break
+        done, pending = wait(pending, timeout=remaining(), return_when=FIRST_COMPLETED)
+        if not done:
+            raise DeadlineExceeded(f"Request exceeded its {deadline.budget:g}s deadline")
+    return None, hedged, last_error
+
+def backoff(seconds: float, deadline: Optional[Deadline] = None) -> None:
+    """
+    Wait before a retry. The wait is skipped when the circuit is open (the
+    next attempt fails fast anyway), and DeadlineExceeded is raised when the
+    budget would not survive the wait plus another attempt.
+    """
+    if gemini_breaker.is_open():
+        return
+    if deadline and not deadline.allows_wait(seconds):
+        raise DeadlineExceeded(f"Request exceeded its {deadline.budget:g}s deadline")
+    with span("gemini.backoff", seconds=seconds):
+        time.sleep(seconds)
 
-    # Prepare request payload for Gemini API
-    payload = {
+def record_usage(usage: Optional[TokenUsage], result: Dict[str, Any]) -> None:
+    """Add a response's token counts to the running usage and log them"""
+    if usage is None:
+        return
+    usage.add(result)
+    metadata = result.get("usageMetadata") or {}
+    logger.debug("Token usage", extra={"input_tokens": metadata.get("promptTokenCount"),
+                                       "output_tokens": metadata.get("candidatesTokenCount")})
+
+def build_generation_payload(prompt: str) -> Dict[str, Any]:
+    """Build a generateContent payload that requests schema-constrained JSON output."""
+    return {
         "contents": [{
             "parts": [{
                 "text": prompt
             }]
-        }]
+        }],
+        "generationConfig": {
+            "responseMimeType": "application/json",
+            "responseSchema": QUIZ_RESPONSE_SCHEMA
+        }
     }
+
+def parse_quiz_response(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Extract the quiz JSON from a generateContent response body.
+    JSON mode should return bare JSON; markdown fences are still stripped
+    in case an older model or endpoint ignores the response mime type.
+    """
+    if "candidates" not in result or len(result["candidates"]) == 0:
+        raise Exception("No candidates in Gemini response")
+    
+    candidate = result["candidates"][0]
+    if "content" not in candidate or "parts" not in candidate["content"]:
+        raise Exception("Unexpected Gemini response structure")
+    
+    text_content = candidate["content"]["parts"][0]["text"]
+    cleaned_text = text_content.strip()
+    if cleaned_text.startswith("```json"):
+        cleaned_text = cleaned_text[7:]
+    if cleaned_text.startswith("```"):
+        cleaned_text = cleaned_text[3:]
+    if cleaned_text.endswith("```"):
+        cleaned_text = cleaned_text[:-3]
+    cleaned_text = cleaned_text.strip()
+    
+    try:
+        quiz_data = json_codec.loads(cleaned_text)
+    except json.JSONDecodeError as e:
+        raise Exception(f"Failed to parse JSON from Gemini API: {e}")
+    
+    if not isinstance(quiz_data, dict) or not isinstance(quiz_data.get("questions"), list):
+        raise Exception("Invalid quiz structure from Gemini API")
+    
+    return quiz_data
+
+def regenerate_questions(api_url: str, headers: Dict[str, str], topic: str,
+                         difficulty: str, count: int, timeout: float,
+                         usage: Optional[TokenUsage] = None) -> List[Dict[str, Any]]:
+    """
+    Ask Gemini for `count` replacement questions after some failed validation.
+    This is a single best-effort call: on any failure the caller keeps the
+    questions it already has rather than burning a full retry cycle.
+    """
+    prompt, _ = render_prompt("regenerate", topic=topic, difficulty=difficulty, count=count)
+    with span("gemini.regenerate", count=count) as regenerate_span:
+        try:
+            logger.info("Regenerating %d invalid question(s)", count)
+            gemini_retries.inc(reason="invalid_questions")
+            count_key_call(headers["x-goog-api-key"])
+            response = requests.post(api_url, json=build_generation_payload(prompt),
+                                     headers=headers, timeout=timeout)
+            regenerate_span.set("http.status_code", response.status_code)
+            if response.status_code != 200:
+                logger.warning("Question regeneration failed (status %d)", response.status_code)
+                return []
+            result = response.json()
+            record_usage(usage, result)
+            questions, errors = partition_questions(parse_quiz_response(result)["questions"])
+            if errors:
+                logger.warning("%d regenerated question(s) still invalid", len(errors))
+            return questions[:count]
+        except Exception as e:
+            logger.warning("Question regeneration failed: %s", e)
+            return []
+
+def call_gemini_api(api_key: str, topic: str, difficulty: str, max_retries: int = 3,
+                    focus: str = DEFAULT_FOCUS, usage: Optional[TokenUsage] = None,
+                    deadline: Optional[Deadline] = None, key_label: str = "key",
+                    avoid: Sequence[str] = ()) -> Dict[str, Any]:
+    """
+    Make the actual API call to Gemini with a specific API key.
+    `key_label` identifies the key slot in metrics without exposing the key.
+    Includes retry logic for transient failures.
+    Token counts from every response are added to `usage` when given, and
+    per-attempt timeouts and backoffs are clipped to `deadline`. Questions
+    that repeat each other or `avoid` are dropped and only that shortfall
+    is regenerated.
+    """
+    # Try the updated Gemini API endpoint
+    api_url = os.getenv("GEMINI_API_URL", "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent")
     
+    # Render the compact, versioned prompt template
+    prompt, prompt_version = render_prompt(
+        "quiz", topic=topic, difficulty=difficulty, count=QUESTIONS_PER_QUIZ, focus=focus
+    )
+    logger.debug("Using prompt %s (%d chars)", prompt_version, len(prompt))
+
+    # Prepare request payload for Gemini API (JSON mode with a response schema)
+    payload = build_generation_payload(prompt)
+    
+    # The key goes in a header rather than the URL so it never appears in
+    # exception messages or logs that include the request URL
     headers = {
-        "Content-Type": "application/json"
+        "Content-Type": "application/json",
+        "x-goog-api-key": api_key
     }
     
-    # Add API key as URL parameter (alternative method)
-    api_url_with_key = f"{api_url}?key={api_key}"
     
     for attempt in range(max_retries):
-        try:
-            # Calculate timeout based on attempt
-            timeout = 30 + (attempt * 15)  # 30s, 45s, 60s
+        with span("gemini.call", key=key_label, attempt=attempt + 1) as call_span:
+            try:
+                # Calculate timeout based on attempt
+                timeout = 30 + (attempt * 15)  # 30s, 45s, 60s
+                if deadline:
+                    timeout = deadline.clip(timeout)
             
-            print(f"📡 Making API call to: {api_url} (attempt {attempt + 1}/{max_retries})")
-            response = requests.post(api_url_with_key, json=payload, headers=headers, timeout=timeout)
+                # Fail fast instead of sleeping through retries while the upstream is down
+                gemini_breaker.check()
             
-            print(f"📊 API Response Status: {response.status_code}")
+                logger.debug("Calling Gemini (attempt %d/%d)", attempt + 1, max_retries, extra={"key": key_label})
+                started = time.monotonic()
+                try:
+                    count_key_call(api_key)
+                except Exception:
+                    # check() may have handed this call the half-open probe; nothing
+                    # was sent, so give it back or the breaker never leaves half-open
+                    gemini_breaker.record_neutral()
+                    raise
+                response = requests.post(api_url, json=payload, headers=headers, timeout=timeout)
             
-            if response.status_code == 200:
-                result = response.json()
-                print("✅ Gemini API call successful!")
-                
-                # Extract text from Gemini response
-                if "candidates" in result and len(result["candidates"]) > 0:
-                    candidate = result["candidates"][0]
-                    if "content" in candidate and "parts" in candidate["content"]:
-                        text_content = candidate["content"]["parts"][0]["text"]
-                        print(f"📝 Raw Gemini response received")
-                        
-                        # Clean the response - remove markdown code blocks if present
-                        cleaned_text = text_content.strip()
-                        if cleaned_text.startswith("```json"):
-                            cleaned_text = cleaned_text[7:]  # Remove ```json
-                        if cleaned_text.startswith("```"):
-                            cleaned_text = cleaned_text[3:]  # Remove ```
-                        if cleaned_text.endswith("```"):
-                            cleaned_text = cleaned_text[:-3]  # Remove trailing ```
-                        cleaned_text = cleaned_text.strip()
-                        
-                        # Try to parse the JSON response
-                        try:
-                            quiz_data = json.loads(cleaned_text)
-                            
-                            # Validate the structure
-                            if "questions" in quiz_data and isinstance(quiz_data["questions"], list):
-                                print(f"🎯 Successfully generated {len(quiz_data['questions'])} questions!")
-                                
-                                # Randomize the answer positions to prevent predictability
-                                quiz_data = randomize_quiz_answers(quiz_data)
-                                
-                                print(f"🔀 Answer positions randomized!")
-                                
-                                # Verify answer distribution
-                                answer_distribution = {}
-                                for q in quiz_data['questions']:
-                                    idx = q['answer_index']
-                                    answer_distribution[idx] = answer_distribution.get(idx, 0) + 1
-                                print(f"📊 Answer distribution: {answer_distribution}")
-                                
-                                return quiz_data
-                            else:
-                                raise Exception("Invalid quiz structure from Gemini API")
-                        except json.JSONDecodeError as e:
-                            raise Exception(f"Failed to parse JSON from Gemini API: {e}")
-                    else:
-                        raise Exception("Unexpected Gemini response structure")
-                else:
-                    raise Exception("No candidates in Gemini response")
+                logger.debug("Gemini responded %d", response.status_code, extra={"key": key_label})
+                call_span.set("http.status_code", response.status_code)
+                gemini_latency_seconds.observe(time.monotonic() - started, status=response.status_code)
+                gemini_requests.inc(key=key_label, status=response.status_code)
             
-            elif response.status_code == 503:
-                # Service unavailable - retry with exponential backoff
-                if attempt < max_retries - 1:
-                    wait_time = 2 ** attempt  # 1s, 2s, 4s
-                    print(f"⏳ API overloaded (503), retrying in {wait_time} seconds...")
-                    time.sleep(wait_time)
-                    continue
+                if response.status_code >= 500:
+                    gemini_breaker.record_failure()
+                elif response.status_code == 200:
+                    gemini_breaker.record_success()
+                    gemini_latency.record(time.monotonic() - started)
                 else:
-                    print(f"❌ API still overloaded after {max_retries} attempts")
-                    raise Exception(f"Gemini API overloaded after {max_retries} retries")
+                    # 4xx responses are about this key or request, not upstream health
+                    gemini_breaker.record_neutral()
             
-            elif response.status_code == 429:
-                # Rate limit - don't retry this key
-                print(f"❌ Rate limit exceeded (429) for this API key")
-                raise Exception("Gemini API rate limit exceeded")
+                if response.status_code == 200:
+                    result = response.json()
+                    record_usage(usage, result)
+                    quiz_data = parse_quiz_response(result)
+                
+                    # Validate each question; keep the good ones and only
+                    # regenerate the shortfall instead of retrying the whole call
+                    questions, errors = partition_questions(quiz_data["questions"])
+                    if errors:
+                        logger.warning("%d invalid question(s) from Gemini: %s", len(errors), errors[:3])
+                    questions, duplicates = filter_questions(questions, avoid)
+                    if duplicates:
+                        logger.info("Dropped %d near-duplicate question(s)", duplicates, extra={"key": key_label})
+                        duplicate_questions.inc(duplicates, stage="generation")
+                        call_span.set("duplicates_removed", duplicates)
+                
+                    missing = QUESTIONS_PER_QUIZ - len(questions)
+                    if (errors or duplicates) and missing > 0 and not (deadline and deadline.expired()):
+                        if deadline:
+                            timeout = min(timeout, deadline.remaining())
+                        replacements, duplicates = filter_questions(
+                            regenerate_questions(api_url, headers, topic, difficulty, missing, timeout, usage),
+                            list(avoid) + question_texts(questions)
+                        )
+                        if duplicates:
+                            duplicate_questions.inc(duplicates, stage="generation")
+                        questions.extend(replacements)
+                
+                    if not questions:
+                        raise Exception("Invalid quiz structure from Gemini API: no valid questions")
+                
+                    quiz_data["questions"] = questions[:QUESTIONS_PER_QUIZ]
+                    quiz_data.setdefault("title", f"Quiz: {topic}")
+                    quiz_data.setdefault("difficulty", difficulty)
+                
+                    # Returned in canonical order (correct answer first); options are
+                    # shuffled per serve by services.shuffle
+                    return quiz_data
+            
+                elif response.status_code == 503:
+                    # Service unavailable - retry with exponential backoff
+                    if attempt < max_retries - 1:
+                        wait_time = 2 ** attempt  # 1s, 2s, 4s
+                        logger.warning("Gemini overloaded (503), retrying in %ds", wait_time, extra={"key": key_label})
+                        gemini_retries.inc(reason="503")
+                        backoff(wait_time, deadline)
+                        continue
+                    else:
+                        logger.warning("Gemini still overloaded after %d attempts", max_retries, extra={"key": key_label})
+                        raise Exception(f"Gemini API overloaded after {max_retries} retries")
             
-            elif response.status_code == 403:
-                # Forbidden - API disabled
-                print(f"❌ API access forbidden (403) - API may be disabled")
-                raise Exception("Gemini API access forbidden - check API key and permissions")
+                elif response.status_code == 429:
+                    # Rate limit - don't retry this key, and tell other workers to skip it for a while
+                    logger.warning("Rate limit exceeded (429)", extra={"key": key_label})
+                    cool_down_key(api_key, retry_after_seconds(response, KEY_RATE_LIMIT_COOLDOWN), "429")
+                    raise Exception("Gemini API rate limit exceeded")
             
-            else:
-                print(f"❌ Gemini API call failed (status {response.status_code})")
-                print(f"🔍 Response text: {response.text}")
+                elif response.status_code == 403:
+                    # Forbidden - API disabled
+                    logger.warning("API access forbidden (403), API may be disabled", extra={"key": key_label})
+                    cool_down_key(api_key, KEY_FORBIDDEN_COOLDOWN, "403")
+                    raise Exception("Gemini API access forbidden - check API key and permissions")
+            
+                else:
+                    logger.warning("Gemini call failed (status %d): %s", response.status_code, response.text[:500],
+                                   extra={"key": key_label})
                 
-                # For other errors, retry once more
+                    # For other errors, retry once more
+                    if attempt < max_retries - 1:
+                        gemini_retries.inc(reason="status")
+                        backoff(3, deadline)
+                        continue
+                    else:
+                        raise Exception(f"Gemini API call failed with status {response.status_code}")
+        
+            except requests.RequestException as e:
+                gemini_requests.inc(key=key_label, status=0)
+                if deadline and deadline.expired():
+                    # Our own clipped timeout fired; that says nothing about upstream health
+                    gemini_breaker.record_neutral()
+                else:
+                    gemini_breaker.record_failure()
                 if attempt < max_retries - 1:
-                    print(f"🔄 Retrying API call in 3 seconds...")
-                    time.sleep(3)
+                    wait_time = 2 ** attempt
+                    logger.warning("Network error: %s, retrying in %ds", e, wait_time, extra={"key": key_label})
+                    gemini_retries.inc(reason="network")
+                    backoff(wait_time, deadline)
                     continue
                 else:
-                    raise Exception(f"Gemini API call failed with status {response.status_code}")
-        
-        except requests.RequestException as e:
-            if attempt < max_retries - 1:
-                wait_time = 2 ** attempt
-                print(f"⚠️ Network error: {e}, retrying in {wait_time} seconds...")
-                time.sleep(wait_time)
-                continue
-            else:
-                print(f"⚠️ Network error calling Gemini API: {e}")
-                raise Exception(f"Network error calling Gemini API: {e}")
-        except Exception as e:
-            print(f"⚠️ Error with Gemini API: {e}")
-            raise
+                    logger.warning("Network error calling Gemini API: %s", e, extra={"key": key_label})
+                    raise Exception(f"Network error calling Gemini API: {e}")
+            except Exception as e:
+                logger.warning("Error with Gemini API: %s", e, extra={"key": key_label})
+                raise
@@ -0,0 +1,82 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from services.shared_state import get_shared_state
+from services.shuffle import to_canonical
+
+# Server-side grading against the stored (canonical) answer indexes. The
+# answers a candidate picked are positions in the shuffled quiz they were
+# served, so they are mapped back with the same permutation key first.
+
+class AnswerKeys:
+    """
+    Bounded per-worker cache of quiz answer keys, so a burst of submissions
+    for one quiz does not reload and re-parse its content each time. Stored
+    quizzes never change, but they can be deleted: invalidate() bumps a
+    per-kind version counter in the shared-state store, and entries cached
+    under an older version (in any worker) are not used again.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, int], Dict]" = OrderedDict()
+
+    @staticmethod
+    def _version_key(kind: str) -> str:
+        return f"answer_keys:version:{kind}"
+
+    def version(self, kind: str) -> str:
+        return get_shared_state().get(self._version_key(kind)) or "0"
+
+    def get(self, kind: str, quiz_id: int) -> Optional[Dict]:
+        version = self.version(kind)
+        with self._lock:
+            entry = self._entries.get((kind, quiz_id))
+            if entry is None:
+                return None
+            if entry["version"] != version:
+                del self._entries[(kind, quiz_id)]
+                return None
+            self._entries.move_to_end((kind, quiz_id))
+            return entry
+
+    def put(self, kind: str, quiz_id: int, questions: List[Dict], topic_id: Optional[int] = None) -> Dict:
+        # Only what grading needs: option counts and the correct canonical index
+        entry = {
+            "version": self.version(kind),
+            "topic_id": topic_id,
+            "questions": [{"options": [None] * len(q.get("options") or []), "answer_index": q.get("answer_index")}
+                          for q in questions],
+        }
+        with self._lock:
+            self._entries[(kind, quiz_id)] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, kind: str) -> None:
+        """Call after deleting quizzes of `kind`; every worker reloads their answer keys"""
+        get_shared_state().incr(self._version_key(kind))
+
+def grade(answer_key: Dict, key: str, choices: List[Optional[int]]) -> Dict:
+    """
+    Grade positions picked on a quiz served with permutation `key`.
+    Returns the canonical answers, per-question correctness and the score.
+    """
+    questions = answer_key["questions"]
+    choices = list(choices) + [None] * (len(questions) - len(choices))
+    canonical = to_canonical(answer_key, key, choices)
+    results = [choice is not None and choice == q["answer_index"] for choice, q in zip(canonical, questions)]
+    correct = sum(results)
+    total = len(questions)
+    return {
+        "answers": canonical,
+        "results": results,
+        "correct": correct,
+        "total_questions": total,
+        "score": round(100.0 * correct / total, 1) if total else 0.0,
+    }
+
+answer_keys = AnswerKeys()
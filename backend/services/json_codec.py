@@ -0,0 +1,78 @@
+import json
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import Response
+
+# JSON encoding for stored quiz content and API responses. Uses orjson when
+# it is installed (several times faster on 30-question quizzes) and falls
+# back to the standard library otherwise; both produce compact UTF-8 JSON.
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+class RawJSON:
+    """An already-encoded JSON value (e.g. a stored content_json column) to splice into output verbatim"""
+
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        self.data = data.encode("utf-8") if isinstance(data, str) else data
+
+def _plain_bytes(value: Any) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # Pydantic models, Decimals, sets, ...: let FastAPI normalise them first
+            return orjson.dumps(jsonable_encoder(value), option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(jsonable_encoder(value), ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode("utf-8")
+
+def _contains_raw(value: Any) -> bool:
+    if isinstance(value, RawJSON):
+        return True
+    if isinstance(value, dict):
+        return any(isinstance(v, (RawJSON, dict, list)) and _contains_raw(v) for v in value.values())
+    if isinstance(value, list):
+        return any(isinstance(v, (RawJSON, dict, list)) and _contains_raw(v) for v in value)
+    return False
+
+def _spliced_bytes(value: Any) -> bytes:
+    if isinstance(value, RawJSON):
+        return value.data
+    if isinstance(value, dict) and _contains_raw(value):
+        return b"{" + b",".join(
+            _plain_bytes(str(k)) + b":" + _spliced_bytes(v) for k, v in value.items()
+        ) + b"}"
+    if isinstance(value, list) and _contains_raw(value):
+        return b"[" + b",".join(_spliced_bytes(v) for v in value) + b"]"
+    return _plain_bytes(value)
+
+def dumps_bytes(value: Any) -> bytes:
+    """Encode to compact UTF-8 JSON; RawJSON values anywhere in dicts/lists are copied through unparsed"""
+    return _spliced_bytes(value)
+
+def dumps(value: Any) -> str:
+    """Encode to a JSON string (for Text columns such as content_json)"""
+    return dumps_bytes(value).decode("utf-8")
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+class RawJSONResponse(Response):
+    """
+    JSON response that skips FastAPI's validate-then-serialize path: content
+    is encoded with dumps_bytes, so stored JSON wrapped in RawJSON is sent
+    as-is instead of being parsed and re-serialized.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps_bytes(content)
@@ -0,0 +1,129 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import threading
+from datetime import datetime, timezone
+
+# Request id of the request being handled; set by the HTTP middleware and
+# carried into threadpool workers through contextvars.
+request_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="-")
+
+# Pass as `extra=SAMPLED` on hot-path INFO/DEBUG records so only a
+# LOG_SAMPLE_RATE fraction of them is emitted.
+SAMPLED = {"sampled": True}
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+# Never let API keys reach the logs, whatever ends up in a message
+_SECRET_PATTERN = re.compile(r"(key=|x-goog-api-key['\"]?:\s*['\"]?)[A-Za-z0-9_\-]+")
+
+_configure_lock = threading.Lock()
+_listener = None
+
+class RequestContextFilter(logging.Filter):
+    """Attach the current request id and redact secrets"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        message = record.getMessage()
+        if "key" in message:
+            record.msg = _SECRET_PATTERN.sub(r"\1***", message)
+            record.args = None
+        return True
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of records marked as sampled; warnings and errors always pass"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not getattr(record, "sampled", False):
+            return True
+        return self.rate >= 1.0 or random.random() < self.rate
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never block a request thread on logging: drop records when the queue is full"""
+
+    dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with any `extra=` fields inlined"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "msg": record.getMessage(),
+        }
+        for name, value in record.__dict__.items():
+            if name not in _STANDARD_ATTRS and name != "sampled":
+                entry[name] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class TextFormatter(logging.Formatter):
+    """Human-readable format for local development (LOG_FORMAT=text)"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s [%(request_id)s] %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = {k: v for k, v in record.__dict__.items() if k not in _STANDARD_ATTRS and k != "sampled"}
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+def configure_logging() -> None:
+    """
+    Route the `tpicq` logger hierarchy through a QueueHandler so request
+    threads only enqueue records; a background listener thread formats and
+    writes them to stdout. Configured from LOG_LEVEL, LOG_FORMAT (json|text)
+    and LOG_SAMPLE_RATE.
+    """
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            return
+
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(TextFormatter() if os.getenv("LOG_FORMAT", "json") == "text" else JsonFormatter())
+
+        log_queue: queue.Queue = queue.Queue(maxsize=10000)
+        queue_handler = DroppingQueueHandler(log_queue)
+        # Sample first, so dropped records are never formatted for redaction
+        queue_handler.addFilter(SamplingFilter(float(os.getenv("LOG_SAMPLE_RATE", "1.0"))))
+        queue_handler.addFilter(RequestContextFilter())
+
+        root = logging.getLogger("tpicq")
+        root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+        root.addHandler(queue_handler)
+        root.propagate = False
+
+        _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+def get_logger(name: str) -> logging.Logger:
+    """Return a logger under the `tpicq` hierarchy, configuring logging on first use"""
+    configure_logging()
+    return logging.getLogger(f"tpicq.{name}")
@@ -0,0 +1,217 @@
+import bisect
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Prometheus text exposition without extra dependencies. Metrics are
+# process-local; with several workers each one exposes its own values.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+LabelKey = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+class _Metric:
+    metric_type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> LabelKey:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+
+class Counter(_Metric):
+    metric_type = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def values(self) -> Dict[LabelKey, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, value in sorted(self.values().items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}")
+        return lines
+
+class Gauge(_Metric):
+    """A gauge set directly, or computed at scrape time by a callback returning {label values: value}"""
+    metric_type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 callback: Optional[Callable[[], Dict[LabelKey, float]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelKey, float] = {}
+        self._callback = callback
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        if self._callback:
+            try:
+                values = self._callback()
+            except Exception:
+                values = {}
+        else:
+            with self._lock:
+                values = dict(self._values)
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}")
+        return lines
+
+class Histogram(_Metric):
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [bucket counts..., +Inf count], sum
+        self._series: Dict[LabelKey, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = ([0] * (len(self.buckets) + 1), [0.0])
+                self._series[key] = series
+            series[0][index] += 1
+            series[1][0] += value
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        with self._lock:
+            snapshot = {key: (list(counts), total[0]) for key, (counts, total) in self._series.items()}
+        for key, (counts, total) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_number(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total!r}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+# HTTP
+request_latency = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ["method", "route", "status"]))
+
+# Gemini upstream
+gemini_latency_seconds = registry.register(Histogram(
+    "gemini_request_duration_seconds", "Latency of individual Gemini generateContent calls",
+    ["status"]))
+gemini_requests = registry.register(Counter(
+    "gemini_requests_total", "Gemini calls by API key slot and HTTP status (0 = network error)",
+    ["key", "status"]))
+gemini_retries = registry.register(Counter(
+    "gemini_retries_total", "Gemini retries and repair calls by reason", ["reason"]))
+duplicate_questions = registry.register(Counter(
+    "duplicate_questions_removed_total", "Near-duplicate questions dropped, by stage", ["stage"]))
+
+# Generation admission (services/scheduler.py)
+generation_admissions = registry.register(Counter(
+    "generation_admissions_total", "Generation requests by priority class and outcome "
+    "(admitted, rejected, timed_out)", ["priority", "result"]))
+generation_queue_wait = registry.register(Histogram(
+    "generation_queue_wait_seconds", "Time generation requests waited for a slot", ["priority"]))
+
+def register_scheduler(scheduler) -> None:
+    """Expose a generation scheduler's capacity, slots in use and queue depth, read at scrape time"""
+    registry.register(Gauge(
+        "generation_slots", "Generation scheduler capacity, slots in use and queued requests", ["state"],
+        callback=lambda: {(state,): value for state, value in scheduler.stats().items()}))
+
+# Caches
+cache_requests = registry.register(Counter(
+    "cache_requests_total", "Cache lookups by cache and result (hit/miss)", ["cache", "result"]))
+
+def _cache_hit_ratios() -> Dict[LabelKey, float]:
+    totals: Dict[str, List[float]] = {}
+    for (cache, result), count in cache_requests.values().items():
+        hits_and_total = totals.setdefault(cache, [0.0, 0.0])
+        hits_and_total[1] += count
+        if result == "hit":
+            hits_and_total[0] += count
+    return {(cache,): hits / total for cache, (hits, total) in totals.items() if total}
+
+registry.register(Gauge(
+    "cache_hit_ratio", "Share of cache lookups that were hits since process start", ["cache"],
+    callback=_cache_hit_ratios))
+
+def record_cache(cache: str, hit: bool) -> None:
+    cache_requests.inc(cache=cache, result="hit" if hit else "miss")
+
+# Resume processing
+extraction_latency = registry.register(Histogram(
+    "resume_extraction_duration_seconds", "Resume text extraction time by file type", ["file_type"]))
+
+# Quiz attempts
+attempts_written = registry.register(Counter(
+    "quiz_attempts_total", "Graded quiz attempts by outcome (written, skipped, dropped, rejected)", ["result"]))
+attempt_flush_latency = registry.register(Histogram(
+    "attempt_flush_duration_seconds", "Time to write one batch of attempts and their aggregates"))
+
+def register_db_pool(engine) -> None:
+    """Expose connection pool usage for a SQLAlchemy engine, read at scrape time"""
+
+    def pool_stats() -> Dict[LabelKey, float]:
+        pool = engine.pool
+        stats = {}
+        for state, attribute in (("size", "size"), ("checked_out", "checkedout"),
+                                 ("checked_in", "checkedin"), ("overflow", "overflow")):
+            reader = getattr(pool, attribute, None)
+            if callable(reader):
+                stats[(state,)] = reader()
+        return stats
+
+    registry.register(Gauge(
+        "db_pool_connections", "Database connection pool usage by state", ["state"],
+        callback=pool_stats))
@@ -0,0 +1,164 @@
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+from services.log import get_logger
+
+# Opt-in, per-request sampling profiler. With PROFILING_ENABLED set, a
+# request carrying `X-Profile: 1` (or `?profile=1`) is profiled by a
+# background thread that samples every thread's stack while the request
+# runs. Only stacks that pass through backend code are kept, which drops
+# idle workers, the log/trace exporters and the event loop waiting in
+# select(). Samples are written in collapsed-stack format, readable by
+# flamegraph.pl, speedscope and inferno.
+#
+#   PROFILING_ENABLED       turn the hook on (off by default)
+#   PROFILING_TOKEN         if set, the X-Profile header must carry this value
+#   PROFILE_INTERVAL_MS     sampling interval (default 5)
+#   PROFILE_DIR             where profiles are stored (default profiles/)
+#   PROFILE_KEEP            number of profiles kept on disk (default 50)
+#
+# Stacks of concurrent requests running backend code at the same time are
+# included too, so profile on a quiet instance when possible.
+
+logger = get_logger("profiling")
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_PROFILE_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# One profile at a time: overlapping samplers would double-count each other's requests
+_active_lock = threading.Lock()
+
+def profiling_enabled() -> bool:
+    return os.getenv("PROFILING_ENABLED", "").lower() in ("1", "true", "yes")
+
+def profiling_requested(headers, query_params) -> bool:
+    """True when profiling is enabled and this request asked for it"""
+    if not profiling_enabled():
+        return False
+    requested = headers.get("x-profile") or query_params.get("profile")
+    if not requested:
+        return False
+    token = os.getenv("PROFILING_TOKEN")
+    if token:
+        return requested == token
+    return requested.lower() in ("1", "true", "yes")
+
+def profile_dir() -> str:
+    return os.getenv("PROFILE_DIR", os.path.join(BACKEND_DIR, "profiles"))
+
+def profile_path(profile_id: str) -> Optional[str]:
+    """Path of a stored profile, or None for ids that could escape the profile directory"""
+    if not _PROFILE_ID_PATTERN.match(profile_id):
+        return None
+    return os.path.join(profile_dir(), f"{profile_id}.collapsed")
+
+def list_profiles() -> List[Dict]:
+    directory = profile_dir()
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in os.listdir(directory):
+        if name.endswith(".collapsed"):
+            path = os.path.join(directory, name)
+            profiles.append({
+                "id": name[:-len(".collapsed")],
+                "size": os.path.getsize(path),
+                "created": os.path.getmtime(path),
+            })
+    return sorted(profiles, key=lambda p: p["created"], reverse=True)
+
+def _is_backend_code(filename: str) -> bool:
+    # A virtualenv created inside backend/ is not our code
+    return filename.startswith(BACKEND_DIR) and "site-packages" not in filename
+
+def _frame_label(code) -> str:
+    filename = code.co_filename
+    if _is_backend_code(filename):
+        filename = os.path.relpath(filename, BACKEND_DIR)
+    else:
+        filename = os.path.basename(filename)
+    # ';' separates frames in the collapsed format
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ":")
+
+class RequestProfiler:
+    """Sample all thread stacks until stopped; use as a context manager around one request"""
+
+    def __init__(self, profile_id: str, interval: Optional[float] = None):
+        self.profile_id = profile_id if _PROFILE_ID_PATTERN.match(profile_id) else f"profile-{time.time_ns()}"
+        self.interval = interval if interval is not None else float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self.saved_path: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started = 0.0
+
+    def __enter__(self) -> "RequestProfiler":
+        if not _active_lock.acquire(blocking=False):
+            logger.info("Profiler busy, not profiling this request")
+            return self
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if self._thread is None:
+            return False
+        self._stop.set()
+        self._thread.join()
+        _active_lock.release()
+        try:
+            self.saved_path = self._save()
+            logger.info("Profile saved", extra={"profile_id": self.profile_id, "samples": self.sample_count,
+                                                "duration_ms": round((time.perf_counter() - self._started) * 1000, 1)})
+        except OSError as e:
+            logger.warning("Failed to save profile: %s", e)
+        return False
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            self.sample_count += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                in_backend = False
+                while frame is not None:
+                    code = frame.f_code
+                    in_backend = in_backend or _is_backend_code(code.co_filename)
+                    stack.append(_frame_label(code))
+                    frame = frame.f_back
+                if not in_backend:
+                    continue
+                if thread_id not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack.append(names.get(thread_id, f"thread-{thread_id}"))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def _save(self) -> str:
+        directory = profile_dir()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.profile_id}.collapsed")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        self._prune(directory)
+        return path
+
+    @staticmethod
+    def _prune(directory: str) -> None:
+        keep = int(os.getenv("PROFILE_KEEP", "50"))
+        for stale in list_profiles()[keep:]:
+            try:
+                os.remove(os.path.join(directory, f"{stale['id']}.collapsed"))
+            except OSError:
+                pass
@@ -0,0 +1,38 @@
+import os
+from functools import lru_cache
+from string import Template
+from typing import Dict, Tuple
+
+# Prompt templates live in backend/prompts as <name>.v<version>.txt and use
+# $placeholders, so JSON examples in a template need no brace escaping.
+PROMPT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "prompts")
+
+# Default version per template; override with PROMPT_VERSION_<NAME>=<n>
+DEFAULT_PROMPT_VERSIONS: Dict[str, int] = {
+    "quiz": 2,
+    "regenerate": 1,
+}
+
+def get_prompt_version(name: str) -> int:
+    """Return the active version for a prompt template"""
+    override = os.getenv(f"PROMPT_VERSION_{name.upper()}")
+    if override and override.strip().isdigit():
+        return int(override)
+    return DEFAULT_PROMPT_VERSIONS[name]
+
+@lru_cache(maxsize=None)
+def load_template(name: str, version: int) -> Template:
+    """Read and cache a prompt template from disk"""
+    path = os.path.join(PROMPT_DIR, f"{name}.v{version}.txt")
+    with open(path, encoding="utf-8") as template_file:
+        return Template(template_file.read().strip())
+
+def render_prompt(name: str, **values) -> Tuple[str, str]:
+    """
+    Render the active version of a prompt template.
+    Returns (prompt_text, version_tag) so callers can record which
+    template produced a given request.
+    """
+    version = get_prompt_version(name)
+    prompt = load_template(name, version).substitute(**values)
+    return prompt, f"{name}.v{version}"
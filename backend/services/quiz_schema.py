@@ -0,0 +1,159 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Response schema sent to Gemini with responseMimeType=application/json.
+# Uses the OpenAPI subset understood by the generateContent API.
+QUESTION_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "q": {"type": "STRING"},
+        "options": {
+            "type": "ARRAY",
+            "items": {"type": "STRING"},
+            "minItems": 4,
+            "maxItems": 4
+        },
+        "answer_index": {"type": "INTEGER"},
+        "category": {"type": "STRING"}
+    },
+    "required": ["q", "options", "answer_index"]
+}
+
+QUIZ_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "title": {"type": "STRING"},
+        "difficulty": {"type": "STRING"},
+        "questions": {"type": "ARRAY", "items": QUESTION_SCHEMA}
+    },
+    "required": ["questions"]
+}
+
+Validator = Callable[[Any], Optional[str]]
+
+_TYPE_CHECKS = {
+    "STRING": lambda v: isinstance(v, str),
+    "INTEGER": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "NUMBER": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "BOOLEAN": lambda v: isinstance(v, bool),
+    "ARRAY": lambda v: isinstance(v, list),
+    "OBJECT": lambda v: isinstance(v, dict),
+}
+
+def compile_schema(schema: Dict[str, Any], path: str = "$") -> Validator:
+    """
+    Compile a response schema into a validator function.
+    The validator returns None for valid values, or a short error message.
+    Compiling once avoids walking the schema dict for every question.
+    """
+    type_name = schema.get("type", "OBJECT").upper()
+    type_check = _TYPE_CHECKS[type_name]
+
+    if type_name == "OBJECT":
+        required = tuple(schema.get("required", []))
+        properties = tuple(
+            (name, compile_schema(sub_schema, f"{path}.{name}"))
+            for name, sub_schema in schema.get("properties", {}).items()
+        )
+
+        def validate_object(value: Any) -> Optional[str]:
+            if not type_check(value):
+                return f"{path}: expected object"
+            for name in required:
+                if name not in value:
+                    return f"{path}.{name}: missing"
+            for name, validate in properties:
+                if name in value:
+                    error = validate(value[name])
+                    if error:
+                        return error
+            return None
+
+        return validate_object
+
+    if type_name == "ARRAY":
+        min_items = int(schema.get("minItems", 0))
+        max_items = schema.get("maxItems")
+        max_items = int(max_items) if max_items is not None else None
+        validate_item = compile_schema(schema["items"], f"{path}[]") if "items" in schema else None
+
+        def validate_array(value: Any) -> Optional[str]:
+            if not type_check(value):
+                return f"{path}: expected array"
+            if len(value) < min_items or (max_items is not None and len(value) > max_items):
+                return f"{path}: expected {min_items}-{max_items} items, got {len(value)}"
+            if validate_item:
+                for item in value:
+                    error = validate_item(item)
+                    if error:
+                        return error
+            return None
+
+        return validate_array
+
+    def validate_scalar(value: Any) -> Optional[str]:
+        if not type_check(value):
+            return f"{path}: expected {type_name.lower()}"
+        return None
+
+    return validate_scalar
+
+_validate_question_shape = compile_schema(QUESTION_SCHEMA, "question")
+
+def validate_question(question: Any) -> Optional[str]:
+    """
+    Validate a single quiz question against the compiled schema plus the
+    rules the schema cannot express (answer index in range, distinct options).
+    """
+    error = _validate_question_shape(question)
+    if error:
+        return error
+    if not question["q"].strip():
+        return "question.q: empty"
+    options = question["options"]
+    if any(not option.strip() for option in options):
+        return "question.options: empty option"
+    if len({option.strip().lower() for option in options}) != len(options):
+        return "question.options: duplicate options"
+    if not 0 <= question["answer_index"] < len(options):
+        return f"question.answer_index: {question['answer_index']} out of range"
+    return None
+
+def repair_question(question: Any) -> Any:
+    """
+    Apply cheap local fixes for common model slips (numeric strings for
+    answer_index, padded whitespace). Returns the repaired copy, which may
+    still be invalid.
+    """
+    if not isinstance(question, dict):
+        return question
+    repaired = dict(question)
+    answer_index = repaired.get("answer_index")
+    if isinstance(answer_index, str) and answer_index.strip().isdigit():
+        repaired["answer_index"] = int(answer_index.strip())
+    elif isinstance(answer_index, float) and answer_index.is_integer():
+        repaired["answer_index"] = int(answer_index)
+    if isinstance(repaired.get("q"), str):
+        repaired["q"] = repaired["q"].strip()
+    if isinstance(repaired.get("options"), list):
+        repaired["options"] = [o.strip() if isinstance(o, str) else o for o in repaired["options"]]
+    return repaired
+
+def partition_questions(questions: List[Any]) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """
+    Split questions into (valid, errors). Invalid questions get one local
+    repair attempt; whatever still fails is reported so the caller can
+    regenerate only that many questions.
+    """
+    valid = []
+    errors = []
+    for question in questions:
+        if validate_question(question) is None:
+            valid.append(question)
+            continue
+        repaired = repair_question(question)
+        error = validate_question(repaired)
+        if error is None:
+            valid.append(repaired)
+        else:
+            errors.append(error)
+    return valid, errors
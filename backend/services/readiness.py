@@ -0,0 +1,45 @@
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+class Readiness:
+    """
+    Tracks the warm-up of components the API needs before taking traffic.
+    Liveness (/health) only says the process is up; readiness (/ready) says
+    every registered component has finished warming up.
+    """
+
+    PENDING = "pending"
+    READY = "ready"
+    FAILED = "failed"
+
+    def __init__(self, components: Iterable[str]):
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._components: Dict[str, Dict] = {name: {"status": self.PENDING} for name in components}
+
+    def mark_ready(self, name: str) -> None:
+        with self._lock:
+            self._components[name] = {
+                "status": self.READY,
+                "after_seconds": round(time.monotonic() - self._started, 3),
+            }
+
+    def mark_failed(self, name: str, error: Exception) -> None:
+        with self._lock:
+            self._components[name] = {"status": self.FAILED, "error": str(error)}
+
+    def is_ready(self, name: Optional[str] = None) -> bool:
+        with self._lock:
+            if name is not None:
+                return self._components.get(name, {}).get("status") == self.READY
+            return all(c["status"] == self.READY for c in self._components.values())
+
+    def report(self) -> Dict:
+        with self._lock:
+            components = {name: dict(state) for name, state in self._components.items()}
+        ready = all(c["status"] == self.READY for c in components.values())
+        return {"status": self.READY if ready else "starting", "components": components}
+
+# Components warmed by the API's startup task
+readiness = Readiness(["database", "db_pool", "shared_state", "resume_processor", "prompts"])
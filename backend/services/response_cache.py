@@ -0,0 +1,112 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Callable, Optional, Tuple
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from services.json_codec import dumps_bytes
+from services.metrics import record_cache
+from services.shared_state import get_shared_state
+
+# Conditional GETs and a server-side body cache for read endpoints.
+#
+# Each cached resource belongs to a scope ("topics", "topic_quizzes:3", ...)
+# with a version counter in the shared-state store. Writes bump the version
+# via invalidate(), which every worker sees; the ETag and the cache key both
+# include the version, so stale entries are simply never looked up again.
+# Bodies are cached per worker (bounded LRU); only the small counters are shared.
+
+Builder = Callable[[], Tuple[Any, Optional[datetime]]]
+
+def _http_date(moment: datetime) -> str:
+    if moment.tzinfo is None:
+        # Timestamps are stored as naive UTC (datetime.utcnow)
+        moment = moment.replace(tzinfo=timezone.utc)
+    return formatdate(moment.timestamp(), usegmt=True)
+
+def _etag_matches(header: str, etag: str) -> bool:
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str, str], Tuple[bytes, Optional[str]]]" = OrderedDict()
+
+    @staticmethod
+    def _version_key(scope: str) -> str:
+        return f"cache:version:{scope}"
+
+    def version(self, scope: str) -> str:
+        """Current version of a scope, seeded on first use"""
+        state = get_shared_state()
+        key = self._version_key(scope)
+        version = state.get(key)
+        if version is None:
+            # Seed from the clock so versions never repeat after a memory:// store restarts
+            state.set_if_absent(key, str(time.time_ns()))
+            version = state.get(key)
+        return version
+
+    def invalidate(self, scope: str) -> None:
+        """Call after a write that changes what the scope's endpoints return"""
+        state = get_shared_state()
+        key = self._version_key(scope)
+        state.set_if_absent(key, str(time.time_ns()))
+        state.incr(key)
+
+    def respond(self, request: Request, scope: str, build: Builder, variant: str = "") -> Response:
+        """
+        Serve a JSON GET with ETag/Last-Modified validators. `build` returns
+        (payload, last_modified) and only runs when this worker has no body
+        for the current version; a matching If-None-Match gets a 304 without
+        touching the database.
+        """
+        version = self.version(scope)
+        etag = '"' + hashlib.sha1(f"{scope}|{variant}|{version}".encode()).hexdigest()[:20] + '"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        cache_name = f"response:{scope.split(':', 1)[0]}"
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and _etag_matches(if_none_match, etag):
+            record_cache(cache_name, True)
+            return Response(status_code=304, headers=headers)
+
+        cache_key = (scope, variant, version)
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                self._entries.move_to_end(cache_key)
+        record_cache(cache_name, entry is not None)
+
+        if entry is None:
+            payload, last_modified = build()
+            entry = (dumps_bytes(payload), _http_date(last_modified) if last_modified else None)
+            with self._lock:
+                self._entries[cache_key] = entry
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+        body, last_modified_header = entry
+        if last_modified_header:
+            headers["Last-Modified"] = last_modified_header
+            if_modified_since = request.headers.get("if-modified-since")
+            if if_modified_since and not if_none_match:
+                try:
+                    if parsedate_to_datetime(if_modified_since) >= parsedate_to_datetime(last_modified_header):
+                        return Response(status_code=304, headers=headers)
+                except (TypeError, ValueError):
+                    pass
+        return Response(content=body, media_type="application/json", headers=headers)
+
+response_cache = ResponseCache(int(os.getenv("RESPONSE_CACHE_SIZE", "256")))
@@ -1,10 +1,17 @@
 import os
 import re
 import json
+import threading
 from typing import List, Dict, Optional
 import tempfile
-from PyPDF2 import PdfReader
-from docx import Document
+import time
+
+from services.deadline import Deadline, DeadlineExceeded
+from services.log import get_logger
+from services.metrics import extraction_latency
+from services.tracing import traced
+
+logger = get_logger("resume_processor")
 
 class ResumeProcessor:
     """Service for processing resume files and extracting relevant information"""
@@ -62,13 +69,17 @@ class ResumeProcessor:
         """Extract text from PDF or DOCX file"""
         try:
             file_extension = os.path.splitext(filename)[1].lower()
+            started = time.perf_counter()
             
             if file_extension == '.pdf':
-                return await self._extract_from_pdf(file_content)
+                text = await self._extract_from_pdf(file_content)
             elif file_extension in ['.docx', '.doc']:
-                return await self._extract_from_docx(file_content)
+                text = await self._extract_from_docx(file_content)
             else:
                 raise ValueError(f"Unsupported file format: {file_extension}")
+            
+            extraction_latency.observe(time.perf_counter() - started, file_type=file_extension.lstrip("."))
+            return text
                 
         except Exception as e:
             raise Exception(f"Failed to extract text from {filename}: {str(e)}")
@@ -82,6 +93,8 @@ class ResumeProcessor:
                 temp_file_path = temp_file.name
             
             try:
+                # Imported on first use: the parsers add noticeably to API cold start
+                from PyPDF2 import PdfReader
                 reader = PdfReader(temp_file_path)
                 text = ""
                 for page in reader.pages:
@@ -104,6 +117,7 @@ class ResumeProcessor:
                 temp_file_path = temp_file.name
             
             try:
+                from docx import Document
                 doc = Document(temp_file_path)
                 text = ""
                 for paragraph in doc.paragraphs:
@@ -169,8 +183,15 @@ class ResumeProcessor:
             "experience_years": max(experience_years) if experience_years else 0
         }
     
-    def generate_resume_quiz(self, resume_text: str, extracted_topics: Dict, filename: str) -> Dict:
-        """Generate a 30-question quiz based on resume content"""
+    @traced("resume_quiz.generate")
+    def generate_resume_quiz(self, resume_text: str, extracted_topics: Dict, filename: str,
+                             deadline: Optional[Deadline] = None) -> Dict:
+        """
+        Generate a 30-question quiz based on resume content.
+        Questions come from the per-skill question bank (services/skill_bank.py).
+        Raises DeadlineExceeded carrying the questions available so far if
+        the request budget runs out while pools are being filled.
+        """
         try:
             tech_skills = extracted_topics.get("technical_skills", [])
             soft_skills = extracted_topics.get("soft_skills", [])
@@ -189,65 +210,15 @@ class ResumeProcessor:
                 else:
                     difficulty = "medium"  # Default to medium instead of easy
                 
-                # Create a specialized prompt for resume-based quiz
-                prompt = f"""
-                Create a comprehensive 30-question multiple choice quiz for someone with experience in: {skills_text}.
-                
-                Based on their resume, they have {experience_years} years of experience.
-                Difficulty level: {difficulty}
-                
-                Focus on:
-                - Technical concepts related to their skills
-                - Best practices and industry standards
-                - Problem-solving scenarios
-                - Integration between different technologies they know
-                
-                Return EXACTLY 30 questions in this JSON format:
-                {{
-                    "questions": [
-                        {{
-                            "q": "Question text here?",
-                            "options": ["Option A", "Option B", "Option C", "Option D"],
-                            "answer_index": 0,
-                            "category": "Technical Category"
-                        }}
-                    ]
-                }}
-                
-                Make questions practical and interview-relevant.
-                """
+                # Assemble the quiz from per-skill pools shared with earlier resumes;
+                # only pools that are still too small call Gemini
+                from services.skill_bank import skill_bank
                 
-                # Use the existing Gemini client to generate questions (3 batches of 10)
-                from services.gemini_client import generate_quiz
+                logger.info("Generating resume quiz", extra={"skills": skills_text, "difficulty": difficulty,
+                                                             "experience_years": experience_years})
+                all_questions = skill_bank.assemble(primary_skills, difficulty, 30, deadline=deadline)
                 
-                all_questions = []
-                print(f"🎯 Generating quiz for skills: {skills_text}")
-                print(f"🔧 Difficulty: {difficulty}, Experience: {experience_years} years")
-                
-                # Enhanced prompts for tougher questions
-                tough_prompts = [
-                    f"Create 10 advanced {difficulty} level interview questions about {skills_text}. Focus on complex scenarios, architectural decisions, performance optimization, and real-world problem-solving challenges.",
-                    f"Generate 10 expert-level questions on {skills_text}. Include questions about debugging complex issues, system design patterns, integration challenges, and best practices for production environments.",
-                    f"Create 10 challenging technical questions for {skills_text}. Focus on edge cases, security considerations, scalability issues, and advanced implementation details that experienced developers face."
-                ]
-                
-                for batch in range(3):  # Generate 3 batches of 10 questions each
-                    try:
-                        batch_prompt = tough_prompts[batch]
-                        print(f"📝 Generating batch {batch + 1}/3...")
-                        quiz_response = generate_quiz(batch_prompt, difficulty)
-                        
-                        if quiz_response and "questions" in quiz_response:
-                            questions_count = len(quiz_response["questions"])
-                            print(f"✅ Batch {batch + 1} completed: {questions_count} questions")
-                            all_questions.extend(quiz_response["questions"])
-                        else:
-                            print(f"⚠️ Batch {batch + 1} failed: no questions generated")
-                    except Exception as batch_error:
-                        print(f"❌ Batch {batch + 1} error: {str(batch_error)}")
-                        continue
-                
-                print(f"🎲 Total questions generated: {len(all_questions)}")
+                logger.info("Resume quiz assembled", extra={"questions": len(all_questions)})
                 quiz_response = {"questions": all_questions}
                 
                 if quiz_response and "questions" in quiz_response:
@@ -270,26 +241,12 @@ class ResumeProcessor:
                     "Complex Project Management and Risk Assessment"
                 ]
                 
-                from services.gemini_client import generate_quiz
+                from services.skill_bank import skill_bank
                 
-                all_questions = []
-                print(f"🔄 Fallback mode: generating challenging professional questions")
+                logger.info("No technical skills found, generating professional questions")
+                all_questions = skill_bank.assemble(challenging_topics, "hard", 30, deadline=deadline)  # Always use hard for fallback
                 
-                for topic in challenging_topics:
-                    try:
-                        print(f"📝 Generating questions for: {topic}")
-                        quiz_response = generate_quiz(topic, difficulty="hard")  # Always use hard for fallback
-                        if quiz_response and "questions" in quiz_response:
-                            questions_count = len(quiz_response["questions"])
-                            print(f"✅ {topic} completed: {questions_count} questions")
-                            all_questions.extend(quiz_response["questions"])
-                        else:
-                            print(f"⚠️ {topic} failed: no questions generated")
-                    except Exception as topic_error:
-                        print(f"❌ {topic} error: {str(topic_error)}")
-                        continue
-                
-                print(f"🎲 Total fallback questions: {len(all_questions)}")
+                logger.info("Fallback quiz assembled", extra={"questions": len(all_questions)})
                 quiz_response = {"questions": all_questions}
                 
                 return {
@@ -302,11 +259,10 @@ class ResumeProcessor:
                     "experience_level": experience_years
                 }
                 
+        except DeadlineExceeded:
+            raise
         except Exception as e:
-            print(f"❌ Error in generate_resume_quiz: {str(e)}")
-            print(f"🔍 Error type: {type(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error in generate_resume_quiz: %s", e)
             raise Exception(f"Failed to generate resume quiz: {str(e)}")
     
     def validate_file(self, filename: str, file_size: int) -> bool:
@@ -324,5 +280,19 @@ class ResumeProcessor:
         
         return True
 
-# Global instance
-resume_processor = ResumeProcessor()
\ No newline at end of file
+_resume_processor: Optional[ResumeProcessor] = None
+_resume_processor_lock = threading.Lock()
+
+def get_resume_processor() -> ResumeProcessor:
+    """Shared ResumeProcessor, built on first use (or by the startup warm-up) instead of at import"""
+    global _resume_processor
+    if _resume_processor is None:
+        with _resume_processor_lock:
+            if _resume_processor is None:
+                _resume_processor = ResumeProcessor()
+    return _resume_processor
+
+def preload_parsers() -> None:
+    """Import the PDF and DOCX parsers ahead of the first upload"""
+    import PyPDF2  # noqa: F401
+    import docx  # noqa: F401
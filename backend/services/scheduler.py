@@ -0,0 +1,248 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Optional
+
+from fastapi import HTTPException, Request
+
+from services.log import get_logger
+from services.metrics import generation_admissions, generation_queue_wait, register_scheduler
+
+# Admission control for quiz generation. Every generation request takes
+# `cost` slots (roughly its number of upstream calls) out of a fixed
+# capacity before it starts, so a burst of resume quizzes cannot take every
+# threadpool thread and starve topic quizzes and plain reads. Waiting
+# requests are queued per priority class, highest class first, and within a
+# class round-robin across clients so one client's burst waits behind its
+# own requests rather than everyone else's. Lower classes may not use the
+# last `reserved` slots, which keeps interactive latency steady while long
+# resume generations run.
+#
+# The scheduler lives on the event loop of one worker; with several workers
+# each admits up to its own capacity.
+
+INTERACTIVE = "interactive"  # topic quizzes: one user waiting on one call
+RESUME = "resume"            # resume quizzes: several calls per request
+BACKGROUND = "background"    # warmers and other work nobody is waiting on
+PRIORITIES = (INTERACTIVE, RESUME, BACKGROUND)  # highest first
+
+# Slots a request takes, by priority class
+COSTS = {
+    INTERACTIVE: 1,
+    RESUME: int(os.getenv("GENERATION_RESUME_COST", "3")),
+    BACKGROUND: 1,
+}
+
+logger = get_logger("scheduler")
+
+class SchedulerBusy(Exception):
+    """Raised when a request cannot be queued (or waited too long) for a generation slot"""
+
+    def __init__(self, message: str, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(message)
+
+class _Waiter:
+    __slots__ = ("priority", "client", "cost", "future", "admitted")
+
+    def __init__(self, priority: str, client: str, cost: int, future: "asyncio.Future[None]"):
+        self.priority = priority
+        self.client = client
+        self.cost = cost
+        self.future = future
+        self.admitted = False
+
+class GenerationScheduler:
+    def __init__(self, capacity: int = 8, reserved: int = 2, max_queue: int = 64,
+                 max_per_client: int = 8, queue_timeout: float = 15.0):
+        self.capacity = capacity
+        self.reserved = min(reserved, capacity - 1)
+        self.max_queue = max_queue
+        self.max_per_client = max_per_client
+        self.queue_timeout = queue_timeout
+        self._in_use = 0
+        self._waiting = 0
+        self._per_client: Dict[str, int] = {}
+        # priority -> client -> that client's waiters; client order is the round-robin order
+        self._queues: Dict[str, "OrderedDict[str, Deque[_Waiter]]"] = {p: OrderedDict() for p in PRIORITIES}
+        # Moving average of how long one slot is held, for Retry-After estimates
+        self._slot_seconds = 5.0
+
+    def _limit(self, priority: str) -> int:
+        if priority == INTERACTIVE:
+            return self.capacity
+        if priority == RESUME:
+            return self.capacity - self.reserved
+        return max(1, (self.capacity - self.reserved) // 2)
+
+    def _fits(self, priority: str, cost: int) -> bool:
+        # A request costing more than its class limit still runs, alone
+        return self._in_use + cost <= self._limit(priority) or self._in_use == 0
+
+    def _queued_ahead(self, priority: str) -> bool:
+        for p in PRIORITIES:
+            if self._queues[p]:
+                return True
+            if p == priority:
+                return False
+        return False
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue has likely drained"""
+        queued = sum(w.cost for clients in self._queues.values() for waiters in clients.values() for w in waiters)
+        return max(1, math.ceil(self._slot_seconds * (self._in_use + queued) / self.capacity))
+
+    def stats(self) -> Dict[str, int]:
+        return {"capacity": self.capacity, "in_use": self._in_use, "queued": self._waiting}
+
+    def _dequeue(self, waiter: _Waiter) -> None:
+        clients = self._queues[waiter.priority]
+        waiters = clients.get(waiter.client)
+        if waiters is None or waiter not in waiters:
+            return
+        waiters.remove(waiter)
+        if not waiters:
+            del clients[waiter.client]
+        self._waiting -= 1
+        self._per_client[waiter.client] -= 1
+        if not self._per_client[waiter.client]:
+            del self._per_client[waiter.client]
+
+    def _dispatch(self) -> None:
+        """Admit queued requests in priority order, round-robin across clients, while they fit"""
+        for priority in PRIORITIES:
+            clients = self._queues[priority]
+            while clients:
+                client, waiters = next(iter(clients.items()))
+                waiter = waiters[0]
+                if waiter.future.done():
+                    # Timed out or cancelled; its task removes it, but may not have run yet
+                    self._dequeue(waiter)
+                    continue
+                if not self._fits(priority, waiter.cost):
+                    # Strict priority: lower classes do not overtake a waiting higher one
+                    return
+                self._dequeue(waiter)
+                if client in clients:
+                    clients.move_to_end(client)
+                self._in_use += waiter.cost
+                waiter.admitted = True
+                waiter.future.set_result(None)
+
+    def _evict_below(self, priority: str) -> bool:
+        """Turn away the newest waiter of the lowest class below `priority` to make room; False if there is none"""
+        for lower in reversed(PRIORITIES[PRIORITIES.index(priority) + 1:]):
+            clients = self._queues[lower]
+            if not clients:
+                continue
+            # The client with the most queued requests gives one up
+            waiter = max(clients.values(), key=len)[-1]
+            self._dequeue(waiter)
+            if not waiter.future.done():
+                waiter.future.set_exception(SchedulerBusy(
+                    "Quiz generation is busy with higher-priority requests; please retry shortly",
+                    self.retry_after()))
+            return True
+        return False
+
+    async def acquire(self, priority: str, client: str, cost: int, timeout: Optional[float] = None) -> None:
+        if self._fits(priority, cost) and not self._queued_ahead(priority):
+            self._in_use += cost
+            generation_admissions.inc(priority=priority, result="admitted")
+            generation_queue_wait.observe(0.0, priority=priority)
+            return
+        if self._waiting >= self.max_queue and not self._evict_below(priority):
+            generation_admissions.inc(priority=priority, result="rejected")
+            raise SchedulerBusy("Too many quiz generations are queued; please retry shortly", self.retry_after())
+        if self._per_client.get(client, 0) >= self.max_per_client:
+            generation_admissions.inc(priority=priority, result="rejected")
+            raise SchedulerBusy("Too many of your quiz generations are queued; please wait for them to finish",
+                                self.retry_after())
+
+        waiter = _Waiter(priority, client, cost, asyncio.get_running_loop().create_future())
+        self._queues[priority].setdefault(client, deque()).append(waiter)
+        self._waiting += 1
+        self._per_client[client] = self._per_client.get(client, 0) + 1
+        started = time.monotonic()
+        # Callers with a deadline of their own (resume quizzes) may wait for all of it
+        timeout = self.queue_timeout if timeout is None else timeout
+        try:
+            await asyncio.wait_for(waiter.future, timeout)
+        except SchedulerBusy:
+            generation_admissions.inc(priority=priority, result="rejected")
+            raise
+        except asyncio.TimeoutError:
+            self._dequeue(waiter)
+            if not waiter.admitted:
+                # Whoever was queued behind it may fit now
+                self._dispatch()
+                generation_admissions.inc(priority=priority, result="timed_out")
+                raise SchedulerBusy(f"No quiz generation slot freed up within {timeout:g}s", self.retry_after())
+        except asyncio.CancelledError:
+            # Client went away: give the slot back if it was granted in the meantime
+            self._dequeue(waiter)
+            if waiter.admitted:
+                self.release(cost)
+            else:
+                self._dispatch()
+            raise
+        generation_admissions.inc(priority=priority, result="admitted")
+        generation_queue_wait.observe(time.monotonic() - started, priority=priority)
+
+    def release(self, cost: int, held: Optional[float] = None) -> None:
+        self._in_use -= cost
+        if held is not None:
+            self._slot_seconds = 0.8 * self._slot_seconds + 0.2 * (held / cost)
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority: str, client: str, cost: Optional[int] = None,
+                   timeout: Optional[float] = None) -> AsyncIterator[None]:
+        """
+        Hold `cost` generation slots (the class's default cost if omitted) for
+        the body of the block, waiting up to `timeout` seconds for them
+        (queue_timeout if omitted)
+        """
+        cost = COSTS[priority] if cost is None else cost
+        await self.acquire(priority, client, cost, timeout)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(cost, time.monotonic() - started)
+
+def client_id(request: Request) -> str:
+    """Who a request counts against for fairness: the original client behind a proxy, else the peer address"""
+    forwarded = request.headers.get("x-forwarded-for")
+    if forwarded:
+        return forwarded.split(",", 1)[0].strip()
+    return request.client.host if request.client else "unknown"
+
+@asynccontextmanager
+async def generation_slot(request: Request, priority: str, timeout: Optional[float] = None) -> AsyncIterator[None]:
+    """generation_scheduler.slot for a request, answering 429 with Retry-After when no slot is available"""
+    try:
+        async with generation_scheduler.slot(priority, client_id(request), timeout=timeout):
+            yield
+    except SchedulerBusy as e:
+        logger.info("Generation request turned away: %s", e, extra={"priority": priority})
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(int(e.retry_after))})
+
+def admit(priority: str):
+    """Route dependency holding a generation slot of `priority` for the rest of the request"""
+    async def dependency(request: Request):
+        async with generation_slot(request, priority):
+            yield
+    return dependency
+
+generation_scheduler = GenerationScheduler(
+    capacity=int(os.getenv("GENERATION_CAPACITY", "8")),
+    reserved=int(os.getenv("GENERATION_RESERVED_INTERACTIVE", "2")),
+    max_queue=int(os.getenv("GENERATION_QUEUE_SIZE", "64")),
+    max_per_client=int(os.getenv("GENERATION_QUEUE_PER_CLIENT", "8")),
+    queue_timeout=float(os.getenv("GENERATION_QUEUE_TIMEOUT", "15")),
+)
+register_scheduler(generation_scheduler)
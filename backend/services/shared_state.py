@@ -0,0 +1,300 @@
+import asyncio
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Dict, Iterator, Optional, Tuple
+
+# State that must agree across uvicorn workers and replicas: API key
+# cooldowns, per-key quota counters, generation locks and cache version
+# counters. The interface mirrors the handful of Redis commands it needs
+# (GET, SET EX, SET NX EX, INCRBY, DEL) so each backend stays small.
+#
+#   SHARED_STATE_URL=memory://                   single process (default)
+#   SHARED_STATE_URL=sqlite:///./data/state.db   all workers on one machine
+#   SHARED_STATE_URL=redis://host:6379/0         several machines (needs the redis package)
+
+class LockTimeout(Exception):
+    """Raised when a shared lock could not be acquired in time"""
+
+class SharedState:
+    """Key/value store with expiry; values are strings"""
+
+    def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    def set_if_absent(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        """Set the key only if it does not exist; return True if it was set"""
+        raise NotImplementedError
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        """Add to an integer counter and return the new value; `ttl` applies when the counter is created"""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def delete_if_equals(self, key: str, value: str) -> bool:
+        """Delete the key only while it still holds `value` (used to release locks safely)"""
+        raise NotImplementedError
+
+    def try_acquire(self, name: str, ttl: float) -> Optional[str]:
+        """Take the lock `name` if it is free; return a release token, or None if it is held"""
+        token = uuid.uuid4().hex
+        return token if self.set_if_absent(f"lock:{name}", token, ttl) else None
+
+    def release(self, name: str, token: str) -> None:
+        self.delete_if_equals(f"lock:{name}", token)
+
+    @contextmanager
+    def lock(self, name: str, ttl: float = 60.0, timeout: float = 0.0,
+             poll_interval: float = 0.05) -> Iterator[None]:
+        """
+        Hold a lock shared by every worker using this store. The lock expires
+        after `ttl` seconds in case its holder dies; LockTimeout is raised if
+        it cannot be acquired within `timeout` seconds.
+        """
+        give_up_at = time.monotonic() + timeout
+        token = self.try_acquire(name, ttl)
+        while token is None:
+            if time.monotonic() >= give_up_at:
+                raise LockTimeout(f"Could not acquire lock '{name}' within {timeout:g}s")
+            time.sleep(poll_interval)
+            token = self.try_acquire(name, ttl)
+        try:
+            yield
+        finally:
+            self.release(name, token)
+
+    @asynccontextmanager
+    async def async_lock(self, name: str, ttl: float = 60.0, timeout: float = 0.0,
+                         poll_interval: float = 0.05) -> AsyncIterator[None]:
+        """lock() for async routes: waits with asyncio.sleep so the event loop keeps running"""
+        give_up_at = time.monotonic() + timeout
+        token = self.try_acquire(name, ttl)
+        while token is None:
+            if time.monotonic() >= give_up_at:
+                raise LockTimeout(f"Could not acquire lock '{name}' within {timeout:g}s")
+            await asyncio.sleep(poll_interval)
+            token = self.try_acquire(name, ttl)
+        try:
+            yield
+        finally:
+            self.release(name, token)
+
+class MemoryState(SharedState):
+    """Process-local store; correct for a single worker only"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data: Dict[str, Tuple[str, Optional[float]]] = {}
+
+    def _live(self, key: str, now: float) -> Optional[str]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= now:
+            del self._data[key]
+            return None
+        return value
+
+    @staticmethod
+    def _expiry(ttl: Optional[float], now: float) -> Optional[float]:
+        return now + ttl if ttl else None
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._live(key, time.monotonic())
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._data[key] = (value, self._expiry(ttl, time.monotonic()))
+
+    def set_if_absent(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            if self._live(key, now) is not None:
+                return False
+            self._data[key] = (value, self._expiry(ttl, now))
+            return True
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        with self._lock:
+            now = time.monotonic()
+            current = self._live(key, now)
+            if current is None:
+                value, expires_at = amount, self._expiry(ttl, now)
+            else:
+                value, expires_at = int(current) + amount, self._data[key][1]
+            self._data[key] = (str(value), expires_at)
+            return value
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_if_equals(self, key: str, value: str) -> bool:
+        with self._lock:
+            if self._live(key, time.monotonic()) == value:
+                del self._data[key]
+                return True
+            return False
+
+class SQLiteState(SharedState):
+    """
+    Store in a SQLite file in WAL mode, shared by every worker process on the
+    same machine. Writes that read first run in BEGIN IMMEDIATE transactions
+    so they are atomic across processes.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        with self._transaction() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS shared_state ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @staticmethod
+    def _expiry(ttl: Optional[float]) -> Optional[float]:
+        # Wall-clock time: expiries are compared across processes
+        return time.time() + ttl if ttl else None
+
+    @staticmethod
+    def _read(conn: sqlite3.Connection, key: str) -> Optional[Tuple[str, Optional[float]]]:
+        row = conn.execute("SELECT value, expires_at FROM shared_state WHERE key = ?", (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return None
+        return row
+
+    def _write(self, conn: sqlite3.Connection, key: str, value: str, expires_at: Optional[float]) -> None:
+        conn.execute("INSERT OR REPLACE INTO shared_state (key, value, expires_at) VALUES (?, ?, ?)",
+                     (key, value, expires_at))
+        # Expired rows are otherwise only overwritten, so sweep now and then
+        if random.random() < 0.01:
+            conn.execute("DELETE FROM shared_state WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+
+    def get(self, key: str) -> Optional[str]:
+        row = self._read(self._conn(), key)
+        return row[0] if row else None
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        with self._transaction() as conn:
+            self._write(conn, key, value, self._expiry(ttl))
+
+    def set_if_absent(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        with self._transaction() as conn:
+            if self._read(conn, key) is not None:
+                return False
+            self._write(conn, key, value, self._expiry(ttl))
+            return True
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        with self._transaction() as conn:
+            row = self._read(conn, key)
+            if row is None:
+                value, expires_at = amount, self._expiry(ttl)
+            else:
+                value, expires_at = int(row[0]) + amount, row[1]
+            self._write(conn, key, str(value), expires_at)
+            return value
+
+    def delete(self, key: str) -> None:
+        self._conn().execute("DELETE FROM shared_state WHERE key = ?", (key,))
+
+    def delete_if_equals(self, key: str, value: str) -> bool:
+        cursor = self._conn().execute("DELETE FROM shared_state WHERE key = ? AND value = ?", (key, value))
+        return cursor.rowcount > 0
+
+class RedisState(SharedState):
+    """Store in Redis, shared across machines; keys are namespaced with SHARED_STATE_PREFIX"""
+
+    _DELETE_IF_EQUALS = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+    def __init__(self, url: str, prefix: str = "tpicq:"):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("SHARED_STATE_URL points at Redis but the 'redis' package is not installed (pip install redis)")
+        self._client = redis.Redis.from_url(url, decode_responses=True)
+        self._prefix = prefix
+
+    @staticmethod
+    def _ttl_ms(ttl: Optional[float]) -> Optional[int]:
+        return max(1, int(ttl * 1000)) if ttl else None
+
+    def get(self, key: str) -> Optional[str]:
+        return self._client.get(self._prefix + key)
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        self._client.set(self._prefix + key, value, px=self._ttl_ms(ttl))
+
+    def set_if_absent(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        return bool(self._client.set(self._prefix + key, value, nx=True, px=self._ttl_ms(ttl)))
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        value = self._client.incrby(self._prefix + key, amount)
+        if ttl and value == amount:
+            self._client.pexpire(self._prefix + key, self._ttl_ms(ttl))
+        return value
+
+    def delete(self, key: str) -> None:
+        self._client.delete(self._prefix + key)
+
+    def delete_if_equals(self, key: str, value: str) -> bool:
+        return bool(self._client.eval(self._DELETE_IF_EQUALS, 1, self._prefix + key, value))
+
+def create_shared_state(url: str) -> SharedState:
+    """Build a store from a URL: memory://, sqlite:///<path> or redis://..."""
+    if url.startswith("memory://"):
+        return MemoryState()
+    if url.startswith("sqlite:///"):
+        return SQLiteState(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisState(url, os.getenv("SHARED_STATE_PREFIX", "tpicq:"))
+    raise ValueError(f"Unsupported SHARED_STATE_URL: {url}")
+
+_shared_state: Optional[SharedState] = None
+_shared_state_lock = threading.Lock()
+
+def get_shared_state() -> SharedState:
+    """The store configured by SHARED_STATE_URL, created on first use"""
+    global _shared_state
+    if _shared_state is None:
+        with _shared_state_lock:
+            if _shared_state is None:
+                _shared_state = create_shared_state(os.getenv("SHARED_STATE_URL", "memory://"))
+    return _shared_state
+
+def is_process_local() -> bool:
+    return isinstance(get_shared_state(), MemoryState)
@@ -0,0 +1,63 @@
+import hashlib
+import struct
+from typing import Any, Dict, List, Optional
+
+# Quizzes are stored in canonical order (as generated: correct answer first)
+# and shuffled when served. The option order for a serve is derived from a
+# key naming the quiz and a seed (an attempt, a user, or by default the quiz
+# itself), so the same key always yields the same order: any number of users
+# can be served one cached canonical quiz, and grading recomputes the order
+# instead of storing it.
+#
+# One SHAKE-128 call produces the random words for every question at once;
+# each question is then a Fisher-Yates shuffle over its options.
+
+MAX_SEED_LENGTH = 64
+
+def serve_key(kind: str, quiz_id: Any, seed: Optional[str] = None) -> str:
+    """Permutation key for serving quiz `quiz_id`; without a seed every serve of the quiz looks the same"""
+    return f"{kind}:{quiz_id}:{quiz_id if seed is None else seed}"
+
+def option_orders(key: str, option_counts: List[int]) -> List[List[int]]:
+    """For each question, the canonical option index shown at each position"""
+    needed = sum(max(count - 1, 0) for count in option_counts)
+    words = struct.unpack(f">{needed}H", hashlib.shake_128(key.encode("utf-8")).digest(2 * needed))
+    orders = []
+    w = 0
+    for count in option_counts:
+        order = list(range(count))
+        for i in range(count - 1, 0, -1):
+            j = words[w] % (i + 1)
+            w += 1
+            order[i], order[j] = order[j], order[i]
+        orders.append(order)
+    return orders
+
+def _option_counts(questions: List[Dict]) -> List[int]:
+    return [len(q.get("options") or []) for q in questions]
+
+def shuffle_quiz(content: Dict, key: str) -> Dict:
+    """A copy of `content` with every question's options in the order for `key`; `content` is not modified"""
+    questions = content.get("questions")
+    if not questions:
+        return content
+    shuffled = []
+    for question, order in zip(questions, option_orders(key, _option_counts(questions))):
+        answer = question.get("answer_index")
+        if not order or not isinstance(answer, int) or not 0 <= answer < len(order):
+            shuffled.append(question)
+            continue
+        shuffled.append({
+            **question,
+            "options": [question["options"][i] for i in order],
+            "answer_index": order.index(answer),
+        })
+    return {**content, "questions": shuffled}
+
+def to_canonical(content: Dict, key: str, choices: List[Optional[int]]) -> List[Optional[int]]:
+    """Map option positions picked on a quiz served with `key` back to canonical option indexes (for grading)"""
+    orders = option_orders(key, _option_counts(content.get("questions") or []))
+    canonical = []
+    for choice, order in zip(choices, orders):
+        canonical.append(order[choice] if choice is not None and 0 <= choice < len(order) else None)
+    return canonical
@@ -0,0 +1,205 @@
+import contextvars
+import hashlib
+import os
+import random
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from db import SessionLocal
+from models import SkillQuestion
+from services import json_codec
+from services.deadline import Deadline, DeadlineExceeded
+from services.dedup import filter_questions, question_texts
+from services.log import get_logger
+from services.metrics import record_cache, duplicate_questions
+from services.shared_state import get_shared_state
+from services.tracing import span
+from services.topic_index import normalize_topic
+
+# Resume quizzes are assembled from per-(skill, difficulty) question pools
+# instead of one prompt per skill combination. "Python, React, Docker" and
+# "Docker, Python, React" draw on the same three pools, and a pool only calls
+# Gemini when it holds fewer questions than a quiz needs from it, so a stack
+# that keeps showing up is served almost entirely from the database.
+
+# Each fill asks for a different angle so a growing pool does not repeat itself
+FILL_FOCUSES = [
+    "interview-level complex scenarios, architectural decisions, performance optimization and real-world problem solving",
+    "interview-level debugging of complex issues, system design patterns, integration challenges and production best practices",
+    "interview-level edge cases, security considerations, scalability issues and advanced implementation details",
+]
+
+# Fills for different skills run in parallel; each holds a Gemini call
+_fill_executor = ThreadPoolExecutor(max_workers=int(os.getenv("SKILL_BANK_FILL_WORKERS", "4")),
+                                    thread_name_prefix="skill-bank")
+
+logger = get_logger("skill_bank")
+
+def normalize_skill(skill: str) -> str:
+    # Same rules as topic names, so "React.js" and "ReactJS" share one pool
+    return normalize_topic(skill)
+
+def question_hash(question: Dict) -> str:
+    text = re.sub(r"\W+", " ", str(question.get("q", ""))).strip().lower()
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def split_quota(total: int, parts: int) -> List[int]:
+    """Spread `total` questions over `parts` skills as evenly as possible"""
+    base, extra = divmod(total, parts)
+    return [base + (1 if i < extra else 0) for i in range(parts)]
+
+class SkillBank:
+    """Per-skill question pools stored in the skill_questions table"""
+
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+
+    def pool_sizes(self, skills: List[str], difficulty: str) -> Dict[str, int]:
+        db = self.session_factory()
+        try:
+            rows = (
+                db.query(SkillQuestion.skill, func.count(SkillQuestion.id))
+                .filter(SkillQuestion.skill.in_(skills), SkillQuestion.difficulty == difficulty)
+                .group_by(SkillQuestion.skill)
+                .all()
+            )
+            sizes = {skill: 0 for skill in skills}
+            sizes.update({skill: count for skill, count in rows})
+            return sizes
+        finally:
+            db.close()
+
+    def load_pool(self, skill: str, difficulty: str) -> List[Dict]:
+        db = self.session_factory()
+        try:
+            rows = (
+                db.query(SkillQuestion.content_json)
+                .filter(SkillQuestion.skill == skill, SkillQuestion.difficulty == difficulty)
+                .all()
+            )
+            return [json_codec.loads(row.content_json) for row in rows]
+        finally:
+            db.close()
+
+    def add_questions(self, skill: str, difficulty: str, questions: List[Dict]) -> int:
+        """Store new questions in a pool, skipping ones it already holds; returns how many were added"""
+        db = self.session_factory()
+        try:
+            existing = {
+                row.question_hash for row in
+                db.query(SkillQuestion.question_hash)
+                .filter(SkillQuestion.skill == skill, SkillQuestion.difficulty == difficulty)
+            }
+            added = 0
+            for question in questions:
+                digest = question_hash(question)
+                if digest in existing:
+                    continue
+                existing.add(digest)
+                db.add(SkillQuestion(skill=skill, difficulty=difficulty, question_hash=digest,
+                                     content_json=json_codec.dumps(question)))
+                added += 1
+            db.commit()
+            return added
+        except IntegrityError:
+            # Another worker filled the same pool concurrently; its questions will do
+            db.rollback()
+            return 0
+        finally:
+            db.close()
+
+    def fill(self, skill: str, label: str, difficulty: str, needed: int,
+             deadline: Optional[Deadline] = None) -> int:
+        """
+        Generate questions for one pool until it holds at least `needed`.
+        One worker fills a pool at a time; others wait and reuse its result.
+        Returns the pool size afterwards.
+        """
+        from services.gemini_client import generate_quiz
+
+        timeout = deadline.remaining() if deadline else 60.0
+        with get_shared_state().lock(f"skill_bank:{difficulty}:{skill}", ttl=timeout + 30, timeout=timeout):
+            pool_texts = question_texts(self.load_pool(skill, difficulty))
+            size = len(pool_texts)
+            attempts = 0
+            while size < needed and attempts < len(FILL_FOCUSES):
+                if deadline:
+                    deadline.check()
+                focus = FILL_FOCUSES[(size // 10 + attempts) % len(FILL_FOCUSES)]
+                with span("skill_bank.fill", skill=skill, difficulty=difficulty, pool=size):
+                    # New questions must not reword ones the pool already holds
+                    quiz = generate_quiz(label, difficulty, focus=focus, endpoint="resume_quiz", deadline=deadline,
+                                         avoid=pool_texts)
+                pool_texts.extend(question_texts(quiz.get("questions", [])))
+                added = self.add_questions(skill, difficulty, quiz.get("questions", []))
+                logger.info("Skill pool filled", extra={"skill": skill, "difficulty": difficulty, "added": added})
+                size += added
+                attempts += 1
+            return size
+
+    def assemble(self, skills: List[str], difficulty: str, total: int,
+                 deadline: Optional[Deadline] = None) -> List[Dict]:
+        """
+        Pick `total` questions spread across `skills`, filling short pools
+        first (in parallel). Skills whose pool cannot be filled are covered by
+        the others where possible, so this may return fewer than `total`.
+        Raises DeadlineExceeded carrying whatever was already available.
+        """
+        labels: Dict[str, str] = {}
+        for skill in skills:
+            labels.setdefault(normalize_skill(skill), skill)
+        keys = list(labels)
+        if not keys:
+            return []
+        quotas = dict(zip(keys, split_quota(total, len(keys))))
+
+        sizes = self.pool_sizes(keys, difficulty)
+        short = [key for key in keys if sizes[key] < quotas[key]]
+        for key in keys:
+            record_cache("skill_bank", key not in short)
+
+        if short:
+            # Each fill runs in a copy of this context so its spans and logs stay on the request
+            futures = {
+                key: _fill_executor.submit(contextvars.copy_context().run, self.fill, key, labels[key],
+                                           difficulty, quotas[key], deadline)
+                for key in short
+            }
+            timed_out = None
+            for key, future in futures.items():
+                try:
+                    sizes[key] = future.result()
+                except DeadlineExceeded as e:
+                    timed_out = e
+                except Exception as e:
+                    logger.warning("Could not fill pool for %s: %s", key, e)
+            if timed_out:
+                partial = [q for key in keys for q in self.load_pool(key, difficulty)[:quotas[key]]]
+                raise DeadlineExceeded(str(timed_out), partial_results=partial)
+
+        # Draw each skill's share at random so repeat stacks still get varied quizzes
+        chosen: List[Dict] = []
+        leftovers: List[Dict] = []
+        for key in keys:
+            pool = self.load_pool(key, difficulty)
+            random.shuffle(pool)
+            chosen.extend(pool[:quotas[key]])
+            leftovers.extend(pool[quotas[key]:])
+        # Related skills (say Python and Django) can hold near-identical questions;
+        # drop those and make up the difference from the remaining pool questions
+        chosen, removed = filter_questions(chosen)
+        if len(chosen) < total:
+            extra, more_removed = filter_questions(leftovers, question_texts(chosen))
+            removed += more_removed
+            chosen.extend(extra[:total - len(chosen)])
+        if removed:
+            duplicate_questions.inc(removed, stage="assembly")
+            logger.info("Dropped %d near-duplicate question(s) across skills", removed)
+        random.shuffle(chosen)
+        return chosen
+
+skill_bank = SkillBank()
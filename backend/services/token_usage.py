@@ -0,0 +1,56 @@
+import threading
+from typing import Any, Dict
+
+class TokenUsage:
+    """Token counts accumulated across all upstream calls made for one quiz"""
+
+    def __init__(self):
+        # Hedged requests may add usage from two threads at once
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def add(self, response_body: Dict[str, Any]) -> None:
+        """Add the usageMetadata block of a generateContent response"""
+        metadata = response_body.get("usageMetadata") or {}
+        with self._lock:
+            self.calls += 1
+            self.input_tokens += int(metadata.get("promptTokenCount", 0) or 0)
+            self.output_tokens += int(metadata.get("candidatesTokenCount", 0) or 0)
+
+class TokenUsageReport:
+    """Thread-safe per-endpoint aggregate of token usage per generated quiz"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints: Dict[str, Dict[str, int]] = {}
+
+    def record(self, endpoint: str, usage: TokenUsage, success: bool = True) -> None:
+        """Record the usage of one generate_quiz call (failed ones count as wasted)"""
+        with self._lock:
+            stats = self._endpoints.setdefault(endpoint, {
+                "quizzes": 0,
+                "failed_quizzes": 0,
+                "calls": 0,
+                "input_tokens": 0,
+                "output_tokens": 0,
+            })
+            stats["quizzes" if success else "failed_quizzes"] += 1
+            stats["calls"] += usage.calls
+            stats["input_tokens"] += usage.input_tokens
+            stats["output_tokens"] += usage.output_tokens
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        """Totals plus average tokens per successful quiz, keyed by endpoint"""
+        with self._lock:
+            snapshot = {endpoint: dict(stats) for endpoint, stats in self._endpoints.items()}
+
+        for stats in snapshot.values():
+            quizzes = stats["quizzes"] or 1
+            stats["avg_input_tokens_per_quiz"] = round(stats["input_tokens"] / quizzes, 1)
+            stats["avg_output_tokens_per_quiz"] = round(stats["output_tokens"] / quizzes, 1)
+        return snapshot
+
+# Global instance
+token_usage = TokenUsageReport()
@@ -0,0 +1,209 @@
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session, aliased
+
+from db import SessionLocal
+from models import Topic, Quiz, QuizAttempt, SkillQuestion
+from services.log import get_logger
+
+# Topic canonicalization. "React", "React.js" and "ReactJS" are one topic as
+# far as generation is concerned: each name is reduced to a matching key by
+# a few normalization rules, and keys that do not match exactly are compared
+# with the keys of existing canonical topics through an in-memory character
+# n-gram index. A name that matches becomes an alias row pointing at the
+# canonical topic (so it can still be looked up by name), and quizzes are
+# generated for and stored under the canonical topic only.
+
+NGRAM = 2
+MIN_FUZZY_LENGTH = 4  # shorter keys ("go", "c", "sql") only ever match exactly
+DEFAULT_THRESHOLD = float(os.getenv("TOPIC_MATCH_THRESHOLD", "0.82"))
+
+# Symbols that carry meaning and would otherwise be stripped with punctuation
+SYMBOLS = [("c++", " cpp "), ("c#", " csharp "), ("f#", " fsharp "), (".net", " dotnet ")]
+
+ALIASES = {
+    "js": "javascript",
+    "ts": "typescript",
+    "py": "python",
+    "golang": "go",
+    "k8s": "kubernetes",
+    "postgres": "postgresql",
+}
+
+# Words that do not change what a quiz about the topic should ask
+FILLER_WORDS = {"programming", "language", "framework", "library"}
+
+logger = get_logger("topics")
+
+def normalize_topic(name: str) -> str:
+    """Matching key for a topic or skill name, e.g. "React.js", "ReactJS" and "react" all give "react" """
+    text = name.lower()
+    for symbol, word in SYMBOLS:
+        text = text.replace(symbol, word)
+    words = re.findall(r"[^\W_]+", text)
+    if not words:
+        return re.sub(r"\s+", " ", name).strip().lower()
+    words = [word for word in words if word not in FILLER_WORDS] or words
+    key = "".join(words)
+    # "reactjs" / "vue.js" name the library, not JavaScript
+    if key.endswith("js") and len(key) > 2 and key not in ALIASES:
+        key = key[:-2]
+    return ALIASES.get(key, key)
+
+def _grams(key: str) -> Set[str]:
+    padded = f" {key} "
+    return {padded[i:i + NGRAM] for i in range(len(padded) - NGRAM + 1)}
+
+def _digits(key: str) -> str:
+    return "".join(re.findall(r"\d+", key))
+
+class TopicIndex:
+    """
+    Matching keys of canonical topics with an n-gram inverted index for
+    fuzzy lookups. Loaded lazily and caught up from the database (topics
+    with a higher id than the last one seen) before every match, so topics
+    created by other workers are found as well. Also maps every topic seen
+    to its canonical topic, which never changes once a topic exists.
+    """
+
+    def __init__(self, session_factory=SessionLocal, threshold: float = DEFAULT_THRESHOLD):
+        self.session_factory = session_factory
+        self.threshold = threshold
+        self._by_key: Dict[str, int] = {}
+        self._keys: Dict[int, str] = {}
+        self._postings: Dict[str, Set[int]] = defaultdict(set)
+        self._canonical: Dict[int, int] = {}
+        self._last_id = 0
+        self._lock = threading.Lock()
+
+    def _add(self, topic_id: int, key: str) -> None:
+        if key in self._by_key:
+            return
+        self._by_key[key] = topic_id
+        self._keys[topic_id] = key
+        for gram in _grams(key):
+            self._postings[gram].add(topic_id)
+
+    def _refresh(self, db: Session) -> None:
+        rows = (
+            db.query(Topic.id, Topic.normalized_name, Topic.canonical_id)
+            .filter(Topic.id > self._last_id)
+            .order_by(Topic.id)
+            .all()
+        )
+        for row in rows:
+            if row.canonical_id is None and row.normalized_name:
+                self._add(row.id, row.normalized_name)
+            self._canonical[row.id] = row.canonical_id or row.id
+            self._last_id = row.id
+
+    def _match(self, key: str) -> Optional[int]:
+        if key in self._by_key:
+            return self._by_key[key]
+        if len(key) < MIN_FUZZY_LENGTH:
+            return None
+        grams = _grams(key)
+        shared = Counter(topic_id for gram in grams for topic_id in self._postings.get(gram, ()))
+        best_id, best_score = None, 0.0
+        for topic_id, count in shared.items():
+            other = self._keys[topic_id]
+            # "python2" and "python3" are different topics however similar they look
+            if len(other) < MIN_FUZZY_LENGTH or _digits(other) != _digits(key):
+                continue
+            score = 2 * count / (len(grams) + len(_grams(other)))  # Dice coefficient
+            if score > best_score:
+                best_id, best_score = topic_id, score
+        return best_id if best_score >= self.threshold else None
+
+    def resolve(self, db: Session, name: str) -> Tuple[str, Optional[int]]:
+        """(matching key, id of the canonical topic `name` is an alias of, or None if it is new)"""
+        key = normalize_topic(name)
+        with self._lock:
+            self._refresh(db)
+            return key, self._match(key)
+
+    def canonical_id(self, db: Session, topic_id: int) -> Optional[int]:
+        """
+        Id of the topic quizzes for `topic_id` are stored under (itself unless
+        it is an alias), or None if there is no such topic. Topics already
+        seen are answered from memory without touching the database.
+        """
+        with self._lock:
+            if topic_id > self._last_id:
+                self._refresh(db)
+            return self._canonical.get(topic_id)
+
+    def backfill(self) -> int:
+        """
+        Canonicalize topics created before canonicalization existed, oldest
+        first, moving their quizzes and attempts onto the canonical topic,
+        and move skill question pools stored under older skill keys onto the
+        current ones. Returns how many topics became aliases.
+        """
+        db = self.session_factory()
+        try:
+            self._rekey_skill_pools(db)
+            topics = db.query(Topic).filter(Topic.normalized_name.is_(None)).order_by(Topic.id).all()
+            if not topics:
+                db.commit()
+                return 0
+            aliased = 0
+            with self._lock:
+                self._refresh(db)
+                for topic in topics:
+                    topic.normalized_name = normalize_topic(topic.name)
+                    canonical_id = self._match(topic.normalized_name)
+                    if canonical_id is None or canonical_id == topic.id:
+                        self._add(topic.id, topic.normalized_name)
+                        continue
+                    topic.canonical_id = canonical_id
+                    self._canonical[topic.id] = canonical_id
+                    db.query(Quiz).filter(Quiz.topic_id == topic.id).update({Quiz.topic_id: canonical_id})
+                    db.query(QuizAttempt).filter(QuizAttempt.topic_id == topic.id).update(
+                        {QuizAttempt.topic_id: canonical_id})
+                    aliased += 1
+                db.commit()
+            if aliased:
+                logger.info("Merged %d existing topic(s) into canonical topics", aliased)
+            return aliased
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    @staticmethod
+    def _rekey_skill_pools(db: Session) -> int:
+        """
+        Skill pools were keyed by the lowercased skill name before skills used
+        normalize_topic ("react.js" is now "react"). Move each old pool onto
+        its current key, dropping questions the target pool already holds
+        (pools are unique on skill, difficulty and question hash). Returns how
+        many pools were moved; the caller commits.
+        """
+        moved = 0
+        for (skill,) in db.query(SkillQuestion.skill).distinct().all():
+            key = normalize_topic(skill)
+            if key == skill:
+                continue
+            target = aliased(SkillQuestion)
+            already_pooled = (
+                db.query(target.id)
+                .filter(target.skill == key, target.difficulty == SkillQuestion.difficulty,
+                        target.question_hash == SkillQuestion.question_hash)
+                .exists()
+            )
+            db.query(SkillQuestion).filter(SkillQuestion.skill == skill, already_pooled).delete(
+                synchronize_session=False)
+            db.query(SkillQuestion).filter(SkillQuestion.skill == skill).update(
+                {SkillQuestion.skill: key}, synchronize_session=False)
+            moved += 1
+        if moved:
+            logger.info("Moved %d skill question pool(s) to their normalized skill keys", moved)
+        return moved
+
+topic_index = TopicIndex()
@@ -0,0 +1,327 @@
+import atexit
+import contextvars
+import functools
+import json
+import os
+import queue
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import requests
+
+from services.log import get_logger
+
+# Lightweight tracing without extra dependencies. Spans nest through a
+# contextvar, so they follow a request into threadpool workers; finished
+# spans are queued and exported by a background thread, either as JSON lines
+# to a file or as OTLP/HTTP JSON to a local collector (Jaeger, Tempo, the
+# OpenTelemetry Collector, ...).
+#
+#   TRACE_EXPORTER       none (default) | file | otlp
+#   TRACE_FILE           output path for the file exporter (default traces.jsonl)
+#   TRACE_OTLP_ENDPOINT  collector URL (default http://localhost:4318/v1/traces)
+#   TRACE_SAMPLE_RATE    fraction of root spans (requests) to trace (default 1.0)
+#   TRACE_SERVICE_NAME   service.name resource attribute (default tpicq-api)
+
+logger = get_logger("tracing")
+
+class Span:
+    """A timed operation; use as a context manager or call end() explicitly"""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns",
+                 "attributes", "error", "_token")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        self._token = None
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def update_name(self, name: str) -> None:
+        self.name = name
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        if self.end_ns:
+            return
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        _export(self)
+
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        _current_span.reset(self._token)
+        self.end(exc)
+        return False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+class _NoopSpan:
+    """Stands in for a span when tracing is off or the request was not sampled"""
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+    def update_name(self, name: str) -> None:
+        pass
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+NOOP_SPAN = _NoopSpan()
+
+# Innermost open span of the current request/thread; NOOP_SPAN marks an
+# unsampled trace so its children are not started as new roots
+_current_span: contextvars.ContextVar[Optional[Any]] = contextvars.ContextVar("current_span", default=None)
+
+class _UnsampledRoot:
+    """Context manager that marks the rest of an unsampled trace as not traced"""
+
+    def __init__(self):
+        self._token = None
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+    def update_name(self, name: str) -> None:
+        pass
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        pass
+
+    def __enter__(self) -> "_UnsampledRoot":
+        self._token = _current_span.set(NOOP_SPAN)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        _current_span.reset(self._token)
+        return False
+
+class JsonLinesExporter:
+    """Append one JSON object per span to a file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+    def export(self, spans: List[Span]) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            for finished in spans:
+                f.write(json.dumps(finished.to_dict(), default=str) + "\n")
+
+class OtlpHttpExporter:
+    """Send spans to an OpenTelemetry collector using OTLP/HTTP with JSON encoding"""
+
+    def __init__(self, endpoint: str, service_name: str):
+        self.endpoint = endpoint
+        self.service_name = service_name
+
+    @staticmethod
+    def _attribute(key: str, value: Any) -> Dict[str, Any]:
+        if isinstance(value, bool):
+            encoded = {"boolValue": value}
+        elif isinstance(value, int):
+            encoded = {"intValue": str(value)}
+        elif isinstance(value, float):
+            encoded = {"doubleValue": value}
+        else:
+            encoded = {"stringValue": str(value)}
+        return {"key": key, "value": encoded}
+
+    def _encode(self, finished: Span) -> Dict[str, Any]:
+        encoded = {
+            "traceId": finished.trace_id,
+            "spanId": finished.span_id,
+            "name": finished.name,
+            "kind": 2 if finished.parent_id is None else 1,  # SERVER for roots, INTERNAL otherwise
+            "startTimeUnixNano": str(finished.start_ns),
+            "endTimeUnixNano": str(finished.end_ns),
+            "attributes": [self._attribute(k, v) for k, v in finished.attributes.items()],
+            "status": {"code": 2, "message": finished.error} if finished.error else {"code": 1},
+        }
+        if finished.parent_id:
+            encoded["parentSpanId"] = finished.parent_id
+        return encoded
+
+    def export(self, spans: List[Span]) -> None:
+        body = {"resourceSpans": [{
+            "resource": {"attributes": [self._attribute("service.name", self.service_name)]},
+            "scopeSpans": [{"scope": {"name": "tpicq"}, "spans": [self._encode(s) for s in spans]}],
+        }]}
+        response = requests.post(self.endpoint, json=body, timeout=5)
+        response.raise_for_status()
+
+class BatchSpanProcessor:
+    """
+    Queue finished spans and export them in batches from a background thread
+    so request threads never wait on disk or network. Spans are dropped when
+    the queue is full.
+    """
+
+    def __init__(self, exporter, max_queue: int = 8192, max_batch: int = 512, interval: float = 1.0):
+        self.exporter = exporter
+        self.max_batch = max_batch
+        self.interval = interval
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Span]]" = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def submit(self, finished: Span) -> None:
+        try:
+            self._queue.put_nowait(finished)
+        except queue.Full:
+            self.dropped += 1
+
+    def shutdown(self) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch: List[Span] = []
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            if batch:
+                try:
+                    self.exporter.export(batch)
+                except Exception as e:
+                    logger.warning("Failed to export %d span(s): %s", len(batch), e)
+
+_processor: Optional[BatchSpanProcessor] = None
+_sample_rate = 1.0
+_configure_lock = threading.Lock()
+_configured = False
+
+def configure_tracing() -> None:
+    """Set up the exporter from TRACE_* environment variables (idempotent)"""
+    global _processor, _sample_rate, _configured
+    with _configure_lock:
+        if _configured:
+            return
+        _configured = True
+        exporter_name = os.getenv("TRACE_EXPORTER", "none").lower()
+        if exporter_name == "file":
+            exporter = JsonLinesExporter(os.getenv("TRACE_FILE", "traces.jsonl"))
+        elif exporter_name == "otlp":
+            exporter = OtlpHttpExporter(
+                os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces"),
+                os.getenv("TRACE_SERVICE_NAME", "tpicq-api"),
+            )
+        else:
+            return
+        _sample_rate = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+        _processor = BatchSpanProcessor(exporter)
+        atexit.register(_processor.shutdown)
+        logger.info("Tracing enabled", extra={"exporter": exporter_name})
+
+def tracing_enabled() -> bool:
+    configure_tracing()
+    return _processor is not None
+
+def _export(finished: Span) -> None:
+    if _processor is not None:
+        _processor.submit(finished)
+
+def span(name: str, **attributes):
+    """
+    Start a span as a child of the current one (or a new trace if there is
+    none). Returns a no-op span when tracing is disabled or the trace was not
+    sampled, so call sites never need to check.
+    """
+    if not tracing_enabled():
+        return NOOP_SPAN
+    parent = _current_span.get()
+    if parent is NOOP_SPAN:
+        return NOOP_SPAN
+    if parent is None:
+        if _sample_rate < 1.0 and random.random() >= _sample_rate:
+            return _UnsampledRoot()
+        return Span(name, os.urandom(16).hex(), None, attributes)
+    return Span(name, parent.trace_id, parent.span_id, attributes)
+
+def current_span():
+    """The innermost open span, or the no-op span"""
+    current = _current_span.get()
+    return current if current is not None else NOOP_SPAN
+
+def record_span(name: str, start_ns: int, error: Optional[BaseException] = None, **attributes) -> None:
+    """Record an already-finished operation (started at `start_ns`, ending now) under the current span"""
+    parent = _current_span.get()
+    if not tracing_enabled() or parent is None or parent is NOOP_SPAN:
+        return
+    finished = Span(name, parent.trace_id, parent.span_id, attributes)
+    finished.start_ns = start_ns
+    finished.end(error)
+
+def traced(name: str) -> Callable:
+    """Decorator that runs the function inside a span"""
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def instrument_sessions(session_factory) -> None:
+    """Record a `db.commit` span for every commit made by sessions from this factory"""
+    from sqlalchemy import event
+
+    def before_commit(session):
+        if tracing_enabled():
+            session.info["trace_commit_start"] = time.time_ns()
+
+    def after_commit(session):
+        started = session.info.pop("trace_commit_start", None)
+        if started:
+            record_span("db.commit", started)
+
+    def after_rollback(session):
+        started = session.info.pop("trace_commit_start", None)
+        if started:
+            record_span("db.commit", started, error=RuntimeError("commit rolled back"))
+
+    event.listen(session_factory, "before_commit", before_commit)
+    event.listen(session_factory, "after_commit", after_commit)
+    event.listen(session_factory, "after_rollback", after_rollback)
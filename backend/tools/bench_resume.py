@@ -0,0 +1,205 @@
+"""
+Microbenchmarks for resume text extraction and skill matching.
+
+Generates synthetic PDF and DOCX resumes from 1 to 50 pages, then measures
+per document: parse time (ResumeProcessor.extract_text_from_file), peak
+Python memory during parsing, and skill-matching time
+(ResumeProcessor.extract_topics_and_skills). Results are saved as JSON keyed
+by git commit so runs can be compared across changes.
+
+Usage:
+    python tools/bench_resume.py                       # default sizes, save results
+    python tools/bench_resume.py --pages 1,10,50 --repeat 5
+    python tools/bench_resume.py --compare bench_results/resume_<sha>.json
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from docx import Document
+
+from services.resume_processor import ResumeProcessor
+
+LINES_PER_PAGE = 45
+
+FILLER_WORDS = (
+    "designed implemented delivered migrated optimized maintained services platform team customers "
+    "reliability latency throughput pipeline release review incident roadmap stakeholders metrics"
+).split()
+
+SKILL_PHRASES = [
+    "Python", "React", "Docker", "Kubernetes", "PostgreSQL", "Redis", "AWS", "GraphQL", "Kafka",
+    "TypeScript", "Django", "Flask", "Terraform", "Jenkins", "machine learning", "unit testing",
+    "leadership", "communication", "mentoring", "project management",
+]
+
+def build_lines(pages: int, seed: int = 42) -> List[List[str]]:
+    """Deterministic resume-like text: filler sentences with skills sprinkled in"""
+    rng = random.Random(seed)
+    document = []
+    for page in range(pages):
+        lines = []
+        for line in range(LINES_PER_PAGE):
+            words = rng.choices(FILLER_WORDS, k=10)
+            if line % 5 == 0:
+                words.insert(rng.randrange(len(words)), rng.choice(SKILL_PHRASES))
+            if page == 0 and line == 1:
+                words = ["6", "years", "of", "experience", "in"] + words
+            lines.append(" ".join(words).capitalize() + ".")
+        document.append(lines)
+    return document
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def build_pdf(document: List[List[str]]) -> bytes:
+    """Write a minimal multi-page PDF with one Helvetica text stream per page"""
+    objects: List[bytes] = []
+    page_count = len(document)
+    # Object numbers: 1 catalog, 2 page tree, 3 font, then (page, content) pairs
+    page_ids = [4 + 2 * i for i in range(page_count)]
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    kids = " ".join(f"{pid} 0 R" for pid in page_ids)
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {page_count} >>".encode())
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for index, lines in enumerate(document):
+        content_id = page_ids[index] + 1
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>".encode()
+        )
+        text_ops = ["BT", "/F1 10 Tf", "12 TL", "40 760 Td"]
+        for line in lines:
+            text_ops.append(f"({_pdf_escape(line)}) Tj T*")
+        text_ops.append("ET")
+        stream = "\n".join(text_ops).encode("latin-1")
+        objects.append(b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream")
+
+    output = io.BytesIO()
+    output.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(output.tell())
+        output.write(f"{number} 0 obj\n".encode() + body + b"\nendobj\n")
+    xref_offset = output.tell()
+    output.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    for offset in offsets:
+        output.write(f"{offset:010d} 00000 n \n".encode())
+    output.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode())
+    return output.getvalue()
+
+def build_docx(document: List[List[str]]) -> bytes:
+    docx_document = Document()
+    for index, lines in enumerate(document):
+        for line in lines:
+            docx_document.add_paragraph(line)
+        if index < len(document) - 1:
+            docx_document.add_page_break()
+    buffer = io.BytesIO()
+    docx_document.save(buffer)
+    return buffer.getvalue()
+
+def measure(processor: ResumeProcessor, content: bytes, filename: str, repeat: int) -> Dict[str, float]:
+    """Median parse and match times over `repeat` runs, plus one traced run for peak memory"""
+    parse_times = []
+    match_times = []
+    text = ""
+    for _ in range(repeat):
+        started = time.perf_counter()
+        text = asyncio.run(processor.extract_text_from_file(content, filename))
+        parse_times.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        processor.extract_topics_and_skills(text)
+        match_times.append(time.perf_counter() - started)
+
+    # Memory is traced in a separate run so tracing overhead does not skew timings
+    tracemalloc.start()
+    asyncio.run(processor.extract_text_from_file(content, filename))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "bytes": len(content),
+        "text_chars": len(text),
+        "parse_ms": round(statistics.median(parse_times) * 1000, 3),
+        "match_ms": round(statistics.median(match_times) * 1000, 3),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return "unknown"
+
+def compare(current: Dict, baseline_path: str) -> None:
+    with open(baseline_path) as baseline_file:
+        baseline = json.load(baseline_file)
+    print(f"\n📊 Compared with {baseline.get('revision', '?')} ({baseline_path})")
+    print(f"{'case':<12}{'parse':>12}{'match':>12}{'peak mem':>12}")
+    for case, row in current["results"].items():
+        old = baseline["results"].get(case)
+        if not old:
+            continue
+
+        def delta(key):
+            return f"{(row[key] - old[key]) / old[key] * 100:+.1f}%" if old[key] else "n/a"
+
+        print(f"{case:<12}{delta('parse_ms'):>12}{delta('match_ms'):>12}{delta('peak_kib'):>12}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark resume extraction and skill matching")
+    parser.add_argument("--pages", default="1,2,5,10,25,50", help="comma separated page counts")
+    parser.add_argument("--formats", default="pdf,docx")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output-dir", default="bench_results")
+    parser.add_argument("--compare", help="baseline results JSON to diff against")
+    args = parser.parse_args()
+
+    processor = ResumeProcessor()
+    builders = {"pdf": build_pdf, "docx": build_docx}
+    results = {}
+
+    print(f"{'case':<12}{'size KiB':>10}{'parse ms':>12}{'match ms':>12}{'peak KiB':>12}")
+    for pages in [int(p) for p in args.pages.split(",")]:
+        document = build_lines(pages)
+        for file_format in args.formats.split(","):
+            content = builders[file_format](document)
+            row = measure(processor, content, f"resume.{file_format}", args.repeat)
+            case = f"{file_format}-{pages}p"
+            results[case] = row
+            print(f"{case:<12}{row['bytes'] / 1024:>10.1f}{row['parse_ms']:>12}{row['match_ms']:>12}{row['peak_kib']:>12}")
+
+    revision = git_revision()
+    report = {
+        "revision": revision,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    os.makedirs(args.output_dir, exist_ok=True)
+    output_path = os.path.join(args.output_dir, f"resume_{revision}.json")
+    with open(output_path, "w") as output_file:
+        json.dump(report, output_file, indent=2)
+    print(f"\n💾 Results written to {output_path}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+if __name__ == "__main__":
+    main()
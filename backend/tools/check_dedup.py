@@ -0,0 +1,85 @@
+"""
+Check the near-duplicate question filter (services/dedup.py) against
+hand-picked question pairs.
+
+DISTINCT pairs are different questions that share most of their wording
+(the kind of neighbours a topic's quizzes are full of) and must both be
+kept; DUPLICATE pairs ask the same thing and must be caught. Prints the
+cosine similarity of every pair and exits non-zero if the cutoff gets one
+wrong, so run it after changing the vectorizer, the stop words or
+DEDUP_THRESHOLD.
+
+Usage:
+    python tools/check_dedup.py
+    python tools/check_dedup.py --threshold 0.85
+"""
+import argparse
+import os
+import sys
+from typing import List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.dedup import DEFAULT_THRESHOLD, vectorize
+
+DISTINCT: List[Tuple[str, str]] = [
+    ("What does the useEffect hook do in React?",
+     "What does the useMemo hook do in React?"),
+    ("Which HTTP status code indicates that the requested resource was not found?",
+     "Which HTTP status code indicates that a new resource was created?"),
+    ("What does the EXPOSE instruction do in a Dockerfile?",
+     "What does the VOLUME instruction do in a Dockerfile?"),
+    ("Which keyword is used to define a function in Python?",
+     "Which keyword is used to define a class in Python?"),
+    ("What is the time complexity of searching a balanced binary search tree?",
+     "What is the time complexity of inserting into a balanced binary search tree?"),
+    ("Which SQL clause filters rows before grouping?",
+     "Which SQL clause filters groups after grouping?"),
+    ("What is the default port of PostgreSQL?",
+     "What is the default port of MySQL?"),
+    ("Which Git command creates a new branch?",
+     "Which Git command deletes a branch?"),
+    ("In Kubernetes, what does a Deployment manage?",
+     "In Kubernetes, what does a Service manage?"),
+    ("Which of the following is a mutable data type in Python?",
+     "Which of the following is NOT a mutable data type in Python?"),
+]
+
+DUPLICATE: List[Tuple[str, str]] = [
+    ("What does the useEffect hook do in React?",
+     "In React, what does the useEffect hook do?"),
+    ("Which HTTP status code indicates that the requested resource was not found?",
+     "Which HTTP status code means that the requested resource was not found?"),
+    ("What is the default port of PostgreSQL?",
+     "What is PostgreSQL's default port?"),
+    ("Which Git command creates a new branch?",
+     "Which Git command is used to create a new branch?"),
+    ("Which keyword is used to define a function in Python?",
+     "Which of the following keywords is used to define a function in Python?"),
+]
+
+def similarity(first: str, second: str) -> float:
+    vectors = vectorize([first, second])
+    return float(vectors[0] @ vectors[1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the near-duplicate cutoff against known question pairs")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="cosine cutoff to check")
+    args = parser.parse_args()
+
+    wrong = 0
+    for label, pairs, want_duplicate in (("distinct", DISTINCT, False), ("duplicate", DUPLICATE, True)):
+        print(f"\n{label} pairs (must be {'dropped' if want_duplicate else 'kept'}):")
+        for first, second in pairs:
+            score = similarity(first, second)
+            ok = (score >= args.threshold) == want_duplicate
+            wrong += not ok
+            print(f"  {'✅' if ok else '❌'} {score:.2f}  {first} | {second}")
+
+    if wrong:
+        print(f"\n❌ {wrong} pair(s) on the wrong side of the {args.threshold:g} cutoff")
+        sys.exit(1)
+    print(f"\n✅ All pairs on the right side of the {args.threshold:g} cutoff")
+
+if __name__ == "__main__":
+    main()
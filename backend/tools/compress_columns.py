@@ -0,0 +1,169 @@
+"""
+Compress existing rows of CompressedText columns (see db_types.py).
+
+Columns switched to CompressedText still read rows written before the
+switch as plain text, so this migration can run while the API is up. It
+rewrites uncompressed rows in batches (optionally training zstd
+dictionaries on them first), reports the bytes saved per column and can
+VACUUM SQLite so the file actually shrinks. Rerunning skips rows that are
+already stored the way the current settings would store them.
+
+Usage:
+    python tools/compress_columns.py --dry-run
+    python tools/compress_columns.py --train-dictionary --vacuum
+    python tools/compress_columns.py --recompress     # re-encode with the current codec and dictionaries
+"""
+import argparse
+import os
+import sys
+import time
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import LargeBinary, bindparam, text
+
+import models
+import db_types
+from db import engine, DATABASE_URL
+from db_types import CompressedText, compress, decompress, dictionaries, frame_info, is_framed
+from db_setup import init_database
+
+# (table, column, dictionary family)
+Target = Tuple[str, str, str]
+
+def compressed_columns() -> List[Target]:
+    return [
+        (table.name, column.name, column.type.dictionary)
+        for table in models.Base.metadata.sorted_tables
+        for column in table.columns
+        if isinstance(column.type, CompressedText)
+    ]
+
+def _plain(value) -> bytes:
+    if isinstance(value, str):
+        return value.encode("utf-8")
+    return decompress(bytes(value))
+
+def _stored_size(value) -> int:
+    return len(value.encode("utf-8")) if isinstance(value, str) else len(value)
+
+def _rows(table: str, column: str, batch_size: int):
+    """(id, stored value) for every non-null row, in id order, fetched in batches"""
+    last_id = 0
+    while True:
+        with engine.connect() as connection:
+            rows = connection.execute(text(
+                f"SELECT id, {column} FROM {table} WHERE id > :last_id AND {column} IS NOT NULL "
+                f"ORDER BY id LIMIT :limit"), {"last_id": last_id, "limit": batch_size}).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+def train_dictionaries(targets: List[Target], samples: int, size: int) -> None:
+    """Train one zstd dictionary per dictionary family from up to `samples` of its rows"""
+    if db_types.zstandard is None:
+        raise SystemExit("--train-dictionary needs the zstandard package")
+    families: Dict[str, List[Target]] = {}
+    for target in targets:
+        families.setdefault(target[2], []).append(target)
+    for family, members in families.items():
+        corpus: List[bytes] = []
+        for table, column, _ in members:
+            for rows in _rows(table, column, 500):
+                corpus.extend(_plain(row[1]) for row in rows)
+                if len(corpus) >= samples:
+                    break
+        corpus = corpus[:samples]
+        if len(corpus) < 10:
+            print(f"⏭  {family}: only {len(corpus)} rows, not enough to train a dictionary")
+            continue
+        trained = db_types.zstandard.train_dictionary(size, corpus)
+        with engine.begin() as connection:
+            connection.execute(models.CompressionDictionary.__table__.insert(),
+                               {"name": family, "data": trained.as_bytes()})
+        print(f"📖 {family}: trained a {len(trained.as_bytes())}-byte dictionary on {len(corpus)} rows")
+    dictionaries.load()
+
+def _is_current(value, dictionary: str) -> bool:
+    """True if the value is already framed with the codec and dictionary compress() would use now"""
+    if not is_framed(value):
+        return False
+    _, codec, dictionary_id = frame_info(bytes(value[:db_types.HEADER_SIZE]))
+    wanted_codec = db_types.configured_codec()
+    if codec == db_types.CODEC_RAW:
+        # Left raw because compressing did not help; only a new dictionary could change that
+        return not dictionaries.current(dictionary)
+    if codec != wanted_codec:
+        return False
+    return codec != db_types.CODEC_ZSTD or dictionary_id == dictionaries.current(dictionary)
+
+def migrate(target: Target, batch_size: int, recompress: bool, dry_run: bool) -> Dict[str, int]:
+    table, column, dictionary = target
+    update = text(f"UPDATE {table} SET {column} = :value WHERE id = :row_id").bindparams(
+        bindparam("value", type_=LargeBinary))
+    stats = {"rows": 0, "rewritten": 0, "bytes_before": 0, "bytes_after": 0}
+    for rows in _rows(table, column, batch_size):
+        changes = []
+        for row_id, value in rows:
+            stats["rows"] += 1
+            before = _stored_size(value)
+            stats["bytes_before"] += before
+            if is_framed(value) and (not recompress or _is_current(value, dictionary)):
+                stats["bytes_after"] += before
+                continue
+            encoded = compress(_plain(value), dictionary)
+            stats["bytes_after"] += len(encoded)
+            changes.append({"row_id": row_id, "value": encoded})
+        if changes and not dry_run:
+            with engine.begin() as connection:
+                connection.execute(update, changes)
+        stats["rewritten"] += len(changes)
+    return stats
+
+def _sqlite_file_size() -> int:
+    path = DATABASE_URL[len("sqlite:///"):].split("?", 1)[0] if DATABASE_URL.startswith("sqlite:///") else ""
+    return os.path.getsize(path) if path and os.path.exists(path) else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Compress existing rows of compressed text columns")
+    parser.add_argument("--batch-size", type=int, default=500, help="rows rewritten per transaction")
+    parser.add_argument("--recompress", action="store_true",
+                        help="also re-encode compressed rows whose codec or dictionary is out of date")
+    parser.add_argument("--train-dictionary", action="store_true",
+                        help="train a zstd dictionary per content family first (implies --recompress)")
+    parser.add_argument("--samples", type=int, default=2000, help="rows sampled to train each dictionary")
+    parser.add_argument("--dictionary-size", type=int, default=32 * 1024, help="trained dictionary size in bytes")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM a SQLite database afterwards")
+    parser.add_argument("--dry-run", action="store_true", help="report the savings without writing")
+    args = parser.parse_args()
+
+    # Also converts PostgreSQL text columns to bytea (see db_setup.convert_compressed_columns)
+    init_database()
+    targets = compressed_columns()
+    if args.train_dictionary and not args.dry_run:
+        train_dictionaries(targets, args.samples, args.dictionary_size)
+
+    file_size = _sqlite_file_size()
+    started = time.perf_counter()
+    print(f"\n{'column':<32}{'rows':>8}{'rewritten':>11}{'before KB':>12}{'after KB':>11}{'saved':>8}")
+    totals = {"bytes_before": 0, "bytes_after": 0}
+    for target in targets:
+        stats = migrate(target, args.batch_size, args.recompress or args.train_dictionary, args.dry_run)
+        totals["bytes_before"] += stats["bytes_before"]
+        totals["bytes_after"] += stats["bytes_after"]
+        saved = 1 - stats["bytes_after"] / stats["bytes_before"] if stats["bytes_before"] else 0.0
+        print(f"{target[0] + '.' + target[1]:<32}{stats['rows']:>8}{stats['rewritten']:>11}"
+              f"{stats['bytes_before'] / 1024:>12.1f}{stats['bytes_after'] / 1024:>11.1f}{saved:>8.0%}")
+    saved = 1 - totals["bytes_after"] / totals["bytes_before"] if totals["bytes_before"] else 0.0
+    print(f"\n✅ {totals['bytes_before'] / 1024:.1f} KB -> {totals['bytes_after'] / 1024:.1f} KB "
+          f"({saved:.0%} smaller) in {time.perf_counter() - started:.1f}s{' (dry run)' if args.dry_run else ''}")
+
+    if args.vacuum and not args.dry_run and engine.dialect.name == "sqlite":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.execute(text("VACUUM"))
+        print(f"🧹 SQLite file {file_size / 1024:.1f} KB -> {_sqlite_file_size() / 1024:.1f} KB")
+
+if __name__ == "__main__":
+    main()
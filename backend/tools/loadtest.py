@@ -0,0 +1,193 @@
+"""
+Load-test harness for the TpicQ API.
+
+Drives topic listing, topic creation, topic quiz generation and the resume
+upload + generate flow at a fixed concurrency, then reports p50/p95/p99
+latency and requests per second per scenario. Run the backend against
+tools/mock_gemini.py to measure without spending quota.
+
+Usage:
+    python tools/loadtest.py --base-url http://127.0.0.1:8000 --concurrency 16 \
+        --duration 60 --mix list_topics=6,create_topic=1,generate_quiz=2,resume=1 \
+        --output bench_results/loadtest.json
+"""
+import argparse
+import io
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple
+
+import requests
+from docx import Document
+
+_local = threading.local()
+
+def _session() -> requests.Session:
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+    return _local.session
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+def build_resume_docx() -> bytes:
+    """A small resume that matches several of the processor's skill keywords"""
+    document = Document()
+    document.add_heading("Jane Doe - Senior Software Engineer", 0)
+    document.add_paragraph("5 years of experience building backend services in Python, Django and FastAPI.")
+    document.add_paragraph("Skills: Python, React, Docker, Kubernetes, PostgreSQL, Redis, AWS, GraphQL.")
+    document.add_paragraph("Led a team of four; strong communication, mentoring and problem solving.")
+    document.add_paragraph("Bachelor of Science in Computer Science.")
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+class LoadTest:
+    def __init__(self, base_url: str, timeout: float):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.topic_ids: List[int] = []
+        self.resume_bytes = build_resume_docx()
+        self.results: Dict[str, List[Tuple[float, int]]] = {}
+        self._lock = threading.Lock()
+
+    def setup(self, topic_count: int):
+        """Make sure a few topics exist to generate quizzes for"""
+        for i in range(topic_count):
+            name = f"Loadtest Topic {i + 1}"
+            response = requests.post(f"{self.base_url}/topics", json={"name": name}, timeout=self.timeout)
+            if response.status_code == 200:
+                self.topic_ids.append(response.json()["id"])
+        if not self.topic_ids:
+            topics = requests.get(f"{self.base_url}/topics", timeout=self.timeout).json()
+            self.topic_ids = [topic["id"] for topic in topics]
+
+    def _record(self, scenario: str, started: float, status: int):
+        with self._lock:
+            self.results.setdefault(scenario, []).append((time.perf_counter() - started, status))
+
+    def _timed(self, scenario: str, method: str, path: str, **kwargs) -> requests.Response:
+        started = time.perf_counter()
+        try:
+            response = _session().request(method, f"{self.base_url}{path}", timeout=self.timeout, **kwargs)
+            self._record(scenario, started, response.status_code)
+            return response
+        except requests.RequestException:
+            self._record(scenario, started, 0)
+            return None
+
+    def list_topics(self):
+        self._timed("list_topics", "GET", "/topics")
+
+    def create_topic(self):
+        self._timed("create_topic", "POST", "/topics", json={"name": f"lt-{uuid.uuid4().hex[:12]}"})
+
+    def generate_quiz(self):
+        topic_id = random.choice(self.topic_ids)
+        difficulty = random.choice(["easy", "medium", "hard"])
+        self._timed("generate_quiz", "POST", f"/topics/{topic_id}/generate-quiz", json={"difficulty": difficulty})
+
+    def resume(self):
+        files = {"file": (f"resume-{uuid.uuid4().hex[:8]}.docx", self.resume_bytes,
+                          "application/vnd.openxmlformats-officedocument.wordprocessingml.document")}
+        upload = self._timed("resume_upload", "POST", "/api/resume/upload-resume", files=files)
+        if upload is not None and upload.status_code == 200:
+            upload_id = upload.json()["id"]
+            self._timed("resume_generate", "POST", f"/api/resume/generate-resume-quiz/{upload_id}")
+
+    def run(self, mix: Dict[str, int], concurrency: int, duration: float, total_requests: int) -> float:
+        scenarios: List[Callable[[], None]] = []
+        for name, weight in mix.items():
+            scenarios.extend([getattr(self, name)] * weight)
+
+        stop_at = time.perf_counter() + duration
+        counter = {"issued": 0}
+        counter_lock = threading.Lock()
+
+        def worker():
+            while time.perf_counter() < stop_at:
+                with counter_lock:
+                    if total_requests and counter["issued"] >= total_requests:
+                        return
+                    counter["issued"] += 1
+                random.choice(scenarios)()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for _ in range(concurrency):
+                pool.submit(worker)
+        return time.perf_counter() - started
+
+    def report(self, elapsed: float) -> Dict[str, Dict[str, float]]:
+        report = {}
+        all_latencies = []
+        for scenario, samples in sorted(self.results.items()):
+            latencies = [latency for latency, _ in samples]
+            all_latencies.extend(latencies)
+            errors = sum(1 for _, status in samples if status == 0 or status >= 400)
+            report[scenario] = {
+                "requests": len(samples),
+                "errors": errors,
+                "rps": round(len(samples) / elapsed, 2),
+                "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+                "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+                "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+            }
+        report["total"] = {
+            "requests": len(all_latencies),
+            "errors": sum(r["errors"] for r in report.values()),
+            "rps": round(len(all_latencies) / elapsed, 2),
+            "p50_ms": round(percentile(all_latencies, 50) * 1000, 1),
+            "p95_ms": round(percentile(all_latencies, 95) * 1000, 1),
+            "p99_ms": round(percentile(all_latencies, 99) * 1000, 1),
+        }
+        return report
+
+def parse_mix(value: str) -> Dict[str, int]:
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        mix[name.strip()] = int(weight or 1)
+    return mix
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the TpicQ API")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to run")
+    parser.add_argument("--requests", type=int, default=0, help="stop after this many scenario runs (0 = no limit)")
+    parser.add_argument("--mix", default="list_topics=6,create_topic=1,generate_quiz=2,resume=1",
+                        help="scenario weights: list_topics, create_topic, generate_quiz, resume")
+    parser.add_argument("--topics", type=int, default=5, help="topics to create for quiz generation")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--output", help="write the report as JSON to this path")
+    args = parser.parse_args()
+
+    test = LoadTest(args.base_url, args.timeout)
+    test.setup(args.topics)
+    print(f"🚀 Running {args.mix} at concurrency {args.concurrency} for {args.duration:.0f}s")
+    elapsed = test.run(parse_mix(args.mix), args.concurrency, args.duration, args.requests)
+    report = test.report(elapsed)
+
+    print(f"\n{'scenario':<18}{'reqs':>7}{'errs':>7}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for scenario, row in report.items():
+        print(f"{scenario:<18}{row['requests']:>7}{row['errors']:>7}{row['rps']:>9}"
+              f"{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as output_file:
+            json.dump({"args": vars(args), "elapsed_s": round(elapsed, 2), "report": report}, output_file, indent=2)
+        print(f"\n💾 Report written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Local stand-in for the Gemini generateContent API.
+
+Serves schema-shaped quiz JSON with usageMetadata so the backend can be
+load-tested without spending quota. Point the backend at it with:
+
+    GEMINI_API_URL=http://127.0.0.1:8001/v1beta/models/gemini-1.5-flash:generateContent
+
+Usage:
+    python tools/mock_gemini.py --port 8001 --latency-ms 800 --jitter-ms 400 \
+        --rate-429 0.02 --rate-503 0.05 --invalid-rate 0.05
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+app = FastAPI(title="Mock Gemini API")
+
+# Replaced by command line arguments in main()
+config = {
+    "latency_ms": 500.0,
+    "jitter_ms": 200.0,
+    "rate_429": 0.0,
+    "rate_503": 0.0,
+    "invalid_rate": 0.0,
+    "stream_chunks": 4,
+}
+
+stats = {"requests": 0, "429": 0, "503": 0, "ok": 0}
+
+def _prompt_text(body: dict) -> str:
+    try:
+        return " ".join(part.get("text", "") for part in body["contents"][0]["parts"])
+    except (KeyError, IndexError, TypeError):
+        return ""
+
+def _build_quiz(prompt: str) -> dict:
+    """Build a quiz that satisfies the backend's response schema"""
+    count_match = re.search(r"(?:Write|Create|exactly)\s+(\d+)", prompt)
+    count = int(count_match.group(1)) if count_match else 10
+    topic_match = re.search(r"about (.+?)(?:, focusing|\. |\.$|$)", prompt)
+    topic = topic_match.group(1).strip() if topic_match else "the topic"
+
+    questions = []
+    for i in range(count):
+        nonce = random.randint(1000, 9999)
+        question = {
+            "q": f"Mock question {i + 1} about {topic} (#{nonce})?",
+            "options": [f"Correct {nonce}", f"Wrong A {nonce}", f"Wrong B {nonce}", f"Wrong C {nonce}"],
+            "answer_index": 0
+        }
+        # Malformed questions exercise the per-question validation path
+        if random.random() < config["invalid_rate"]:
+            question["options"] = question["options"][:2]
+        questions.append(question)
+    return {"title": f"Quiz: {topic}", "questions": questions}
+
+def _response_body(prompt: str, text: str) -> dict:
+    return {
+        "candidates": [{
+            "content": {"parts": [{"text": text}], "role": "model"},
+            "finishReason": "STOP"
+        }],
+        "usageMetadata": {
+            "promptTokenCount": max(1, len(prompt) // 4),
+            "candidatesTokenCount": max(1, len(text) // 4),
+            "totalTokenCount": max(1, len(prompt) // 4) + max(1, len(text) // 4)
+        }
+    }
+
+def _injected_error():
+    """Return an error response according to the configured failure rates, or None"""
+    roll = random.random()
+    if roll < config["rate_429"]:
+        stats["429"] += 1
+        return JSONResponse(status_code=429, content={"error": {"code": 429, "message": "Quota exceeded (mock)"}})
+    if roll < config["rate_429"] + config["rate_503"]:
+        stats["503"] += 1
+        return JSONResponse(status_code=503, content={"error": {"code": 503, "message": "The model is overloaded (mock)"}})
+    return None
+
+async def _simulated_latency(fraction: float = 1.0):
+    delay = config["latency_ms"] + random.uniform(-config["jitter_ms"], config["jitter_ms"])
+    await asyncio.sleep(max(0.0, delay) * fraction / 1000.0)
+
+@app.post("/v1beta/models/{model_action}")
+async def generate_content(model_action: str, request: Request):
+    """Handles both <model>:generateContent and <model>:streamGenerateContent"""
+    stats["requests"] += 1
+    body = await request.json()
+    prompt = _prompt_text(body)
+
+    error = _injected_error()
+    if error is not None:
+        await _simulated_latency(0.2)
+        return error
+
+    text = json.dumps(_build_quiz(prompt))
+
+    if model_action.endswith(":streamGenerateContent"):
+        return _stream_response(prompt, text, sse=request.query_params.get("alt") == "sse")
+
+    await _simulated_latency()
+    stats["ok"] += 1
+    return _response_body(prompt, text)
+
+def _stream_response(prompt: str, text: str, sse: bool) -> StreamingResponse:
+    """Split the answer into chunks spread across the simulated latency"""
+    chunks = max(1, config["stream_chunks"])
+    size = -(-len(text) // chunks)
+    pieces = [text[i:i + size] for i in range(0, len(text), size)]
+
+    async def events():
+        if not sse:
+            yield "["
+        for index, piece in enumerate(pieces):
+            await _simulated_latency(1.0 / len(pieces))
+            chunk = json.dumps(_response_body(prompt, piece))
+            if sse:
+                yield f"data: {chunk}\r\n\r\n"
+            else:
+                yield ("," if index else "") + chunk
+        if not sse:
+            yield "]"
+        stats["ok"] += 1
+
+    media_type = "text/event-stream" if sse else "application/json"
+    return StreamingResponse(events(), media_type=media_type)
+
+@app.get("/stats")
+def get_stats():
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Gemini generateContent server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=config["latency_ms"], help="mean response latency")
+    parser.add_argument("--jitter-ms", type=float, default=config["jitter_ms"], help="uniform +/- jitter")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--rate-503", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--invalid-rate", type=float, default=0.0, help="fraction of malformed questions")
+    parser.add_argument("--stream-chunks", type=int, default=config["stream_chunks"])
+    args = parser.parse_args()
+
+    config.update(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        rate_429=args.rate_429,
+        rate_503=args.rate_503,
+        invalid_rate=args.invalid_rate,
+        stream_chunks=args.stream_chunks,
+    )
+    print(f"🧪 Mock Gemini listening on http://{args.host}:{args.port} with {config}")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
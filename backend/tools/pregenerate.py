@@ -0,0 +1,256 @@
+"""
+Bulk pre-generation of topic quizzes, to warm a topic catalog before launch.
+
+Reads a catalog with one topic per line (optionally "Topic | easy,hard" to
+choose its difficulties; "#" starts a comment), creates missing topics
+(equivalent names such as "React" and "ReactJS" map to one canonical
+topic), then generates quizzes for every topic x difficulty concurrently,
+spreading the jobs over all configured Gemini keys. Finished quizzes are
+inserted in batches. Pairs that already have --per-pair quizzes are
+skipped, so rerunning after an interruption (or a spent budget) picks up
+where the last run stopped.
+
+Usage:
+    python tools/pregenerate.py catalog.txt
+    python tools/pregenerate.py catalog.txt --difficulties easy,medium --concurrency 6 \
+        --max-calls 500 --output bench_results/pregenerate.json
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func
+
+import crud
+import models
+from db import SessionLocal
+from db_setup import init_database
+from services.circuit_breaker import CircuitOpenError
+from services import json_codec
+from services.deadline import Deadline
+from services.dedup import RECENT_QUIZZES
+from services.gemini_client import generate_quiz, get_available_api_keys
+from services.response_cache import response_cache
+from services.token_usage import token_usage
+
+DIFFICULTIES = ["easy", "medium", "hard"]
+ENDPOINT = "pregenerate"  # token usage label
+
+# (canonical topic id, topic name used in the prompt, difficulty)
+Job = Tuple[int, str, str]
+
+def read_catalog(path: str, difficulties: List[str]) -> List[Tuple[str, List[str]]]:
+    catalog = []
+    with open(path, encoding="utf-8") as catalog_file:
+        for number, line in enumerate(catalog_file, start=1):
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            name, _, levels = line.partition("|")
+            levels = [level.strip().lower() for level in levels.split(",") if level.strip()] or difficulties
+            unknown = [level for level in levels if level not in DIFFICULTIES]
+            if unknown:
+                raise SystemExit(f"{path}:{number}: unknown difficulty {', '.join(unknown)}")
+            catalog.append((name.strip()[:100], levels))
+    return catalog
+
+def plan(db, catalog: List[Tuple[str, List[str]]], per_pair: int) -> Tuple[List[Job], int, Dict[int, List[str]]]:
+    """Create missing topics and list the quizzes still to generate; returns (jobs, pairs already done, avoid texts)"""
+    wanted: Dict[Tuple[int, str], str] = {}
+    for name, levels in catalog:
+        topic = crud.get_topic_by_name(db, name) or crud.create_topic(db, name)
+        canonical = crud.get_canonical_topic(db, topic.id)
+        for level in levels:
+            wanted.setdefault((canonical.id, level), canonical.name)
+
+    existing = dict(
+        ((topic_id, difficulty), count) for topic_id, difficulty, count in
+        db.query(models.Quiz.topic_id, models.Quiz.difficulty, func.count(models.Quiz.id))
+        .group_by(models.Quiz.topic_id, models.Quiz.difficulty)
+    )
+    jobs: List[Job] = []
+    done = 0
+    for (topic_id, difficulty), name in wanted.items():
+        missing = per_pair - existing.get((topic_id, difficulty), 0)
+        if missing <= 0:
+            done += 1
+        jobs.extend([(topic_id, name, difficulty)] * max(missing, 0))
+    # New questions should not repeat what a topic's existing quizzes already ask
+    avoid = {topic_id: crud.get_recent_question_texts(db, topic_id, limit=RECENT_QUIZZES)
+             for topic_id in {job[0] for job in jobs}}
+    return jobs, done, avoid
+
+class Pregenerator:
+    def __init__(self, concurrency: int, batch_size: int, max_calls: int, max_tokens: int, timeout: float):
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.max_calls = max_calls
+        self.max_tokens = max_tokens
+        self.timeout = timeout
+        self.generated = 0
+        self.failed = 0
+        self.stop_reason: Optional[str] = None
+        self._pending: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def usage(self) -> Dict[str, int]:
+        return token_usage.report().get(ENDPOINT, {})
+
+    def _over_budget(self) -> Optional[str]:
+        usage = self.usage()
+        if self.max_calls and usage.get("calls", 0) >= self.max_calls:
+            return f"call budget of {self.max_calls} spent"
+        if self.max_tokens and usage.get("input_tokens", 0) + usage.get("output_tokens", 0) >= self.max_tokens:
+            return f"token budget of {self.max_tokens} spent"
+        return None
+
+    def _generate(self, index: int, job: Job, avoid: List[str]) -> None:
+        topic_id, name, difficulty = job
+        content = generate_quiz(name, difficulty, endpoint=ENDPOINT, deadline=Deadline(self.timeout),
+                                avoid=avoid, key_offset=index)
+        with self._lock:
+            self._pending.append({"topic_id": topic_id, "difficulty": difficulty, "content": content})
+
+    def flush(self) -> int:
+        """Insert every finished quiz in one transaction"""
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return 0
+        db = SessionLocal()
+        try:
+            db.bulk_insert_mappings(models.Quiz, [{
+                "topic_id": quiz["topic_id"],
+                "difficulty": quiz["difficulty"],
+                "content_json": json_codec.dumps(quiz["content"]),
+            } for quiz in batch])
+            db.commit()
+        finally:
+            db.close()
+        for topic_id in {quiz["topic_id"] for quiz in batch}:
+            response_cache.invalidate(f"topic_quizzes:{topic_id}")
+        self.generated += len(batch)
+        return len(batch)
+
+    def run(self, jobs: List[Job], avoid: Dict[int, List[str]]) -> None:
+        queue = list(enumerate(jobs))
+        queue.reverse()
+        running: Dict[Future, Job] = {}
+        pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="pregenerate")
+        try:
+            while queue or running:
+                # Keep every worker busy until the budget is spent
+                while queue and len(running) < self.concurrency and not self.stop_reason:
+                    self.stop_reason = self._over_budget()
+                    if self.stop_reason:
+                        break
+                    index, job = queue.pop()
+                    running[pool.submit(self._generate, index, job, avoid.get(job[0], []))] = job
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    topic_id, name, difficulty = running.pop(future)
+                    error = future.exception()
+                    if error is None:
+                        continue
+                    self.failed += 1
+                    print(f"   ❌ {name} ({difficulty}): {error}")
+                    if isinstance(error, CircuitOpenError) or "quota" in str(error).lower():
+                        # Every later job would fail the same way; rerun once keys recover
+                        self.stop_reason = str(error)
+                        queue.clear()
+                if len(self._pending) >= self.batch_size:
+                    self.flush()
+                    self.progress(len(queue) + len(running))
+        except KeyboardInterrupt:
+            self.stop_reason = "interrupted"
+            print("\n⏹  Interrupted: waiting for in-flight quizzes, then saving what finished")
+            pool.shutdown(wait=True, cancel_futures=True)
+        finally:
+            pool.shutdown(wait=True)
+            self.flush()
+
+    def progress(self, remaining: int) -> None:
+        print(f"   💾 {self.generated} quizzes saved, {remaining} to go")
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-generate topic quizzes for a catalog")
+    parser.add_argument("catalog", help="file with one topic per line, optionally 'Topic | easy,hard'")
+    parser.add_argument("--difficulties", default=",".join(DIFFICULTIES),
+                        help="difficulties for topics that do not list their own")
+    parser.add_argument("--per-pair", type=int, default=1, help="quizzes wanted per topic and difficulty")
+    parser.add_argument("--concurrency", type=int, default=0,
+                        help="quizzes generated at once (default: two per configured key)")
+    parser.add_argument("--batch-size", type=int, default=20, help="quizzes per database insert")
+    parser.add_argument("--max-calls", type=int, default=0,
+                        help="start no new quiz after this many Gemini calls (0 = no limit)")
+    parser.add_argument("--max-tokens", type=int, default=0,
+                        help="start no new quiz after this many tokens (0 = no limit)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds allowed per quiz")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be generated")
+    parser.add_argument("--output", help="write the report as JSON to this path")
+    args = parser.parse_args()
+
+    difficulties = [level.strip() for level in args.difficulties.split(",") if level.strip()]
+    catalog = read_catalog(args.catalog, difficulties)
+    keys = get_available_api_keys()
+    if not keys and not args.dry_run:
+        raise SystemExit("No Gemini API keys configured (GEMINI_API_KEY_1 ... GEMINI_API_KEY_9)")
+
+    init_database()
+    db = SessionLocal()
+    try:
+        jobs, done, avoid = plan(db, catalog, args.per_pair)
+    finally:
+        db.close()
+    print(f"📚 {len(catalog)} catalog entries: {done} topic/difficulty pairs already generated, "
+          f"{len(jobs)} quizzes to generate")
+    if args.dry_run or not jobs:
+        return
+
+    concurrency = args.concurrency or 2 * len(keys)
+    print(f"🚀 Generating with {concurrency} workers across {len(keys)} key(s)")
+    generator = Pregenerator(concurrency, args.batch_size, args.max_calls, args.max_tokens, args.timeout)
+    started = time.perf_counter()
+    generator.run(jobs, avoid)
+    elapsed = time.perf_counter() - started
+
+    usage = generator.usage()
+    tokens = usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+    report = {
+        "planned": len(jobs),
+        "generated": generator.generated,
+        "failed": generator.failed,
+        "remaining": len(jobs) - generator.generated,
+        "stopped": generator.stop_reason,
+        "gemini_calls": usage.get("calls", 0),
+        "input_tokens": usage.get("input_tokens", 0),
+        "output_tokens": usage.get("output_tokens", 0),
+        "elapsed_s": round(elapsed, 2),
+        "quizzes_per_minute": round(generator.generated / elapsed * 60, 1) if elapsed else 0.0,
+        "calls_per_minute": round(usage.get("calls", 0) / elapsed * 60, 1) if elapsed else 0.0,
+        "tokens_per_second": round(tokens / elapsed, 1) if elapsed else 0.0,
+    }
+
+    print(f"\n✅ {report['generated']}/{report['planned']} quizzes in {report['elapsed_s']}s "
+          f"({report['quizzes_per_minute']} quizzes/min, {report['calls_per_minute']} calls/min, "
+          f"{report['tokens_per_second']} tokens/s), {report['failed']} failed")
+    if generator.stop_reason:
+        print(f"⚠️  Stopped early: {generator.stop_reason}. Rerun to continue with the {report['remaining']} left.")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as output_file:
+            json.dump({"args": vars(args), "report": report}, output_file, indent=2)
+        print(f"\n💾 Report written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Summarise spans written by the file trace exporter (TRACE_EXPORTER=file).
+
+Prints a latency breakdown per span name (count, p50/p95 and total time,
+plus self time excluding child spans), then the slowest traces as indented
+trees so you can see which batch, key or retry a slow request spent its
+time in.
+
+Usage:
+    python tools/trace_summary.py traces.jsonl
+    python tools/trace_summary.py traces.jsonl --slowest 3 --name "POST /generate-resume-quiz/{upload_id}"
+"""
+import argparse
+import json
+from collections import defaultdict
+from typing import Dict, List
+
+def load_spans(path: str) -> List[Dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+def print_breakdown(spans: List[Dict], children: Dict[str, List[Dict]]) -> None:
+    durations: Dict[str, List[float]] = defaultdict(list)
+    self_times: Dict[str, float] = defaultdict(float)
+    for s in spans:
+        durations[s["name"]].append(s["duration_ms"])
+        child_time = sum(c["duration_ms"] for c in children.get(s["span_id"], []))
+        self_times[s["name"]] += max(0.0, s["duration_ms"] - child_time)
+
+    print(f"{'span':<48}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'total ms':>12}{'self ms':>12}")
+    for name, values in sorted(durations.items(), key=lambda item: -sum(item[1])):
+        print(f"{name[:47]:<48}{len(values):>7}{percentile(values, 50):>10.1f}{percentile(values, 95):>10.1f}"
+              f"{sum(values):>12.1f}{self_times[name]:>12.1f}")
+
+def print_tree(span: Dict, children: Dict[str, List[Dict]], root_start: int, depth: int = 0) -> None:
+    offset_ms = (span["start_ns"] - root_start) / 1e6
+    attributes = " ".join(f"{k}={v}" for k, v in span.get("attributes", {}).items() if k != "request_id")
+    error = f"  ✗ {span['error']}" if span.get("error") else ""
+    print(f"{'  ' * depth}{span['name']}  {span['duration_ms']:.1f}ms  (+{offset_ms:.1f}ms)  {attributes}{error}")
+    for child in sorted(children.get(span["span_id"], []), key=lambda c: c["start_ns"]):
+        print_tree(child, children, root_start, depth + 1)
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise a JSON-lines trace file")
+    parser.add_argument("path")
+    parser.add_argument("--slowest", type=int, default=5, help="number of slowest traces to print as trees")
+    parser.add_argument("--name", help="only consider traces whose root span has this name")
+    args = parser.parse_args()
+
+    spans = load_spans(args.path)
+    children: Dict[str, List[Dict]] = defaultdict(list)
+    for s in spans:
+        if s.get("parent_id"):
+            children[s["parent_id"]].append(s)
+
+    roots = [s for s in spans if not s.get("parent_id")]
+    if args.name:
+        roots = [s for s in roots if s["name"] == args.name]
+        trace_ids = {s["trace_id"] for s in roots}
+        spans = [s for s in spans if s["trace_id"] in trace_ids]
+    if not roots:
+        print("No traces found")
+        return
+
+    print(f"📊 {len(roots)} trace(s), {len(spans)} span(s)\n")
+    print_breakdown(spans, children)
+
+    print(f"\n🐢 Slowest {min(args.slowest, len(roots))} trace(s)")
+    for root in sorted(roots, key=lambda s: -s["duration_ms"])[:args.slowest]:
+        request_id = root.get("attributes", {}).get("request_id", "-")
+        print(f"\ntrace {root['trace_id']} (request {request_id})")
+        print_tree(root, children, root["start_ns"])
+
+if __name__ == "__main__":
+    main()
@@ -3,11 +3,25 @@ import axios from "axios";
 
 const API_BASE = process.env.REACT_APP_BACKEND_URL || "http://localhost:8000";
 
+// A 429 means quiz generation is saturated; wait as long as Retry-After says and try again
+const MAX_BUSY_RETRIES = 3;
+
+const retryAfterSeconds = (err) => {
+  const seconds = parseInt(err.response?.headers?.["retry-after"], 10);
+  return Number.isFinite(seconds) && seconds > 0 ? Math.min(seconds, 60) : 5;
+};
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
 function ResumeQuiz({ onBack }) {
   const [file, setFile] = useState(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState("");
+  const [busyNotice, setBusyNotice] = useState("");
+  // Upload saved by a pipeline request whose quiz generation failed; retried without re-uploading
+  const [savedUploadId, setSavedUploadId] = useState(null);
   const [quiz, setQuiz] = useState(null);
+  const [quizId, setQuizId] = useState(null);
   const [selectedAnswers, setSelectedAnswers] = useState({});
   const [showAnswers, setShowAnswers] = useState(false);
 
@@ -37,6 +51,7 @@ function ResumeQuiz({ onBack }) {
       }
 
       setFile(selectedFile);
+      setSavedUploadId(null);
       setError("");
     }
   };
@@ -51,32 +66,44 @@ function ResumeQuiz({ onBack }) {
     setError("");
 
     try {
-      // Step 1: Upload resume
+      // Upload the resume and generate its quiz in a single request, or only
+      // generate the quiz when an earlier attempt already saved the upload
       const formData = new FormData();
       formData.append("file", file);
-
-      const uploadResponse = await axios.post(
-        `${API_BASE}/api/resume/upload-resume`,
-        formData,
-        {
-          headers: {
-            "Content-Type": "multipart/form-data",
-          },
+      const generate = () =>
+        savedUploadId
+          ? axios.post(
+              `${API_BASE}/api/resume/generate-resume-quiz/${savedUploadId}`
+            )
+          : axios.post(`${API_BASE}/api/resume/resume-quiz-pipeline`, formData, {
+              headers: {
+                "Content-Type": "multipart/form-data",
+              },
+            });
+
+      let quizResponse;
+      for (let attempt = 0; ; attempt++) {
+        try {
+          quizResponse = await generate();
+          break;
+        } catch (err) {
+          if (err.response?.status !== 429 || attempt >= MAX_BUSY_RETRIES) {
+            throw err;
+          }
+          const seconds = retryAfterSeconds(err);
+          setBusyNotice(
+            `Quiz generation is busy right now. Retrying in ${seconds}s...`
+          );
+          await sleep(seconds * 1000);
+          setBusyNotice("");
         }
-      );
-
-      if (!uploadResponse.data || !uploadResponse.data.id) {
-        throw new Error("Failed to upload resume");
       }
 
-      // Step 2: Generate quiz
-      const quizResponse = await axios.post(
-        `${API_BASE}/api/resume/generate-resume-quiz/${uploadResponse.data.id}`
-      );
-
       if (quizResponse.data && quizResponse.data.quiz_content) {
         console.log("Quiz data received:", quizResponse.data.quiz_content);
         setQuiz(quizResponse.data.quiz_content);
+        setQuizId(quizResponse.data.id);
+        setSavedUploadId(null);
         setSelectedAnswers({});
         setShowAnswers(false);
       } else {
@@ -85,6 +112,15 @@ function ResumeQuiz({ onBack }) {
     } catch (err) {
       console.error("Resume quiz generation error:", err);
 
+      // The upload was saved but its quiz was not: the next attempt only generates the quiz
+      const uploadId = err.response?.headers?.["x-upload-id"];
+      if (uploadId) {
+        setSavedUploadId(uploadId);
+      } else if (savedUploadId && err.response?.status === 404) {
+        // The saved upload is gone; upload the file again next time
+        setSavedUploadId(null);
+      }
+
       let errorMessage =
         "Failed to generate quiz from resume. Please try again.";
 
@@ -95,6 +131,9 @@ function ResumeQuiz({ onBack }) {
         errorMessage =
           err.response.data?.detail ||
           "Invalid file format. Please upload a PDF or Word document.";
+      } else if (err.response?.status === 429) {
+        const seconds = retryAfterSeconds(err);
+        errorMessage = `Quiz generation is still busy. Please try again in ${seconds} seconds.`;
       } else if (err.response?.status === 500) {
         errorMessage = "Server error. Please try again later.";
       } else if (err.response?.data?.detail) {
@@ -103,6 +142,7 @@ function ResumeQuiz({ onBack }) {
 
       setError(errorMessage);
     } finally {
+      setBusyNotice("");
       setLoading(false);
     }
   };
@@ -134,6 +174,16 @@ function ResumeQuiz({ onBack }) {
       return;
     }
 
+    // Record the attempt server-side (graded there too); the score shown stays local
+    if (quizId) {
+      const answers = quiz.questions.map((_, i) =>
+        selectedAnswers[i] === undefined ? null : selectedAnswers[i]
+      );
+      axios
+        .post(`${API_BASE}/api/resume-quizzes/${quizId}/attempts`, { answers })
+        .catch((err) => console.error("Failed to record attempt:", err));
+    }
+
     console.log("Setting showAnswers to true");
     setShowAnswers(true);
     console.log("ShowAnswers set to true");
@@ -142,6 +192,7 @@ function ResumeQuiz({ onBack }) {
   const resetQuiz = () => {
     setFile(null);
     setQuiz(null);
+    setQuizId(null);
     setSelectedAnswers({});
     setShowAnswers(false);
     setError("");
@@ -241,7 +292,10 @@ function ResumeQuiz({ onBack }) {
                       <span className="fw-medium">{file.name}</span>
                       <button
                         className="btn btn-sm btn-outline-danger ms-2 rounded-circle"
-                        onClick={() => setFile(null)}
+                        onClick={() => {
+                          setFile(null);
+                          setSavedUploadId(null);
+                        }}
                         style={{ width: "24px", height: "24px", padding: "0" }}
                       >
                         <i
@@ -271,7 +325,7 @@ function ResumeQuiz({ onBack }) {
                       className="spinner-border spinner-border-sm me-2"
                       role="status"
                     ></span>
-                    Analyzing Resume...
+                    {busyNotice || "Analyzing Resume..."}
                   </>
                 ) : (
                   <>